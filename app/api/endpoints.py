@@ -1,225 +1,684 @@
-# app/api/endpoints.py
-
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-import os
-import shutil
-import uuid
-import json
-from datetime import datetime
-from typing import Optional
-
-from app.services.rag import RAGStore
-from app.utils.ingest import ingest_uploaded_pdf, rebuild_faiss_from_metadata, cleanup_expired_documents
-
-# =======================
-# Absolute paths (CRITICAL)
-# =======================
-
-BASE_DIR = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..", "..")
-)
-
-DATA_DIR = os.path.join(BASE_DIR, "data")
-DOCS_DIR = os.path.join(DATA_DIR, "docs")
-METADATA_PATH = os.path.join(DOCS_DIR, "metadata.json")
-
-DEFAULT_FAISS_PATH = os.path.join(DATA_DIR, "faiss_index")
-
-os.makedirs(DOCS_DIR, exist_ok=True)
-
-# =======================
-# Router & global objects
-# =======================
-
-router = APIRouter()
-
-rag = RAGStore()          # uses absolute FAISS path internally
-rag.load_store_if_exists()
-
-# =======================
-# Request models
-# =======================
-
-class QueryRequest(BaseModel):
-    question: str
-    doc_id: Optional[str] = None
-
-# =======================
-# Helper functions
-# =======================
-
-def load_metadata():
-    if not os.path.exists(METADATA_PATH) or os.path.getsize(METADATA_PATH) == 0:
-        return []
-
-    try:
-        with open(METADATA_PATH, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return []
-
-
-def save_metadata(entry: dict):
-    data = load_metadata()
-    data.append(entry)
-
-    with open(METADATA_PATH, "w") as f:
-        json.dump(data, f, indent=2)
-
-# =======================
-# API Endpoints
-# =======================
-
-@router.get("/health")
-async def health():
-    return {"status": "healthy"}
-
-
-@router.post("/ask")
-async def ask_question(request: QueryRequest):
-    if rag.chain is None:
-        return {
-            "error": "No documents uploaded yet. Please upload a PDF first."
-        }
-
-    return rag.ask(
-        question=request.question,
-        doc_id=request.doc_id
-    )
-
-
-@router.post("/upload")
-async def upload_pdf(up_file: UploadFile = File(...)):
- 
-
-    if not up_file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-
-    # Generate UUID for document
-    doc_id = str(uuid.uuid4())
-    stored_filename = f"{doc_id}.pdf"
-    file_path = os.path.join(DOCS_DIR, stored_filename)
-
-    # Save PDF to disk
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(up_file.file, buffer)
-        
-    await up_file.close()
-
-    # Save metadata FIRST
-    save_metadata({
-        "doc_id": doc_id,
-        "original_filename": up_file.filename,
-        "stored_filename": stored_filename,
-        "uploaded_at": datetime.utcnow().isoformat()
-    })
-
-    # Ingest PDF into FAISS
-    try:
-        ingest_uploaded_pdf(file_path=file_path,
-                            original_filename=up_file.filename,
-                            doc_id=doc_id)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-    # IMPORTANT: reload FAISS into running process
-    rag.load_store_if_exists()
-
-    return {
-        "status": "success",
-        "doc_id": doc_id,
-        "filename": up_file.filename
-    }
-
-
-@router.get("/documents")
-async def list_documents():
-    metadata = load_metadata()
-
-    return [
-        {
-            "doc_id": entry["doc_id"],
-            "original_filename": entry["original_filename"]
-        }
-        for entry in metadata
-    ]
-
-@router.delete("/documents/{doc_id}")
-async def delete_document(doc_id: str):
-    metadata = load_metadata()
-
-    if not metadata:
-        raise HTTPException(status_code=404, detail="No documents found")
-
-    # Find matching document
-    entry = next((item for item in metadata if item["doc_id"] == doc_id), None)
-
-    if not entry:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    # 1️⃣ Delete PDF file
-    pdf_path = os.path.join(DOCS_DIR, entry["stored_filename"])
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
-
-    # 2️⃣ Remove entry from metadata list
-    metadata = [item for item in metadata if item["doc_id"] != doc_id]
-
-    with open(METADATA_PATH, "w") as f:
-        json.dump(metadata, f, indent=2)
-
-    # 3️⃣ Rebuild FAISS safely
-    rebuild_faiss_from_metadata()
-    
-    rag.vstore = None
-    rag.retriever = None
-    rag.chain = None
-
-    # 4️⃣ Reload FAISS into running process
-    rag.load_store_if_exists()
-
-    return {
-        "status": "deleted",
-        "doc_id": doc_id
-    }
-
-
-@router.post("/reset")
-async def reset_knowledge_base():
-    """
-    Completely reset the knowledge base:
-    - Delete FAISS index (disk)
-    - Delete all PDFs
-    - Delete metadata.json
-    - Clear in-memory FAISS
-    """
-
-    # 1️⃣ Delete FAISS index (disk)
-    if os.path.exists(DEFAULT_FAISS_PATH):
-        shutil.rmtree(DEFAULT_FAISS_PATH)
-
-    # 2️⃣ Delete all PDFs (keep docs folder)
-    if os.path.exists(DOCS_DIR):
-        for f in os.listdir(DOCS_DIR):
-            if f.lower().endswith(".pdf"):
-                os.remove(os.path.join(DOCS_DIR, f))
-
-    # 3️⃣ Delete metadata.json
-    if os.path.exists(METADATA_PATH):
-        os.remove(METADATA_PATH)
-
-    # 4️⃣ 🔥 Clear in-memory FAISS (CRITICAL)
-    rag.vstore = None
-    rag.retriever = None
-    rag.chain = None
-
-    return {
-        "status": "reset",
-        "message": "Knowledge base cleared successfully"
-    }
-
-@router.post("/cleanup")
-async def cleanup_documents():
-    cleanup_expired_documents()
-    return {"status": "cleanup_completed"}
+# app/api/endpoints.py
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+import hashlib
+import os
+import re
+import threading
+import uuid
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from app.services.rag import RAGStore
+from app.services.jobs import JobManager
+from app.services.metadata_store import MetadataStore
+from app.services.index_factory import INDEX_TYPES, FAISS_INDEX_TYPE
+from app.services.scheduler import PeriodicTask
+from app.utils.ingest import (
+    ingest_uploaded_pdf, ingest_uploaded_pdfs, rebuild_faiss_from_metadata, cleanup_expired_documents
+)
+from app.utils.cache import clear_cache, file_sha256
+from app.utils import metrics
+
+# =======================
+# Absolute paths (CRITICAL)
+# =======================
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+DATA_DIR = os.path.join(BASE_DIR, "data")
+DOCS_DIR = os.path.join(DATA_DIR, "docs")
+
+DEFAULT_FAISS_PATH = os.path.join(DATA_DIR, "faiss_index")
+
+os.makedirs(DOCS_DIR, exist_ok=True)
+
+# Files accepted by one /upload/batch call
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", 100))
+
+# Largest PDF accepted per file; uploads are written and hashed in blocks
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", 50)) * 1024 * 1024
+UPLOAD_BLOCK_BYTES = 1024 * 1024
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+# Questions accepted by one /ask/batch call
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", 500))
+
+# Retry-After sent while the index / models are still warming up
+WARM_UP_RETRY_SECONDS = 5
+
+# Retention cleanup runs on startup and then every this many minutes
+# (0 disables it; POST /cleanup still works)
+CLEANUP_INTERVAL_MINUTES = float(os.getenv("CLEANUP_INTERVAL_MINUTES", 60))
+
+# =======================
+# Router & global objects
+# =======================
+
+router = APIRouter()
+
+rag = RAGStore()          # uses absolute FAISS path internally; loads nothing yet
+
+jobs = JobManager()       # background ingestion pool
+
+metadata = MetadataStore()  # document registry (SQLite)
+
+# Cache and index figures are read from their stats at scrape time
+metrics.collector(
+    "rag_embedding_cache_lookups_total", "counter",
+    "Passage embedding cache lookups, by model and result.",
+    lambda: [
+        ({"model": stats["model"], "result": result}, stats[result])
+        for stats in (rag.embedding.cache.stats(), rag.rerank_cache.stats())
+        for result in ("hits", "misses")
+    ] if rag.is_ready("retrieval") else []
+)
+metrics.collector(
+    "rag_answer_cache_lookups_total", "counter",
+    "Answer cache lookups, by result (hits, similar_hits, misses).",
+    lambda: [
+        ({"result": result}, rag.answer_cache.stats()[result])
+        for result in ("hits", "similar_hits", "misses")
+    ]
+)
+metrics.collector(
+    "rag_index_vectors", "gauge",
+    "Vectors in the published FAISS index (all shards).",
+    lambda: [({}, rag.vector_count())]
+)
+
+# =======================
+# Request models
+# =======================
+
+class QueryRequest(BaseModel):
+    question: str
+    doc_id: Optional[str] = None
+
+
+class BatchQueryRequest(BaseModel):
+    questions: List[str]
+    doc_id: Optional[str] = None
+
+# =======================
+# Helper functions
+# =======================
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def start_warm_up():
+    """
+    Load the index and models in a background thread (once), so the
+    server answers /health right away; /ready reports progress.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+
+
+def _warm_up():
+    rag.warm_up()
+    backfill_content_hashes()
+
+
+_cleanup_lock = threading.Lock()
+
+
+def run_cleanup() -> dict:
+    """
+    Retention cleanup; scheduled and manual runs never overlap.
+    """
+    with _cleanup_lock:
+        return cleanup_expired_documents(rag, metadata)
+
+
+def scheduled_cleanup():
+    """
+    One scheduled retention run, once the index has loaded
+    (skipped if warm-up failed before that).
+    """
+    while not rag.wait_ready("index", timeout=WARM_UP_RETRY_SECONDS):
+        if rag.warm_up_error:
+            return
+
+    run_cleanup()
+
+
+cleanup_scheduler = PeriodicTask("retention-cleanup", CLEANUP_INTERVAL_MINUTES * 60, scheduled_cleanup)
+
+
+def backfill_content_hashes():
+    """
+    Hash the PDFs of documents registered before uploads recorded
+    their content hash, so re-uploads of them are recognised too.
+    """
+    for entry in metadata.missing_hashes():
+        pdf_path = os.path.join(DOCS_DIR, entry["stored_filename"])
+        if os.path.exists(pdf_path):
+            metadata.set_hash(entry["doc_id"], file_sha256(pdf_path))
+
+
+def require_ready(stage: str):
+    """
+    503 (with Retry-After) until warm-up has reached `stage`.
+    """
+    if rag.is_ready(stage):
+        return
+
+    if rag.warm_up_error:
+        raise HTTPException(status_code=503, detail=f"Warm-up failed: {rag.warm_up_error}")
+
+    raise HTTPException(
+        status_code=503,
+        detail=f"Service is starting up ({stage} not ready yet). Please retry shortly.",
+        headers={"Retry-After": str(WARM_UP_RETRY_SECONDS)}
+    )
+
+
+def _too_large(filename: str) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"{filename} is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+
+
+def store_upload(up_file: UploadFile) -> dict:
+    """
+    Save an uploaded PDF under a fresh doc_id, hashing it (SHA-256)
+    block by block while writing and enforcing MAX_UPLOAD_BYTES.
+    Returns the metadata entry (not registered yet) plus its file_path.
+    """
+    # Reject on the declared size before reading anything
+    if up_file.size is not None and up_file.size > MAX_UPLOAD_BYTES:
+        raise _too_large(up_file.filename)
+
+    doc_id = str(uuid.uuid4())
+    stored_filename = f"{doc_id}.pdf"
+    file_path = os.path.join(DOCS_DIR, stored_filename)
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, "wb") as buffer:
+            for block in iter(lambda: up_file.file.read(UPLOAD_BLOCK_BYTES), b""):
+                size += len(block)
+                if size > MAX_UPLOAD_BYTES:
+                    raise _too_large(up_file.filename)
+                digest.update(block)
+                buffer.write(block)
+    except BaseException:
+        # open() may have failed before creating the file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finally:
+        up_file.file.close()
+
+    return {
+        "doc_id": doc_id,
+        "original_filename": up_file.filename,
+        "stored_filename": stored_filename,
+        "uploaded_at": datetime.utcnow().isoformat(),
+        "content_hash": digest.hexdigest(),
+        "file_path": file_path
+    }
+
+
+def register_uploads(uploads):
+    """
+    Register stored uploads unless their content is already known.
+    Duplicates are removed from disk again. Returns (new uploads,
+    duplicates: the uploaded filename plus the existing document).
+    """
+    added, duplicates = metadata.add_new(uploads)
+
+    for upload, _ in duplicates:
+        os.remove(upload["file_path"])
+
+    return added, [
+        {"filename": upload["original_filename"], **document_info(existing)}
+        for upload, existing in duplicates
+    ]
+
+
+def document_info(entry: dict) -> dict:
+    return {
+        "doc_id": entry["doc_id"],
+        "original_filename": entry["original_filename"],
+        "uploaded_at": entry["uploaded_at"]
+    }
+
+
+def discard_uploads(uploads):
+    """
+    Remove half-registered documents (metadata + PDF) again.
+    """
+    metadata.remove_many([upload["doc_id"] for upload in uploads])
+    for upload in uploads:
+        if os.path.exists(upload["file_path"]):
+            os.remove(upload["file_path"])
+
+
+def run_ingest_job(file_path: str, original_filename: str, doc_id: str, content_hash: str = None,
+                   uploaded_at: str = None, progress=None):
+    """
+    Background ingestion. On failure the half-registered
+    document (metadata + PDF) is removed again.
+    """
+    try:
+        ingest_uploaded_pdf(file_path=file_path,
+                            original_filename=original_filename,
+                            doc_id=doc_id,
+                            rag=rag,
+                            progress=progress,
+                            content_hash=content_hash,
+                            uploaded_at=uploaded_at,
+                            is_registered=metadata.contains)
+    except Exception:
+        discard_uploads([{"doc_id": doc_id, "file_path": file_path}])
+        raise
+
+    return {"doc_id": doc_id, "filename": original_filename}
+
+
+def run_batch_ingest_job(uploads, progress=None):
+    """
+    Background ingestion of a batch upload. PDFs that fail extraction
+    are discarded and reported; if indexing fails, the whole batch is.
+    """
+    try:
+        ingested, failed = ingest_uploaded_pdfs(uploads, rag=rag, progress=progress,
+                                                is_registered=metadata.contains)
+    except Exception:
+        discard_uploads(uploads)
+        raise
+
+    discard_uploads(failed)
+
+    return {
+        "documents": [
+            {"doc_id": upload["doc_id"], "filename": upload["original_filename"]}
+            for upload in ingested
+        ],
+        "failed": [
+            {"filename": upload["original_filename"], "error": upload["error"]}
+            for upload in failed
+        ]
+    }
+
+# =======================
+# API Endpoints
+# =======================
+
+@router.get("/health")
+async def health():
+    # Liveness only: the process is up. See /ready for readiness.
+    return {"status": "healthy"}
+
+
+@router.get("/ready")
+async def ready(response: Response):
+    """
+    Readiness: 200 once the index, retrieval models and generator
+    are loaded, 503 while warming up (or if warm-up failed).
+    """
+    stages = rag.readiness()
+    is_ready = all(stages[stage] for stage in ("index", "retrieval", "generation"))
+
+    if not is_ready:
+        response.status_code = 503
+        if not stages["error"]:
+            response.headers["Retry-After"] = str(WARM_UP_RETRY_SECONDS)
+
+    status = "ready" if is_ready else "failed" if stages["error"] else "starting"
+    return {"status": status, **stages}
+
+
+@router.get("/metrics")
+def prometheus_metrics():
+    """
+    Stage timings and counters in Prometheus text format.
+    """
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    require_ready("retrieval")
+
+    return {
+        "embeddings": rag.embedding.cache.stats(),
+        "rerank_embeddings": rag.rerank_cache.stats(),
+        "answers": rag.answer_cache.stats()
+    }
+
+
+@router.post("/ask")
+def ask_question(request: QueryRequest):
+    require_ready("generation")
+
+    if not rag.vector_count():
+        return {
+            "error": "No documents uploaded yet. Please upload a PDF first."
+        }
+
+    return rag.ask(
+        question=request.question,
+        doc_id=request.doc_id
+    )
+
+
+@router.post("/ask/batch")
+def ask_questions(request: BatchQueryRequest):
+    """
+    Answer a questionnaire in one call: questions are embedded,
+    searched, reranked and generated in batches. Each answer has
+    the same shape as /ask returns, in question order.
+    """
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="questions must not be empty")
+
+    if len(request.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch"
+        )
+
+    require_ready("generation")
+
+    if not rag.vector_count():
+        return {
+            "error": "No documents uploaded yet. Please upload a PDF first."
+        }
+
+    results = rag.ask_many(request.questions, doc_id=request.doc_id)
+
+    return {
+        "answers": [
+            {"question": question, **result}
+            for question, result in zip(request.questions, results)
+        ]
+    }
+
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/ask/stream")
+def ask_question_stream(request: QueryRequest):
+    """
+    Server-Sent Events variant of /ask:
+    `sources` is sent as soon as retrieval finishes, then `token`
+    events while flan-t5 generates, then `done` with the final payload.
+    """
+    require_ready("generation")
+
+    def event_stream():
+        if not rag.vector_count():
+            yield _sse("error", {
+                "error": "No documents uploaded yet. Please upload a PDF first."
+            })
+            return
+
+        for event, data in rag.ask_stream(
+            question=request.question,
+            doc_id=request.doc_id
+        ):
+            yield _sse(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/upload")
+def upload_pdf(up_file: UploadFile = File(...)):
+    """
+    Store the PDF and queue it for ingestion.
+    Returns immediately with a job_id; poll /jobs/{job_id} for progress.
+    A PDF whose content is already registered is not ingested again:
+    the existing document is returned with status "duplicate".
+    """
+
+    if not up_file.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    require_ready("index")
+
+    # Save PDF to disk (hashed while streaming)
+    upload = store_upload(up_file)
+
+    # Save metadata FIRST, unless the same content is already there
+    _, duplicates = register_uploads([upload])
+    if duplicates:
+        return {"status": "duplicate", **duplicates[0]}
+
+    # Ingest PDF into FAISS in the background
+    job = jobs.submit(
+        run_ingest_job,
+        file_path=upload["file_path"],
+        original_filename=upload["original_filename"],
+        doc_id=upload["doc_id"],
+        content_hash=upload["content_hash"],
+        uploaded_at=upload["uploaded_at"]
+    )
+
+    return {
+        "status": "queued",
+        "job_id": job["job_id"],
+        "doc_id": upload["doc_id"],
+        "filename": upload["original_filename"]
+    }
+
+
+@router.post("/upload/batch")
+def upload_pdfs(files: List[UploadFile] = File(...)):
+    """
+    Store several PDFs and ingest them as ONE background job:
+    parallel extraction, one embedding pass over all chunks,
+    one index + metadata write. Poll /jobs/{job_id} for progress.
+    Files whose content is already registered (or repeated within the
+    batch) are listed under "duplicates" and not ingested again.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_FILES} files per batch"
+        )
+
+    if not all(f.filename.lower().endswith(".pdf") for f in files):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    require_ready("index")
+
+    uploads = []
+    try:
+        for up_file in files:
+            uploads.append(store_upload(up_file))
+    except BaseException:
+        # One file failed (e.g. 413): keep none of the batch
+        for up_file in files[len(uploads):]:
+            up_file.file.close()
+        for upload in uploads:
+            if os.path.exists(upload["file_path"]):
+                os.remove(upload["file_path"])
+        raise
+
+    # One metadata transaction for the whole batch
+    uploads, duplicates = register_uploads(uploads)
+
+    job = jobs.submit(run_batch_ingest_job, uploads) if uploads else None
+
+    return {
+        "status": "queued" if job else "duplicate",
+        "job_id": job["job_id"] if job else None,
+        "documents": [
+            {"doc_id": upload["doc_id"], "filename": upload["original_filename"]}
+            for upload in uploads
+        ],
+        "duplicates": duplicates
+    }
+
+
+@router.get("/jobs")
+async def list_jobs():
+    return jobs.list()
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/documents")
+def list_documents(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Documents in upload order. Pass limit / offset to page through
+    them; the total is returned in the X-Total-Count header.
+    """
+    response.headers["X-Total-Count"] = str(metadata.count())
+
+    return [document_info(entry) for entry in metadata.list(limit=limit, offset=offset)]
+
+@router.get("/documents/hash/{content_hash}")
+def find_document_by_hash(content_hash: str):
+    """
+    The document with this SHA-256 content hash, so a client can
+    skip uploading a PDF that is already registered. 404 if none.
+    """
+    content_hash = content_hash.lower()
+    if not SHA256_RE.match(content_hash):
+        raise HTTPException(status_code=400, detail="content_hash must be a hex SHA-256 digest")
+
+    entry = metadata.get_by_hash(content_hash)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    return document_info(entry)
+
+
+@router.delete("/documents/{doc_id}")
+def delete_document(doc_id: str):
+    require_ready("index")
+
+    entry = metadata.get(doc_id)
+
+    if not entry:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # 1️⃣ Delete PDF file
+    pdf_path = os.path.join(DOCS_DIR, entry["stored_filename"])
+    if os.path.exists(pdf_path):
+        os.remove(pdf_path)
+
+    # 2️⃣ Remove entry from the metadata store (before the index: an
+    # ingest job still running for this document then skips it)
+    metadata.remove(doc_id)
+
+    # 3️⃣ Drop the document's chunks from FAISS in place
+    rag.delete_document(doc_id)
+
+    return {
+        "status": "deleted",
+        "doc_id": doc_id
+    }
+
+
+@router.post("/reset")
+def reset_knowledge_base():
+    """
+    Completely reset the knowledge base:
+    - Delete document metadata
+    - Delete all PDFs
+    - Delete FAISS index (disk)
+    - Delete cached page text / chunks / embeddings
+
+    Metadata goes first: an ingest job still running then finds its
+    document unregistered and does not publish it after the reset.
+    """
+    require_ready("index")
+
+    # 1️⃣ Delete document metadata
+    metadata.clear()
+
+    # 2️⃣ Delete all PDFs (keep docs folder)
+    if os.path.exists(DOCS_DIR):
+        for f in os.listdir(DOCS_DIR):
+            if f.lower().endswith(".pdf"):
+                os.remove(os.path.join(DOCS_DIR, f))
+
+    # 3️⃣ Delete FAISS index (disk + memory)
+    rag.clear()
+
+    # 4️⃣ Delete cached page text / chunks / embeddings
+    clear_cache()
+    rag.clear_caches()
+
+    return {
+        "status": "reset",
+        "message": "Knowledge base cleared successfully"
+    }
+
+@router.post("/cleanup")
+def cleanup_documents():
+    """
+    Run retention cleanup now (it also runs every
+    CLEANUP_INTERVAL_MINUTES). Reports the expired documents,
+    the index shards dropped whole and the chunks deleted.
+    """
+    require_ready("index")
+    return {"status": "cleanup_completed", **run_cleanup()}
+
+
+@router.post("/rebuild")
+async def rebuild_index():
+    """
+    Explicit repair: re-ingest every document and rebuild FAISS.
+    Runs as a background job.
+    """
+    require_ready("index")
+    job = jobs.submit(lambda progress=None: rebuild_faiss_from_metadata(rag, metadata))
+    return {"status": "queued", "job_id": job["job_id"]}
+
+
+@router.get("/index")
+async def index_info():
+    require_ready("index")
+    return rag.index_stats()
+
+
+@router.post("/index/migrate")
+async def migrate_index(index_type: str = FAISS_INDEX_TYPE):
+    """
+    Rebuild the FAISS index as another type (flat, ivf_flat, ivf_pq, hnsw)
+    from the vectors already indexed. Runs as a background job.
+    """
+    if index_type not in INDEX_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"index_type must be one of: {', '.join(INDEX_TYPES)}"
+        )
+
+    require_ready("index")
+    job = jobs.submit(rag.migrate_index, index_type)
+    return {"status": "queued", "job_id": job["job_id"], "index_type": index_type}
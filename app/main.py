@@ -1,11 +1,42 @@
-# app/main.py
-from fastapi import FastAPI
-from app.api.endpoints import router as api_router
-
-app = FastAPI(title="Compliance RAG Assistant")
-
-app.include_router(api_router, prefix="/api")
-
-@app.get("/")
-async def root():
-    return {"status": "ok", "service": "compliance-rag"}
+# app/main.py
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from app.api.endpoints import router as api_router, start_warm_up, cleanup_scheduler
+from app.utils.metrics import request_timings, server_timing
+import os
+
+# Report per-request stage timings in a Server-Timing header
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bind the port first; the index and models load in the
+    # background (GET /api/ready reports when they are usable)
+    start_warm_up()
+    cleanup_scheduler.start()
+    yield
+    cleanup_scheduler.stop()
+
+
+app = FastAPI(title="Compliance RAG Assistant", lifespan=lifespan)
+
+app.include_router(api_router, prefix="/api")
+
+
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    if not SERVER_TIMING:
+        return await call_next(request)
+
+    with request_timings() as timings:
+        response = await call_next(request)
+
+    # Streaming responses send headers before their stages run
+    if timings:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return response
+
+@app.get("/")
+async def root():
+    return {"status": "ok", "service": "compliance-rag"}
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+import numpy as np
+import copy
+import os
+import re
+import threading
+import time
+
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 512))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", 3600))
+
+# Near-duplicate tier: reuse an answer when the question embedding is at
+# least this similar to a cached one (same doc scope). 0 disables it.
+# e5 similarities sit in a narrow high band, so keep this strict.
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0))
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?.! ")
+
+
+class AnswerCache:
+    """
+    Bounded LRU + TTL cache of ask() results keyed by
+    (normalized question, doc_id).
+
+    Every entry remembers the index version it was computed against;
+    entries from an older version are never served.
+    """
+
+    def __init__(self,
+        max_size: int = ANSWER_CACHE_SIZE,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+        similarity_threshold: float = ANSWER_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @property
+    def similarity_enabled(self) -> bool:
+        return self.similarity_threshold > 0
+
+    def _is_live(self, entry, version, now) -> bool:
+        return entry["version"] == version and entry["expires_at"] > now
+
+    def get(self, question: str, doc_id, version: int):
+        """
+        Exact tier: same normalized question and scope.
+        With the near-duplicate tier enabled, follow a miss with
+        get_similar() (which does the miss accounting).
+        """
+        key = (normalize_question(question), doc_id)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._is_live(entry, version, now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry["result"])
+
+            if entry is not None:
+                del self._entries[key]
+
+            if not self.similarity_enabled:
+                self.misses += 1
+            return None
+
+    def get_similar(self, query_vector, doc_id, version: int):
+        """
+        Near-duplicate tier: best cosine match among live entries
+        with the same scope. Call after get() missed.
+        """
+        if not self.similarity_enabled or query_vector is None:
+            return None
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        now = time.monotonic()
+
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[1] == doc_id
+                and entry["vector"] is not None
+                and self._is_live(entry, version, now)
+            ]
+
+            if candidates:
+                matrix = np.stack([entry["vector"] for _, entry in candidates])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+
+                if scores[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.similar_hits += 1
+                    return copy.deepcopy(entry["result"])
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, doc_id, version: int, result: dict, query_vector=None):
+        key = (normalize_question(question), doc_id)
+        vector = None
+        if self.similarity_enabled and query_vector is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+
+        with self._lock:
+            self._entries[key] = {
+                "result": copy.deepcopy(result),
+                "version": version,
+                "expires_at": time.monotonic() + self.ttl_seconds,
+                "vector": vector
+            }
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.similar_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "similarity_threshold": self.similarity_threshold,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0
+        }
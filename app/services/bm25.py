@@ -0,0 +1,213 @@
+from collections import Counter
+import math
+import os
+import re
+
+
+# Words plus dotted / slashed codes such as "DNBS.PD/CC.No.137" or "3.2.1"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+# Query terms skipped before their postings are read: stop words, and
+# terms found in more than BM25_MAX_DF_RATIO of all chunks. Their idf
+# is close to zero but their posting lists are the longest.
+BM25_MAX_DF_RATIO = float(os.getenv("BM25_MAX_DF_RATIO", 0.5))
+
+STOP_WORDS = frozenset("""
+    a about an and are as at be been but by can do does for from had has
+    have how i if in into is it its me my of on or our so than that the
+    their them then there these they this to was we were what when where
+    which who why will with would you your
+""".split())
+
+
+def tokenize(text: str):
+    """
+    Lowercased word tokens. Compound codes (circular numbers, section
+    references) are kept whole AND split into parts, so both exact
+    references and their pieces can match.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(re.split(r"[./-]", token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Incremental BM25 (Okapi) inverted index over chunks, keyed by
+    the same chunk ids as FAISS.
+
+    Postings live in SQLite (the chunk store's database), so only the
+    posting lists of the query terms are read per search. Writes join
+    the connection's open transaction; the owner commits.
+    """
+
+    def __init__(self, conn, k1: float = 1.5, b: float = 0.75):
+        self.conn = conn
+        self.k1 = k1
+        self.b = b
+
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS bm25_postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS bm25_docs (
+                chunk_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL
+            );
+        """)
+        self._load_totals()
+
+    def _load_totals(self):
+        self.n, self.total_len = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM bm25_docs"
+        ).fetchone()
+
+    def __len__(self):
+        return self.n
+
+    def add(self, chunk_id: str, text: str):
+        if self._length(chunk_id) is not None:
+            self.remove(chunk_id)
+
+        counts = Counter(tokenize(text))
+        self.conn.executemany(
+            "INSERT INTO bm25_postings VALUES (?, ?, ?)",
+            [(term, chunk_id, tf) for term, tf in counts.items()]
+        )
+
+        length = sum(counts.values())
+        self.conn.execute("INSERT INTO bm25_docs VALUES (?, ?)", (chunk_id, length))
+        self.n += 1
+        self.total_len += length
+
+    def _length(self, chunk_id: str):
+        row = self.conn.execute(
+            "SELECT length FROM bm25_docs WHERE chunk_id = ?", (chunk_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def remove(self, chunk_id: str, text: str = None):
+        """
+        Remove a chunk. Passing its text avoids scanning every posting list.
+        """
+        length = self._length(chunk_id)
+        if length is None:
+            return
+
+        if text is not None:
+            self.conn.executemany(
+                "DELETE FROM bm25_postings WHERE term = ? AND chunk_id = ?",
+                [(term, chunk_id) for term in set(tokenize(text))]
+            )
+        else:
+            self.conn.execute("DELETE FROM bm25_postings WHERE chunk_id = ?", (chunk_id,))
+
+        self.conn.execute("DELETE FROM bm25_docs WHERE chunk_id = ?", (chunk_id,))
+        self.n -= 1
+        self.total_len -= length
+
+    def document_frequency(self, term: str) -> int:
+        """
+        Number of chunks containing `term`, counted on the postings'
+        primary key without reading the rows.
+        """
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM bm25_postings WHERE term = ?", (term,)
+        ).fetchone()[0]
+
+    def postings(self, term: str, doc_id: str = None):
+        """
+        (chunk_id, tf, length) of every chunk containing `term`,
+        only those of document `doc_id` when given (filtered in SQL
+        through the chunk store's chunks table).
+        """
+        if doc_id is None:
+            return self.conn.execute("""
+                SELECT p.chunk_id, p.tf, d.length
+                FROM bm25_postings p JOIN bm25_docs d ON d.chunk_id = p.chunk_id
+                WHERE p.term = ?
+            """, (term,)).fetchall()
+
+        # CROSS JOIN keeps the document's chunks (doc_id index) as the
+        # outer loop: one primary-key probe per chunk instead of a scan
+        # of the term's whole posting list
+        return self.conn.execute("""
+            SELECT p.chunk_id, p.tf, d.length
+            FROM chunks c
+            CROSS JOIN bm25_postings p ON p.term = ? AND p.chunk_id = c.chunk_id
+            JOIN bm25_docs d ON d.chunk_id = c.chunk_id
+            WHERE c.doc_id = ?
+        """, (term, doc_id)).fetchall()
+
+    def search(self, query: str, k: int, doc_id: str = None):
+        """
+        Top-k (chunk_id, score), only among document `doc_id`'s
+        chunks when given.
+        """
+        return search_indexes([self], query, k, doc_id)
+
+
+def query_terms(indexes, query: str, n: int) -> dict:
+    """
+    {term: document frequency} of the query terms worth scoring:
+    no stop words, no terms absent from the indexes, and no terms in
+    more than BM25_MAX_DF_RATIO of the `n` chunks, unless that would
+    leave none (then the rarest one is kept).
+    """
+    df = {}
+    for term in set(tokenize(query)) - STOP_WORDS:
+        count = sum(index.document_frequency(term) for index in indexes)
+        if count:
+            df[term] = count
+
+    selective = {term: count for term, count in df.items() if count <= BM25_MAX_DF_RATIO * n}
+    if df and not selective:
+        rarest = min(df, key=lambda term: (df[term], term))
+        selective = {rarest: df[rarest]}
+
+    return selective
+
+
+def search_indexes(indexes, query: str, k: int, doc_id: str = None):
+    """
+    BM25 search over several indexes (e.g. the store's time shards) as
+    if they were one: chunk counts, lengths and document frequencies
+    are summed across them, so scores are comparable between indexes.
+    With `doc_id`, only that document's postings are read; idf still
+    comes from the whole corpus.
+    """
+    indexes = [index for index in indexes if index.n]
+    if not indexes:
+        return []
+
+    n = sum(index.n for index in indexes)
+    avg_len = sum(index.total_len for index in indexes) / n
+    k1, b = indexes[0].k1, indexes[0].b
+    scores = {}
+
+    for term, df in query_terms(indexes, query, n).items():
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for chunk_id, tf, length in (row for index in indexes for row in index.postings(term, doc_id)):
+            norm = k1 * (1 - b + b * length / avg_len)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60):
+    """
+    Fuse several ranked id lists: score(id) = sum 1 / (k + rank).
+    Returns ids sorted by fused score.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,247 @@
+import json
+import numpy as np
+import os
+import sqlite3
+
+
+CHUNKS_DB_FILE = "chunks.db"
+
+
+class ChunkStore:
+    """
+    Chunk text + metadata in SQLite, next to the FAISS index.
+
+    Each chunk row remembers its FAISS position (row in the index),
+    so search hits are resolved with one indexed lookup instead of an
+    in-memory docstore. Nothing is loaded up front. The chunk's reranker
+    vector is kept in the same row, so it is versioned, copied and
+    deleted together with the chunk.
+
+    Writes are not committed until commit(); the caller commits once
+    per index change, after the FAISS file is saved.
+
+    With `read_only`, the database is opened as immutable: no locks,
+    no journal, safe to share between concurrent readers. Only for
+    sealed stores that are never written again.
+    """
+
+    def __init__(self, folder: str, read_only: bool = False):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, CHUNKS_DB_FILE)
+
+        if read_only:
+            self.conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro&immutable=1",
+                uri=True,
+                check_same_thread=False
+            )
+            self.has_rerank = self._has_rerank_column()
+            return
+
+        # Shared across threads; RAGStore serializes writes with its lock
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (
+                chunk_id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                doc_id TEXT,
+                page_content TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                rerank BLOB
+            );
+            CREATE INDEX IF NOT EXISTS chunks_position ON chunks(position);
+            CREATE INDEX IF NOT EXISTS chunks_doc_id ON chunks(doc_id, position);
+            CREATE TABLE IF NOT EXISTS removed (
+                position INTEGER PRIMARY KEY
+            );
+        """)
+
+        # Stores written before reranker vectors moved in here
+        if not self._has_rerank_column():
+            self.conn.execute("ALTER TABLE chunks ADD COLUMN rerank BLOB")
+        self.conn.commit()
+        self.has_rerank = True
+
+    def _has_rerank_column(self) -> bool:
+        return any(row[1] == "rerank" for row in self.conn.execute("PRAGMA table_info(chunks)"))
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add(self, chunk_ids, documents, start_position: int, rerank_vectors=None):
+        if rerank_vectors is None:
+            rerank_vectors = [None] * len(chunk_ids)
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    chunk_id,
+                    start_position + offset,
+                    doc.metadata.get("doc_id"),
+                    doc.page_content,
+                    json.dumps(doc.metadata),
+                    None if vector is None else np.asarray(vector, dtype=np.float32).tobytes()
+                )
+                for offset, (chunk_id, doc, vector) in enumerate(zip(chunk_ids, documents, rerank_vectors))
+            ]
+        )
+
+    def _select(self, sql: str, column: str, values):
+        """
+        Rows whose `column` is in `values`, in the order of `values`.
+        Missing values are skipped.
+        """
+        values = list(values)
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(values), 500):
+            batch = values[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row in self.conn.execute(f"{sql} WHERE {column} IN ({placeholders})", batch):
+                found[row[0]] = row
+        return [found[value] for value in values if value in found]
+
+    def items(self, chunk_ids):
+        """
+        (chunk_id, Document) for the given chunk ids, in the same order.
+        """
+        from langchain_core.documents import Document
+
+        rows = self._select(
+            "SELECT chunk_id, page_content, metadata FROM chunks",
+            "chunk_id",
+            chunk_ids
+        )
+        return [
+            (chunk_id, Document(id=chunk_id, page_content=page_content, metadata=json.loads(metadata)))
+            for chunk_id, page_content, metadata in rows
+        ]
+
+    def rerank_vectors(self, chunk_ids) -> dict:
+        """
+        {chunk_id: reranker vector} for the given ids that have one.
+        """
+        if not self.has_rerank:
+            return {}
+
+        rows = self._select(
+            "SELECT chunk_id, rerank FROM chunks",
+            "chunk_id",
+            chunk_ids
+        )
+        return {
+            chunk_id: np.frombuffer(blob, dtype=np.float32)
+            for chunk_id, blob in rows
+            if blob is not None
+        }
+
+    def get(self, chunk_ids):
+        """
+        Documents for the given chunk ids, in the same order.
+        """
+        return [doc for _, doc in self.items(chunk_ids)]
+
+    def ids_by_position(self, positions) -> dict:
+        """
+        {position: chunk_id} for the given FAISS positions.
+        """
+        return dict(self._select("SELECT position, chunk_id FROM chunks", "position", positions))
+
+    def positions(self, chunk_ids):
+        rows = self._select("SELECT chunk_id, position FROM chunks", "chunk_id", chunk_ids)
+        return [position for _, position in rows]
+
+    def doc_chunks(self, doc_id: str):
+        """
+        (chunk_id, position) of one document, in index order.
+        """
+        return self.conn.execute(
+            "SELECT chunk_id, position FROM chunks WHERE doc_id = ? ORDER BY position",
+            (doc_id,)
+        ).fetchall()
+
+    def doc_chunk_ids(self, doc_id: str):
+        return [chunk_id for chunk_id, _ in self.doc_chunks(doc_id)]
+
+    def ordered_ids(self):
+        """
+        All chunk ids in FAISS position order.
+        """
+        return [row[0] for row in self.conn.execute("SELECT chunk_id FROM chunks ORDER BY position")]
+
+    def next_position(self) -> int:
+        """
+        FAISS position after the highest one in use (0 when empty).
+        """
+        highest = self.conn.execute("SELECT MAX(position) FROM chunks").fetchone()[0]
+        return 0 if highest is None else highest + 1
+
+    def add_removed(self, positions):
+        """
+        Record FAISS positions whose vectors stay in the index after
+        their chunks were deleted (HNSW tombstones).
+        """
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO removed VALUES (?)",
+            [(int(position),) for position in positions]
+        )
+
+    def removed_positions(self):
+        try:
+            return [row[0] for row in self.conn.execute("SELECT position FROM removed")]
+        except sqlite3.OperationalError:
+            # Read-only store written before tombstones existed
+            return []
+
+    def clear_removed(self):
+        self.conn.execute("DELETE FROM removed")
+
+    def delete(self, chunk_ids):
+        chunk_ids = list(chunk_ids)
+        for i in range(0, len(chunk_ids), 500):
+            batch = chunk_ids[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            self.conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({placeholders})", batch)
+
+    def renumber(self):
+        """
+        Close the gaps left by delete(): positions become 0..n-1 in their
+        current order, matching a flat index compacted by remove_ids()
+        or an index rebuilt in the same order.
+        """
+        self.conn.execute("""
+            WITH ranked AS (
+                SELECT chunk_id, ROW_NUMBER() OVER (ORDER BY position) - 1 AS rank
+                FROM chunks
+            )
+            UPDATE chunks SET position = ranked.rank
+            FROM ranked
+            WHERE chunks.chunk_id = ranked.chunk_id AND chunks.position != ranked.rank
+        """)
+
+    def copy(self, folder: str):
+        """
+        Consistent copy of the database into `folder`, opened for writing.
+        """
+        target = sqlite3.connect(os.path.join(folder, CHUNKS_DB_FILE))
+        self.conn.backup(target)
+        target.close()
+        return ChunkStore(folder)
+
+    def seal(self):
+        """
+        Commit, fold the WAL back into the database file and close,
+        leaving a single self-contained file for read-only opens.
+        """
+        self.conn.commit()
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,182 @@
+from langchain_core.embeddings import Embeddings
+from app.utils.vector_file import VectorFile
+import numpy as np
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+EMBEDDING_CACHE_DIR = os.path.join(BASE_DIR, "data", "cache", "embeddings")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache for one model.
+
+    Layout (one directory per model name):
+    - vectors.f32 : float32 rows (VectorFile)
+    - keys.txt    : text hash of each row, one per line
+    - meta.json   : embedding dimension
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR):
+        self.model_name = model_name
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        self.keys_path = os.path.join(self.dir, "keys.txt")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        self._rows = {}
+        self._vectors = None
+
+        if not os.path.exists(self.meta_path):
+            return
+
+        with open(self.meta_path, "r") as f:
+            dim = json.load(f)["dim"]
+        self._vectors = VectorFile(os.path.join(self.dir, "vectors.f32"), dim)
+
+        keys = []
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path, "r") as f:
+                keys = f.read().split()
+
+        # vectors are written before keys; keep only rows present in both
+        valid = min(len(keys), len(self._vectors))
+        if len(self._vectors) > valid:
+            self._vectors.truncate(valid)
+        if len(keys) > valid:
+            keys = keys[:valid]
+            with open(self.keys_path, "w") as f:
+                f.write("".join(f"{key}\n" for key in keys))
+
+        self._rows = {key: row for row, key in enumerate(keys)}
+
+    def get(self, texts):
+        """
+        Return a vector (or None on a miss) for every text.
+        """
+        with self._lock:
+            hashes = [text_hash(text) for text in texts]
+            rows = [self._rows.get(h) for h in hashes]
+
+            found = [row for row in rows if row is not None]
+            vectors = iter(self._vectors.rows(found)) if found else iter(())
+
+            result = [next(vectors) if row is not None else None for row in rows]
+
+            self.hits += len(found)
+            self.misses += len(rows) - len(found)
+
+        return result
+
+    def put(self, texts, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(texts) == 0:
+            return
+
+        with self._lock:
+            if self._vectors is None:
+                os.makedirs(self.dir, exist_ok=True)
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": int(vectors.shape[1])}, f)
+                self._vectors = VectorFile(os.path.join(self.dir, "vectors.f32"), vectors.shape[1])
+
+            new_hashes, new_vectors = {}, []
+            for text, vector in zip(texts, vectors):
+                h = text_hash(text)
+                if h not in self._rows and h not in new_hashes:
+                    new_hashes[h] = len(new_vectors)
+                    new_vectors.append(vector)
+
+            if not new_hashes:
+                return
+
+            start = self._vectors.append(np.stack(new_vectors))
+            with open(self.keys_path, "a") as f:
+                f.write("".join(f"{h}\n" for h in new_hashes))
+
+            for h, offset in new_hashes.items():
+                self._rows[h] = start + offset
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.dir):
+                shutil.rmtree(self.dir)
+            self._load()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+def clear_embedding_caches(open_caches=(), cache_dir: str = EMBEDDING_CACHE_DIR):
+    """
+    Clear the given open caches, then delete every other model's cache
+    directory straight from disk, so no model has to be loaded for it.
+    """
+    for cache in open_caches:
+        cache.clear()
+
+    if os.path.exists(cache_dir):
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps a LangChain Embeddings object so embed_documents only pays
+    for texts that were never embedded by this model before.
+    Queries are passed straight through.
+    """
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        vectors = self.cache.get(texts)
+
+        missing = list(dict.fromkeys(
+            text for text, vector in zip(texts, vectors) if vector is None
+        ))
+        if missing:
+            computed = self.base.embed_documents(missing)
+            self.cache.put(missing, computed)
+            by_text = dict(zip(missing, computed))
+            vectors = [
+                vector if vector is not None else by_text[text]
+                for text, vector in zip(texts, vectors)
+            ]
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        return self.base.embed_query(text)
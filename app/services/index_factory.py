@@ -0,0 +1,225 @@
+import faiss
+import numpy as np
+import os
+
+
+# Vector index used for dense retrieval:
+# - flat     : exact search, cost linear in chunk count (default)
+# - ivf_flat : inverted lists over k-means cells, full vectors
+# - ivf_pq   : inverted lists + product-quantized codes (m bytes / vector)
+# - hnsw     : graph search, full vectors, no training
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+
+# IVF: cells are sized from the training batch (~IVF_POINTS_PER_LIST
+# vectors each), capped at IVF_NLIST. IVF_NPROBE cells are scanned per query.
+IVF_NLIST = int(os.getenv("IVF_NLIST", 256))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", 16))
+IVF_POINTS_PER_LIST = 39
+
+# IVF indexes are trained once there are this many vectors;
+# until then the store keeps an exact flat index.
+IVF_MIN_TRAIN_POINTS = int(os.getenv("IVF_MIN_TRAIN_POINTS", 2048))
+
+# PQ: IVF_PQ_M sub-quantizers of IVF_PQ_BITS bits (must divide the dimension)
+IVF_PQ_M = int(os.getenv("IVF_PQ_M", 48))
+IVF_PQ_BITS = int(os.getenv("IVF_PQ_BITS", 8))
+
+# HNSW graph degree and build / search beam widths
+HNSW_M = int(os.getenv("HNSW_M", 32))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", 80))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", 64))
+
+# HNSW cannot remove vectors: deletes leave tombstones that searches
+# skip, and the graph is rebuilt once they exceed this share of it.
+HNSW_COMPACT_RATIO = float(os.getenv("HNSW_COMPACT_RATIO", 0.2))
+
+
+def validate_index_type(index_type: str) -> str:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(
+            f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}"
+        )
+    return index_type
+
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ("ivf_flat", "ivf_pq")
+
+
+def can_train(index_type: str, n_vectors: int) -> bool:
+    """
+    Whether `n_vectors` are enough to build `index_type`.
+    """
+    return not needs_training(index_type) or n_vectors >= IVF_MIN_TRAIN_POINTS
+
+
+def index_type_of(index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return "flat"
+    return "ivf_pq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf_flat"
+
+
+def configure_search(index):
+    """
+    Apply the query-time knobs (nprobe / efSearch) to a built or loaded index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(IVF_NPROBE, ivf.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def build_index(index_type: str, train_vectors):
+    """
+    Empty index of `index_type`, trained on `train_vectors` when the
+    type needs it. Falls back to flat when there are too few vectors.
+
+    Vectors are normalized e5 embeddings and every type uses L2,
+    like the flat index LangChain builds, so rankings stay comparable.
+    """
+    validate_index_type(index_type)
+    train_vectors = np.ascontiguousarray(train_vectors, dtype=np.float32)
+    n, dim = train_vectors.shape
+
+    if not can_train(index_type, n):
+        print(f"[INFO] {n} vectors are too few to train {index_type}; using a flat index for now.")
+        index_type = "flat"
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        return configure_search(index)
+
+    nlist = max(1, min(IVF_NLIST, n // IVF_POINTS_PER_LIST))
+    if index_type == "ivf_flat":
+        description = f"IVF{nlist},Flat"
+    else:
+        if dim % IVF_PQ_M:
+            raise ValueError(f"IVF_PQ_M={IVF_PQ_M} must divide the dimension {dim}")
+        description = f"IVF{nlist},PQ{IVF_PQ_M}x{IVF_PQ_BITS}"
+
+    print(f"[INFO] Training {description} index on {n} vectors...")
+    index = faiss.index_factory(dim, description)
+    index.train(train_vectors)
+
+    # Hashtable direct map (id -> list entry): reconstruct_batch works
+    # for per-document partitions and deletes use remove_ids(), which
+    # leaves the other ids (chunk positions) unchanged.
+    faiss.extract_index_ivf(index).set_direct_map_type(faiss.DirectMap.Hashtable)
+
+    return configure_search(index)
+
+
+def _use_hashtable_direct_map(ivf):
+    # IVF indexes built before in-place deletes have an array direct
+    # map, which supports neither add_with_ids() nor remove_ids()
+    if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def add_vectors(index, vectors, start: int):
+    """
+    Add vectors under ids start, start + 1, ... IVF ids survive
+    remove_ids(), so they are given explicitly; flat and HNSW number
+    vectors in insertion order, so `start` must be index.ntotal.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        _use_hashtable_direct_map(ivf)
+        index.add_with_ids(vectors, np.arange(start, start + len(vectors), dtype=np.int64))
+        return
+
+    if start != index.ntotal:
+        raise ValueError(f"{index_type_of(index)} index adds at id {index.ntotal}, not {start}")
+    index.add(vectors)
+
+
+def delete_mode(index) -> str:
+    """
+    How vectors are deleted from `index`:
+    - "compact"   : flat, remove_ids() shifts later ids down
+    - "remove"    : IVF, remove_ids() keeps the other ids
+    - "tombstone" : HNSW cannot remove; ids are skipped at search time
+    """
+    index_type = index_type_of(index)
+    if index_type == "flat":
+        return "compact"
+    if index_type == "hnsw":
+        return "tombstone"
+    return "remove"
+
+
+def remove_vectors(index, ids):
+    """
+    remove_ids() on a flat or IVF index.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        _use_hashtable_direct_map(ivf)
+
+    return index.remove_ids(np.asarray(ids, dtype=np.int64))
+
+
+def needs_compaction(index, removed: int) -> bool:
+    return delete_mode(index) == "tombstone" and removed > HNSW_COMPACT_RATIO * index.ntotal
+
+
+def search_params(index, removed):
+    """
+    Search parameters skipping the `removed` ids (HNSW tombstones),
+    or None when there are none. Keep the result alive while searching:
+    it owns the id selector.
+    """
+    if not len(removed) or not isinstance(index, faiss.IndexHNSW):
+        return None
+
+    batch = faiss.IDSelectorBatch(np.asarray(removed, dtype=np.int64))
+    selector = faiss.IDSelectorNot(batch)
+    params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    params.referenced_objects = [batch, selector]
+    return params
+
+
+def stores_exact_vectors(index) -> bool:
+    """
+    Whether reconstruct() returns the original vectors (PQ is lossy).
+    """
+    return index_type_of(index) != "ivf_pq"
+
+
+# Read-only memory map; IFC also maps flat vector storage in place
+MMAP_FLAG = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+def load_index(path: str, mmap: bool = True):
+    """
+    Read a saved index. With `mmap`, vectors / inverted lists stay on
+    disk and are paged in on access, so load time and resident memory
+    do not grow with the corpus. Mapped indexes are read-only.
+    """
+    index = faiss.read_index(path, MMAP_FLAG if mmap else 0)
+    return configure_search(index)
+
+
+def save_index(index, path: str):
+    """
+    Write the index atomically (temp file + rename). Readers holding a
+    map of the previous file keep a valid view of it.
+    """
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
@@ -0,0 +1,209 @@
+from app.services.bm25 import BM25Index
+from app.services.chunk_store import ChunkStore
+from app.services.index_factory import index_type_of, load_index, save_index, search_params
+from collections import OrderedDict
+import json
+import os
+import re
+import shutil
+import threading
+
+
+# Layout of a versioned directory (each time shard, see shards.py):
+#   CURRENT              name of the published version (swapped atomically)
+#   versions/v000042/    index.faiss + chunks.db + manifest.json of one version
+# (chunks.db also holds the chunks' reranker vectors).
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+
+_VERSION_RE = re.compile(r"^v(\d+)$")
+
+
+def versions_dir(root: str) -> str:
+    return os.path.join(root, VERSIONS_DIR)
+
+
+def version_names(root: str):
+    """
+    Version directory names on disk, oldest first.
+    """
+    folder = versions_dir(root)
+    if not os.path.isdir(folder):
+        return []
+
+    names = [name for name in os.listdir(folder) if _VERSION_RE.match(name)]
+    return sorted(names, key=lambda name: int(name[1:]))
+
+
+def next_version_name(root: str) -> str:
+    names = version_names(root)
+    number = int(names[-1][1:]) + 1 if names else 1
+    return f"v{number:06d}"
+
+
+def read_current(root: str):
+    """
+    Name of the published version, or None.
+    """
+    path = os.path.join(root, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as f:
+        name = f.read().strip()
+
+    if not _VERSION_RE.match(name) or not os.path.isdir(os.path.join(versions_dir(root), name)):
+        return None
+    return name
+
+
+def write_current(root: str, name):
+    """
+    Point CURRENT at `name` (temp file + rename, so a crash leaves
+    either the old or the new pointer). None removes the pointer.
+    """
+    path = os.path.join(root, CURRENT_FILE)
+
+    if name is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_manifest(path: str, manifest: dict):
+    tmp_path = os.path.join(path, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, os.path.join(path, MANIFEST_FILE))
+
+
+def read_index_type(path: str):
+    """
+    Index type recorded in a version's manifest, or None for
+    versions written before manifests existed.
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), "r") as f:
+            return json.load(f).get("index_type")
+    except (OSError, ValueError):
+        return None
+
+
+def remove_versions(root: str, keep=()):
+    """
+    Delete version directories not named in `keep`: superseded
+    versions and drafts left behind by a crash.
+    """
+    for name in version_names(root):
+        if name not in keep:
+            shutil.rmtree(os.path.join(versions_dir(root), name), ignore_errors=True)
+
+
+class IndexVersion:
+    """
+    One version of the index: FAISS file + chunk store (+ BM25) in
+    its own directory.
+
+    A draft (create()) is private to the writer: a copy of the base
+    version, loaded into memory and mutated freely. save() writes and
+    seals it. A published version (open()) is never modified again:
+    the index is memory-mapped and the chunk store opened read-only,
+    so any number of readers can use it without locking.
+
+    `index_type` is the type the shard was built or migrated as, kept
+    in the version's manifest. The index itself can still be flat when
+    there were too few vectors to train that type (see build_index).
+
+    `readers` / `retired` implement the read-copy-update lifetime:
+    once a newer version is published this one is retired and its
+    directory removed when the last in-flight reader releases it.
+    """
+
+    def __init__(self, path: str, index, chunks: ChunkStore, doc_partitions=None, index_type: str = None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.root = os.path.dirname(os.path.dirname(path))
+        self.index = index
+        self.chunks = chunks
+        self.bm25 = BM25Index(chunks.conn)
+        self.index_type = index_type
+
+        # FAISS ids deleted but still in the index (HNSW tombstones),
+        # skipped by search()
+        self.removed = chunks.removed_positions()
+        self.search_params = None if index is None else search_params(index, self.removed)
+
+        # doc_id -> (vectors, chunk ids), see RAGStore._doc_partition
+        self.doc_partitions = OrderedDict(doc_partitions or ())
+        self.partitions_lock = threading.Lock()
+
+        self.readers = 0
+        self.retired = False
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.path, INDEX_FILE)
+
+    @property
+    def live_vectors(self) -> int:
+        """
+        Vectors of chunks still in the version (tombstones excluded).
+        """
+        return self.index.ntotal - len(self.removed)
+
+    def search(self, queries, k: int):
+        if self.search_params is None:
+            return self.index.search(queries, k)
+        return self.index.search(queries, k, params=self.search_params)
+
+    @classmethod
+    def open(cls, path: str, doc_partitions=None):
+        """
+        A published version, read-only.
+        """
+        index = load_index(os.path.join(path, INDEX_FILE))
+        return cls(path, index, ChunkStore(path, read_only=True), doc_partitions, read_index_type(path))
+
+    @classmethod
+    def create(cls, root: str, base=None, index_type: str = None):
+        """
+        New draft directory, copied from `base` (or empty). Its index
+        is None until the caller builds one. `index_type` defaults to
+        the base's.
+        """
+        path = os.path.join(versions_dir(root), next_version_name(root))
+        os.makedirs(path)
+
+        if base is None:
+            return cls(path, None, ChunkStore(path), index_type=index_type)
+
+        index = load_index(base.index_path, mmap=False)
+        return cls(path, index, base.chunks.copy(path), index_type=index_type or base.index_type)
+
+    def save(self):
+        """
+        Write the draft's index and manifest and seal its chunk store.
+        The draft must not be used afterwards; open() the path to read it.
+        """
+        save_index(self.index, self.index_path)
+        write_manifest(self.path, {"index_type": self.index_type or index_type_of(self.index)})
+        self.chunks.seal()
+        self.index = None
+
+    def close(self):
+        self.chunks.close()
+        self.index = None
+        self.doc_partitions.clear()
+
+    def destroy(self):
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
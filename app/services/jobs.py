@@ -0,0 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from collections import OrderedDict
+import copy
+import os
+import threading
+import traceback
+import uuid
+
+
+# Ingestion runs in a bounded pool so OCR / embedding never blocks the event loop
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+
+# Finished jobs kept for status queries
+MAX_JOB_HISTORY = 500
+
+
+class JobManager:
+    """
+    Runs ingestion callables in a background worker pool and keeps
+    their status + progress for the /jobs endpoints.
+
+    The callable receives a `progress(**fields)` keyword argument
+    it can use to report stage counters.
+    """
+
+    def __init__(self, max_workers: int = INGEST_WORKERS):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="ingest"
+        )
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs) -> dict:
+        job_id = str(uuid.uuid4())
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "progress": {
+                "stage": "queued",
+                "pages_extracted": 0,
+                "chunks_total": 0,
+                "chunks_embedded": 0,
+                "indexed": False
+            },
+            "result": None,
+            "error": None
+        }
+
+        with self._lock:
+            self._jobs[job_id] = job
+            self._trim_history()
+
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return self.get(job_id)
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._set(job_id, status="running")
+
+        def progress(**fields):
+            with self._lock:
+                self._jobs[job_id]["progress"].update(fields)
+
+        try:
+            result = fn(*args, progress=progress, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._set(job_id, status="failed", error=str(e))
+        else:
+            progress(stage="done", indexed=True)
+            self._set(job_id, status="completed", result=result)
+
+    def _set(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            if fields.get("status") in ("completed", "failed"):
+                job["finished_at"] = datetime.utcnow().isoformat()
+
+    def _trim_history(self):
+        # Drop the oldest finished jobs; queued / running ones are kept
+        finished = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in ("completed", "failed")
+        ]
+        for job_id in finished[:max(0, len(self._jobs) - MAX_JOB_HISTORY)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def list(self):
+        with self._lock:
+            return [copy.deepcopy(job) for job in reversed(self._jobs.values())]
@@ -0,0 +1,251 @@
+from datetime import datetime, timezone
+import json
+import os
+import sqlite3
+import threading
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+DOCS_DIR = os.path.join(BASE_DIR, "data", "docs")
+METADATA_DB_PATH = os.path.join(DOCS_DIR, "metadata.db")
+
+# Pre-SQLite registry; imported once, then renamed
+LEGACY_METADATA_PATH = os.path.join(DOCS_DIR, "metadata.json")
+
+
+def to_epoch_seconds(uploaded_at):
+    """
+    uploaded_at as epoch seconds. metadata.json stored ISO-8601
+    strings (naive UTC); older entries may hold epoch seconds.
+    """
+    if isinstance(uploaded_at, (int, float)):
+        return float(uploaded_at)
+    try:
+        return datetime.fromisoformat(uploaded_at).replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def to_iso(epoch_seconds) -> str:
+    return datetime.fromtimestamp(epoch_seconds, tz=timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class MetadataStore:
+    """
+    Registry of uploaded documents in SQLite.
+
+    Every write is its own transaction, so concurrent uploads,
+    deletes and cleanups never overwrite each other. doc_id is the
+    primary key, uploaded_at (epoch seconds) is indexed for
+    retention range scans and content_hash (SHA-256 of the PDF) for
+    duplicate detection.
+    """
+
+    def __init__(self, path: str = METADATA_DB_PATH, legacy_path: str = LEGACY_METADATA_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+
+        with self.conn:
+            self.conn.executescript("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    original_filename TEXT NOT NULL,
+                    stored_filename TEXT NOT NULL,
+                    uploaded_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS documents_uploaded_at ON documents(uploaded_at);
+            """)
+
+            # Added after the first release; older databases gain the column
+            columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(documents)")}
+            if "content_hash" not in columns:
+                self.conn.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS documents_content_hash ON documents(content_hash)"
+            )
+
+        self._import_legacy(legacy_path)
+
+    def _import_legacy(self, legacy_path: str):
+        """
+        One-time import of metadata.json, then rename it so it is
+        never read again.
+        """
+        if not legacy_path or not os.path.exists(legacy_path):
+            return
+
+        entries = []
+        if os.path.getsize(legacy_path) > 0:
+            try:
+                with open(legacy_path, "r") as f:
+                    entries = json.load(f)
+            except json.JSONDecodeError:
+                print("[INFO] metadata.json is not valid JSON; skipping import.")
+                return
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO documents (doc_id, original_filename, stored_filename, uploaded_at) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        entry["doc_id"],
+                        entry["original_filename"],
+                        entry["stored_filename"],
+                        to_epoch_seconds(entry.get("uploaded_at"))
+                    )
+                    for entry in entries
+                ]
+            )
+
+        os.replace(legacy_path, f"{legacy_path}.migrated")
+        print(f"[INFO] Imported {len(entries)} documents from metadata.json.")
+
+    @staticmethod
+    def _to_entry(row) -> dict:
+        return {
+            "doc_id": row["doc_id"],
+            "original_filename": row["original_filename"],
+            "stored_filename": row["stored_filename"],
+            "uploaded_at": to_iso(row["uploaded_at"]) if row["uploaded_at"] is not None else None,
+            "content_hash": row["content_hash"]
+        }
+
+    @staticmethod
+    def _to_row(entry: dict):
+        return (
+            entry["doc_id"],
+            entry["original_filename"],
+            entry["stored_filename"],
+            to_epoch_seconds(entry.get("uploaded_at")),
+            entry.get("content_hash")
+        )
+
+    def add(self, entry: dict):
+        self.add_many([entry])
+
+    def add_many(self, entries):
+        """
+        Register several documents in one transaction.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO documents VALUES (?, ?, ?, ?, ?)",
+                [self._to_row(entry) for entry in entries]
+            )
+
+    def add_new(self, entries):
+        """
+        Register the entries whose content_hash is not registered yet,
+        in one transaction (so two uploads of the same file cannot both
+        get in). Returns (added, duplicates); each duplicate is
+        (entry, registered entry with the same content).
+        """
+        added = []
+        duplicates = []
+
+        with self._lock, self.conn:
+            for entry in entries:
+                row = self.conn.execute(
+                    "SELECT * FROM documents WHERE content_hash = ? ORDER BY uploaded_at LIMIT 1",
+                    (entry["content_hash"],)
+                ).fetchone()
+
+                if row:
+                    duplicates.append((entry, self._to_entry(row)))
+                else:
+                    self.conn.execute("INSERT INTO documents VALUES (?, ?, ?, ?, ?)", self._to_row(entry))
+                    added.append(entry)
+
+        return added, duplicates
+
+    def get_by_hash(self, content_hash: str):
+        """
+        The (first) document with this content, or None.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM documents WHERE content_hash = ? ORDER BY uploaded_at LIMIT 1",
+                (content_hash,)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def missing_hashes(self):
+        """
+        Documents registered before content hashes were recorded.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM documents WHERE content_hash IS NULL"
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def set_hash(self, doc_id: str, content_hash: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE documents SET content_hash = ? WHERE doc_id = ?",
+                (content_hash, doc_id)
+            )
+
+    def get(self, doc_id: str):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT * FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def contains(self, doc_id: str) -> bool:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT 1 FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone() is not None
+
+    def remove(self, doc_id: str) -> bool:
+        return self.remove_many([doc_id]) > 0
+
+    def remove_many(self, doc_ids) -> int:
+        with self._lock, self.conn:
+            cursor = self.conn.executemany(
+                "DELETE FROM documents WHERE doc_id = ?",
+                [(doc_id,) for doc_id in doc_ids]
+            )
+            return cursor.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def list(self, limit: int = None, offset: int = 0):
+        """
+        Documents in upload order. `limit=None` returns all of them.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM documents ORDER BY uploaded_at, doc_id LIMIT ? OFFSET ?",
+                (-1 if limit is None else limit, offset)
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def uploaded_before(self, cutoff_seconds: float):
+        """
+        Documents uploaded before `cutoff_seconds` (epoch), via the
+        uploaded_at index. Entries without a timestamp never expire.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM documents WHERE uploaded_at < ? ORDER BY uploaded_at",
+                (cutoff_seconds,)
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def clear(self):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM documents")
@@ -0,0 +1,196 @@
+import os
+import threading
+
+# torch, transformers and langchain are imported by the loaders
+# below, on first use, so importing the app stays fast
+
+
+EMBEDDING_MODEL = "intfloat/e5-small-v2"
+RERANKER_MODEL = "all-MiniLM-L6-v2"
+LLM_MODEL = "google/flan-t5-small"
+
+MAX_NEW_TOKENS = 128
+
+# Registry name of the reranker's embedding cache
+RERANK_CACHE = f"{RERANKER_MODEL}:cache"
+
+# sentence-transformers max_seq_length of each encoder
+MAX_SEQ_LENGTH = {
+    EMBEDDING_MODEL: 512,
+    RERANKER_MODEL: 256
+}
+
+# "torch" (default) or "onnx": int8-quantized ONNX Runtime models,
+# exported on first load (needs optimum[onnxruntime]). Each model
+# falls back to PyTorch on its own if ONNX is unavailable for it.
+INFERENCE_BACKENDS = ("torch", "onnx")
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+# =======================
+# Process-wide registry
+# =======================
+
+_models = {}
+_lock = threading.RLock()   # loaders may fetch other models (see get_rerank_cache)
+
+
+def _get_or_load(name: str, loader):
+    """
+    Return the model registered under `name`, loading it on first use.
+    Every RAGStore and ingestion call in the process shares one instance.
+    """
+    model = _models.get(name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(name)
+        if model is None:
+            print(f"[INFO] Loading model: {name}")
+            model = loader()
+            _models[name] = model
+
+    return model
+
+
+def loaded(name: str):
+    """
+    The model registered under `name` if it is loaded, else None.
+    """
+    return _models.get(name)
+
+
+def _with_fallback(model_name: str, backend: str, onnx_loader, torch_loader, fallback: bool = True):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Use one of: {', '.join(INFERENCE_BACKENDS)}")
+
+    if backend == "onnx":
+        try:
+            return onnx_loader()
+        except Exception as e:
+            # optimum / onnxruntime not installed, or the export failed
+            if not fallback:
+                raise
+            print(f"[INFO] ONNX backend unavailable for {model_name} ({type(e).__name__}: {e}); using PyTorch.")
+
+    return torch_loader()
+
+
+def backend_of(model) -> str:
+    return getattr(model, "inference_backend", "torch")
+
+
+def cache_name(model_name: str, model) -> str:
+    """
+    Embedding-cache name for vectors computed by `model`. PyTorch
+    keeps the plain model name, so existing caches stay valid.
+    """
+    backend = backend_of(model)
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def _load_onnx_embedding():
+    from app.services.onnx_backend import OnnxEmbeddings, OnnxSentenceEncoder
+    return OnnxEmbeddings(OnnxSentenceEncoder(EMBEDDING_MODEL, MAX_SEQ_LENGTH[EMBEDDING_MODEL]))
+
+
+def _load_torch_embedding():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        encode_kwargs={"normalize_embeddings": True}
+    )
+
+
+def _load_onnx_reranker():
+    from app.services.onnx_backend import OnnxSentenceEncoder
+    return OnnxSentenceEncoder(RERANKER_MODEL, MAX_SEQ_LENGTH[RERANKER_MODEL])
+
+
+def _load_torch_reranker():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(RERANKER_MODEL)
+
+
+def _load_onnx_seq2seq():
+    from app.services.onnx_backend import load_seq2seq
+    return load_seq2seq(LLM_MODEL)
+
+
+def _load_torch_seq2seq():
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    return AutoTokenizer.from_pretrained(LLM_MODEL), AutoModelForSeq2SeqLM.from_pretrained(LLM_MODEL)
+
+
+def load_embedding_model(backend: str = INFERENCE_BACKEND, fallback: bool = True):
+    """
+    e5 embeddings (LangChain Embeddings), uncached.
+    """
+    return _with_fallback(
+        EMBEDDING_MODEL, backend,
+        _load_onnx_embedding,
+        _load_torch_embedding,
+        fallback
+    )
+
+
+def load_reranker_model(backend: str = INFERENCE_BACKEND, fallback: bool = True):
+    return _with_fallback(
+        RERANKER_MODEL, backend,
+        _load_onnx_reranker,
+        _load_torch_reranker,
+        fallback
+    )
+
+
+def load_llm(backend: str = INFERENCE_BACKEND, fallback: bool = True):
+    tokenizer, model = _with_fallback(
+        LLM_MODEL, backend,
+        _load_onnx_seq2seq,
+        _load_torch_seq2seq,
+        fallback
+    )
+
+    from langchain_community.llms import HuggingFacePipeline
+    from transformers import pipeline
+
+    hf_pipeline = pipeline(
+        "text2text-generation",
+        model=model,
+        tokenizer=tokenizer,
+        max_new_tokens=MAX_NEW_TOKENS,
+        temperature=0,
+        truncation=True
+    )
+
+    return HuggingFacePipeline(pipeline=hf_pipeline)
+
+
+def _load_embedding():
+    from app.services.embedding_cache import EmbeddingCache, CachedEmbeddings
+
+    # Passage embeddings are cached on disk by model + text hash
+    base = load_embedding_model()
+    return CachedEmbeddings(base, EmbeddingCache(cache_name(EMBEDDING_MODEL, base)))
+
+
+def get_embedding():
+    return _get_or_load(EMBEDDING_MODEL, _load_embedding)
+
+
+def get_reranker():
+    return _get_or_load(RERANKER_MODEL, load_reranker_model)
+
+
+def get_llm():
+    return _get_or_load(LLM_MODEL, load_llm)
+
+
+def _load_rerank_cache():
+    from app.services.embedding_cache import EmbeddingCache
+    return EmbeddingCache(cache_name(RERANKER_MODEL, get_reranker()))
+
+
+def get_rerank_cache():
+    # Reranker passage vectors, cached like the e5 ones
+    return _get_or_load(RERANK_CACHE, _load_rerank_cache)
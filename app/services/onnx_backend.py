@@ -0,0 +1,202 @@
+from langchain_core.embeddings import Embeddings
+import numpy as np
+import os
+import re
+import shutil
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+# Exported + int8-quantized models, one directory per model name
+ONNX_MODELS_DIR = os.getenv("ONNX_MODELS_DIR", os.path.join(BASE_DIR, "data", "models", "onnx"))
+
+# ONNX Runtime threads per session. Requests run the embedder,
+# reranker and generator concurrently, so the default leaves the
+# cores to those threads instead of each session claiming all of them.
+ORT_INTRA_OP_THREADS = int(os.getenv("ORT_INTRA_OP_THREADS", max(1, (os.cpu_count() or 1) // 2)))
+ORT_INTER_OP_THREADS = int(os.getenv("ORT_INTER_OP_THREADS", 1))
+
+# Tag for this backend's vectors in the embedding caches: int8
+# vectors are close to, but not bit-identical with, the PyTorch ones
+BACKEND_TAG = "onnx-int8"
+
+
+def hub_model_id(model_name: str) -> str:
+    """
+    sentence-transformers resolves short names ("all-MiniLM-L6-v2")
+    to its own organisation; the ONNX exporter needs the full id.
+    """
+    return model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+
+
+def model_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODELS_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name) + "-int8")
+
+
+def session_options():
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = ORT_INTRA_OP_THREADS
+    options.inter_op_num_threads = ORT_INTER_OP_THREADS
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return options
+
+
+def export_quantized(model_name: str, seq2seq: bool = False) -> str:
+    """
+    Export `model_name` to ONNX and apply int8 dynamic quantization
+    (weights int8, activations quantized at run time) to every graph.
+    Done once; later loads reuse the directory.
+
+    The model is built in a temp directory and renamed into place,
+    so an interrupted export is redone instead of loaded half-written.
+    """
+    folder = model_dir(model_name)
+    if os.path.isdir(folder):
+        return folder
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+
+    print(f"[INFO] Exporting {model_name} to ONNX (int8)")
+
+    model_id = hub_model_id(model_name)
+    export_dir = f"{folder}.export"
+    tmp_dir = f"{folder}.tmp"
+    shutil.rmtree(export_dir, ignore_errors=True)
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    try:
+        # 1️⃣ Export (fp32), with the tokenizer next to the graphs
+        model_cls = ORTModelForSeq2SeqLM if seq2seq else ORTModelForFeatureExtraction
+        model_cls.from_pretrained(model_id, export=True).save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(export_dir)
+
+        # 2️⃣ Quantize each graph under its original file name, so the
+        # quantized directory loads exactly like the exported one
+        shutil.copytree(export_dir, tmp_dir, ignore=shutil.ignore_patterns("*.onnx", "*.onnx_data"))
+        for name in sorted(os.listdir(export_dir)):
+            if name.endswith(".onnx"):
+                quantize_dynamic(
+                    os.path.join(export_dir, name),
+                    os.path.join(tmp_dir, name),
+                    weight_type=QuantType.QInt8
+                )
+
+        os.replace(tmp_dir, folder)
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return folder
+
+
+class OnnxSentenceEncoder:
+    """
+    Sentence embeddings from a quantized ONNX encoder, with the
+    SentenceTransformer surface the store uses (encode(),
+    get_sentence_embedding_dimension()). Mean pooling over the
+    attention mask, as in the e5 and MiniLM sentence-transformers
+    configs.
+    """
+
+    inference_backend = BACKEND_TAG
+
+    def __init__(self, model_name: str, max_seq_length: int = 512, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        folder = export_quantized(model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(folder)
+        self.session = ort.InferenceSession(
+            os.path.join(folder, "model.onnx"),
+            sess_options=session_options(),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [node.name for node in self.session.get_inputs()]
+        self.max_seq_length = max_seq_length
+        self.batch_size = batch_size
+
+        self._dim = self._encode_batch(["dimension probe"]).shape[1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+    def _encode_batch(self, texts):
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np"
+        )
+        feed = {
+            name: inputs[name].astype(np.int64)
+            for name in self.input_names
+            if name in inputs
+        }
+        hidden = self.session.run(["last_hidden_state"], feed)[0]
+
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(self, sentences, normalize_embeddings: bool = False, batch_size: int = None, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+
+        if not texts:
+            return np.zeros((0, self._dim), dtype=np.float32)
+
+        vectors = np.vstack([
+            self._encode_batch(texts[start:start + batch_size])
+            for start in range(0, len(texts), batch_size)
+        ]).astype(np.float32)
+
+        if normalize_embeddings:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+        return vectors[0] if single else vectors
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    LangChain Embeddings over an OnnxSentenceEncoder, in place of
+    HuggingFaceEmbeddings (normalized, like encode_kwargs there).
+    """
+
+    inference_backend = BACKEND_TAG
+
+    def __init__(self, encoder: OnnxSentenceEncoder):
+        self.encoder = encoder
+
+    def embed_documents(self, texts):
+        return self.encoder.encode(list(texts), normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str):
+        return self.encoder.encode(text, normalize_embeddings=True).tolist()
+
+
+def load_seq2seq(model_name: str):
+    """
+    (tokenizer, model) for a quantized ONNX seq2seq model. The model
+    implements generate(), so it drops into the text2text-generation
+    pipeline and the token streamer unchanged.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import AutoTokenizer
+
+    folder = export_quantized(model_name, seq2seq=True)
+    tokenizer = AutoTokenizer.from_pretrained(folder)
+    model = ORTModelForSeq2SeqLM.from_pretrained(
+        folder,
+        session_options=session_options(),
+        provider="CPUExecutionProvider"
+    )
+    model.inference_backend = BACKEND_TAG
+    return tokenizer, model
@@ -1,256 +1,1684 @@
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.llms import HuggingFacePipeline
-from sentence_transformers import SentenceTransformer, util
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnablePassthrough, RunnableLambda
-from langchain_core.output_parsers import StrOutputParser
-
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-import os
-import re
-
-
-BASE_DIR = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..", "..")
-)
-
-DEFAULT_FAISS_PATH = os.path.join(BASE_DIR, "data", "faiss_index")
-
-def adaptive_k(question: str) -> int:
-    length = len(question.split())
-    if length <= 6:
-        return 3
-    elif length <= 15:
-        return 5
-    else:
-        return 8
-
-
-def format_docs(docs):
-    """Convert list of Documents into a single context string"""
-    return "\n\n".join(doc.page_content for doc in docs)
-
-def extract_full_sentences(text: str, max_chars=400):
-    """
-    Extract full sentences up to max_chars.
-    Never cuts mid-sentence.
-    """
-    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-
-    result = ""
-    for sent in sentences:
-        if len(result) + len(sent) > max_chars:
-            break
-        result += sent + " "
-
-    return result.strip()
-
-class RAGStore:
-    def __init__(self, db_path: str = DEFAULT_FAISS_PATH):
-        self.reranker = SentenceTransformer("all-MiniLM-L6-v2")
-        self.db_path = db_path
-
-        # Embeddings
-        self.embedding = HuggingFaceEmbeddings(
-            model_name="intfloat/e5-small-v2",
-            encode_kwargs={"normalize_embeddings": True}
-        )
-
-        # Local LLM (FLAN-T5)
-        model_id = "google/flan-t5-small"
-        tokenizer = AutoTokenizer.from_pretrained(model_id)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_id)
-
-        hf_pipeline = pipeline(
-            "text2text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_new_tokens=128,
-            temperature=0,
-            truncation=True 
-        )
-
-        self.llm = HuggingFacePipeline(pipeline=hf_pipeline)
-
-        # Prompt
-        self.prompt = PromptTemplate(
-            input_variables=["context", "question"],
-            template=(
-                "Answer the question using ONLY the context below.\n"
-                "If the answer is not in the context, say:\n"
-                "\"NOT_FOUND\"\n\n"
-                "Context:\n{context}\n\n"
-                "Question:\n{question}\n\n"
-                "Answer:"
-            )
-        )
-
-    def rerank(self, query: str, docs):
-        
-        if not docs:
-            return docs
-        texts = [doc.page_content for doc in docs]
-        q_emb = self.reranker.encode(query, convert_to_tensor=True,normalize_embeddings=True)
-        d_emb = self.reranker.encode(texts, convert_to_tensor=True,normalize_embeddings=True)
-
-        scores = util.cos_sim(q_emb, d_emb)[0]
-        ranked = sorted(
-            zip(scores, docs),
-            key=lambda x: x[0],
-            reverse=True
-        )
-        SIMILARITY_THRESHOLD = 0.35  # empirically good for MiniLM
-
-        filtered = [
-            doc for score, doc in ranked
-            if score >= SIMILARITY_THRESHOLD
-        ]
-
-        return filtered[:5]
-
-    
-    def load_store_if_exists(self):
-        """
-        Load FAISS only if it exists.
-        Do NOT create empty FAISS.
-        """
-        if os.path.exists(self.db_path):
-            print("[INFO] Loading existing FAISS index...")
-            self.vstore = FAISS.load_local(
-                self.db_path,
-                self.embedding,
-                allow_dangerous_deserialization=True
-            )
-
-            self.retriever = self.vstore.as_retriever(search_kwargs={"k": 5})
-
-            self.chain = (
-                {
-                    "context": self.retriever | RunnableLambda(format_docs),
-                    "question": RunnablePassthrough()
-                }
-                | self.prompt
-                | self.llm
-                | StrOutputParser()
-            )
-        else:
-            print("[INFO] FAISS index not found. RAG disabled until first upload.")
-            self.vstore = None
-            self.retriever = None
-            self.chain = None
-
-
-
-    def ask(self, question: str, doc_id: str = None):
-        print("\n[DEBUG] Requested doc_id:", repr(doc_id))
-
-        # inspect one stored document's metadata
-        if self.vstore:
-            sample = self.vstore.docstore._dict
-            first_doc = next(iter(sample.values()))
-            print("[DEBUG] Sample stored metadata:", first_doc.metadata)
-
-    
-        # 1️⃣ Choose retriever behavior
-        k = adaptive_k(question)
-
-        if doc_id:
-            retriever = self.vstore.as_retriever(
-                search_kwargs={"k": k, "filter": {"doc_id": doc_id}}
-            )
-        else:
-            retriever = self.vstore.as_retriever(
-                search_kwargs={"k": k}
-            )
-
-        # 2️⃣ Retrieve ONCE
-        base_query = f"query: {question}"
-
-        docs = retriever.invoke(base_query)
-        docs = self.rerank(base_query, docs)
-        
-        if not docs:
-            expanded_query = (
-                f"query: {question}. "
-                "Related terms: customer due diligence, identity verification, "
-                "ongoing monitoring, record updation."
-            )
-
-            docs = retriever.invoke(expanded_query)
-            docs = self.rerank(expanded_query, docs)
-
-
-        # 3️⃣ Combine retrieved docs into context
-        MAX_CONTEXT_CHARS = 1200  # safe for FLAN-T5-small
-
-        context = "\n\n".join([doc.page_content for doc in docs])
-        context = context[:MAX_CONTEXT_CHARS]
-
-
-        # 4️⃣ Call LLM explicitly with the SAME context
-        raw_answer = self.llm.invoke(
-            self.prompt.format(
-                context=context,
-                question=question
-            )
-        )
-        
-        # 🔧 Normalize HuggingFacePipeline output
-        if isinstance(raw_answer, list):
-            answer = raw_answer[0].get("generated_text", "").strip()
-        elif isinstance(raw_answer, dict):
-            answer = raw_answer.get("generated_text", "").strip()
-        else:
-            answer = str(raw_answer).strip()
-            
-        if answer == "NOT_FOUND":
-            return {
-                "answer": "The provided documents do not contain this information.",
-                "sources": []
-            }
-
-        # 5️⃣ Build sources from the SAME docs
-        sources = [
-            {
-                "doc_id": doc.metadata.get("doc_id"),
-                "original_filename": doc.metadata.get("original_filename"),
-                "chunk_id": doc.metadata.get("chunk_id"),
-                "page": doc.metadata.get("page"),
-                "excerpt": extract_full_sentences(doc.page_content.replace("passage:", "").strip(),max_chars=400)
-            }
-            for doc in docs
-        ]
-
-        return {
-            "answer": answer if answer else "The provided documents do not contain this information.",
-            "sources": sources
-        }
-
-
-    
-    def add_documents(self, documents):
-        """
-        Create FAISS if it doesn't exist, otherwise append.
-        """
-        if self.vstore is None:
-            print("[INFO] Creating FAISS index with first document batch...")
-            self.vstore = FAISS.from_documents(documents, self.embedding)
-        else:
-            self.vstore.add_documents(documents)
-
-        self.vstore.save_local(self.db_path)
-
-        # Rebuild retriever & chain
-        self.retriever = self.vstore.as_retriever(search_kwargs={"k": 5})
-
-        self.chain = (
-            {
-                "context": self.retriever | RunnableLambda(format_docs),
-                "question": RunnablePassthrough()
-            }
-            | self.prompt
-            | self.llm
-            | StrOutputParser()
-        )
-
+from app.services.models import (
+    get_embedding, get_reranker, get_llm, get_rerank_cache, loaded, EMBEDDING_MODEL, RERANK_CACHE, MAX_NEW_TOKENS
+)
+from app.services.answer_cache import AnswerCache
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion, search_indexes
+from app.services.chunk_store import ChunkStore, CHUNKS_DB_FILE
+from app.services.index_factory import (
+    FAISS_INDEX_TYPE, add_vectors, build_index, can_train, delete_mode, index_type_of,
+    needs_compaction, remove_vectors, stores_exact_vectors, validate_index_type
+)
+from app.services.index_versions import (
+    INDEX_FILE, IndexVersion, next_version_name, read_current, remove_versions,
+    version_names, versions_dir, write_current
+)
+from app.services.metadata_store import to_epoch_seconds
+from app.services.shards import SHARD_PERIOD, SHARDS_DIR, shard_bounds, shard_key, shard_keys, shard_root
+from app.utils.metrics import (
+    timed, STAGE_SECONDS, QUESTIONS, NOT_FOUND, CHUNKS_RETRIEVED, CHUNKS_INGESTED, CONTEXT_TOKENS
+)
+import itertools
+import numpy as np
+import os
+import re
+import queue
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+DEFAULT_FAISS_PATH = os.path.join(BASE_DIR, "data", "faiss_index")
+
+# Chunks are sharded by upload period (app/services/shards.py); each
+# shard change is written as a new version directory (see
+# app/services/index_versions.py) and published atomically.
+
+# Written by LangChain's FAISS.save_local / older versions of this
+# store; converted once on load, then removed
+LEGACY_DOCSTORE_FILE = "index.pkl"
+LEGACY_BM25_FILE = "bm25.json"
+
+# Reranker vectors used to live in one append-only file shared by all
+# shards; they are now stored per chunk in each version's chunks.db.
+# The old file is removed on load (chunks without a stored vector are
+# encoded on the fly, from the reranker's embedding cache).
+LEGACY_RERANK_VECTORS_FILE = "rerank.f32"
+
+# Chunks embedded per call during ingestion (progress is reported per batch)
+EMBED_BATCH_SIZE = 64
+
+# Generation micro-batching: prompts arriving within GEN_MAX_WAIT_MS
+# are run through flan-t5 together, up to GEN_MAX_BATCH at a time.
+GEN_MAX_BATCH = int(os.getenv("GEN_MAX_BATCH", 8))
+GEN_MAX_WAIT_MS = float(os.getenv("GEN_MAX_WAIT_MS", 15))
+
+# Generation lanes: interactive prompts (/ask) are always taken before
+# queued batch prompts (/ask/batch), so a long questionnaire delays a
+# question by one micro-batch at most instead of the whole backlog.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+NOT_FOUND_MESSAGE = "The provided documents do not contain this information."
+
+PROMPT_TEMPLATE = (
+    "Answer the question using ONLY the context below.\n"
+    "If the answer is not in the context, say:\n"
+    "\"NOT_FOUND\"\n\n"
+    "Context:\n{context}\n\n"
+    "Question:\n{question}\n\n"
+    "Answer:"
+)
+
+# Hybrid retrieval: dense (FAISS) and lexical (BM25) rankings are
+# fused with reciprocal-rank fusion, score = sum 1 / (RRF_K + rank)
+RRF_K = 60
+
+# doc_id-scoped search runs against a per-document partition
+# (that document's vectors only); this many are kept in memory.
+DOC_PARTITION_CACHE_SIZE = 128
+
+# warm_up() stages, in order. "index": the published index is loaded
+# (uploads and deletes can run); "retrieval": e5 + MiniLM are loaded;
+# "generation": flan-t5 is loaded, so questions can be answered.
+READINESS_STAGES = ("index", "retrieval", "generation")
+
+# Shortest repeated text treated as chunk overlap when merging
+# neighbouring chunks; shorter matches are taken as coincidence.
+MIN_OVERLAP_CHARS = 16
+
+# flan-t5's encoder input limit in tokens. The packed context gets
+# whatever the prompt template and the question leave of it.
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", 512))
+
+def adaptive_k(question: str) -> int:
+    length = len(question.split())
+    if length <= 6:
+        return 3
+    elif length <= 15:
+        return 5
+    else:
+        return 8
+
+
+def format_docs(docs):
+    """Convert list of Documents into a single context string"""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+def extract_full_sentences(text: str, max_chars=400):
+    """
+    Extract full sentences up to max_chars.
+    Never cuts mid-sentence.
+    """
+    sentences = re.split(r'(?<=[.!?])\s+', text.strip())
+
+    result = ""
+    for sent in sentences:
+        if len(result) + len(sent) > max_chars:
+            break
+        result += sent + " "
+
+    return result.strip()
+
+def passage_text(page_content: str) -> str:
+    """Chunk text without the e5 "passage:" prefix."""
+    return page_content.replace("passage:", "", 1).strip()
+
+
+def _word_boundary(text: str, i: int) -> bool:
+    """
+    Whether position `i` in `text` falls between words (not inside one).
+    """
+    return i <= 0 or i >= len(text) or not (text[i - 1].isalnum() and text[i].isalnum())
+
+
+def strip_overlap(previous: str, text: str, max_overlap: int = None, min_overlap: int = MIN_OVERLAP_CHARS) -> str:
+    """
+    `text` without the prefix it repeats from the end of `previous`
+    (the splitter's chunk_overlap). The shared part must start and end
+    on word boundaries and be between `min_overlap` and `max_overlap`
+    (default: the ingest CHUNK_OVERLAP) characters, so chunks split at
+    a paragraph break are not cut on a chance match ("bank" + "banking").
+    """
+    if max_overlap is None:
+        from app.utils.ingest import CHUNK_OVERLAP
+        max_overlap = CHUNK_OVERLAP
+
+    for size in range(min(len(previous), len(text), max_overlap), max(min_overlap, 1) - 1, -1):
+        start = len(previous) - size
+        if (
+            _word_boundary(previous, start)
+            and _word_boundary(text, size)
+            and previous.endswith(text[:size])
+        ):
+            return text[size:].lstrip()
+    return text
+
+
+def merge_adjacent_chunks(docs):
+    """
+    Merge retrieved chunks that are neighbours on the same page
+    (consecutive chunk_id) into one passage, dropping the text they
+    share and the "passage:" prefix. Returns the passage texts,
+    ordered by the best rerank position among their chunks.
+    """
+    pages = {}
+    for rank, doc in enumerate(docs):
+        key = (doc.metadata.get("doc_id"), doc.metadata.get("page"))
+        pages.setdefault(key, []).append((doc.metadata.get("chunk_id"), rank, passage_text(doc.page_content)))
+
+    passages = []   # [rank, text, last chunk_id]
+    for chunks in pages.values():
+        chunks.sort(key=lambda chunk: (chunk[0] is None, chunk[0] or 0, chunk[1]))
+
+        run = None
+        for chunk_id, rank, text in chunks:
+            follows = run is not None and chunk_id is not None and run[2] is not None
+            if follows and chunk_id == run[2]:
+                run[0] = min(run[0], rank)      # same chunk twice
+            elif follows and chunk_id == run[2] + 1:
+                rest = strip_overlap(run[1], text)
+                run[0] = min(run[0], rank)
+                run[1] = f"{run[1]} {rest}" if rest else run[1]
+                run[2] = chunk_id
+            else:
+                run = [rank, text, chunk_id]
+                passages.append(run)
+
+    return [text for _, text, _ in sorted(passages, key=lambda passage: passage[0])]
+
+
+def document_shard(doc) -> str:
+    """
+    Shard of a chunk: the period its document was uploaded in
+    (metadata["uploaded_at"]), or the current one.
+    """
+    uploaded_at = doc.metadata.get("uploaded_at")
+    return shard_key(to_epoch_seconds(uploaded_at) if uploaded_at is not None else None)
+
+
+def target_index_type(version) -> str:
+    """
+    Index type a shard version should have. Versions written before
+    the type was recorded count as FAISS_INDEX_TYPE while still flat.
+    """
+    if version.index_type:
+        return version.index_type
+
+    actual = index_type_of(version.index)
+    return FAISS_INDEX_TYPE if actual == "flat" else actual
+
+
+def by_period(shards) -> dict:
+    """
+    Shard mapping ordered oldest period first.
+    """
+    return dict(sorted(shards.items(), key=lambda item: shard_bounds(item[0])[0]))
+
+
+def normalize_generation(raw_answer) -> str:
+    """
+    Normalize HuggingFace pipeline / HuggingFacePipeline output to a string.
+    """
+    if isinstance(raw_answer, list):
+        raw_answer = raw_answer[0] if raw_answer else {}
+    if isinstance(raw_answer, dict):
+        return raw_answer.get("generated_text", "").strip()
+    return str(raw_answer).strip()
+
+
+class GenerationScheduler:
+    """
+    Dynamic micro-batching for the text2text-generation pipeline.
+
+    Callers block on generate(); a single worker thread collects the
+    prompts that arrive within max_wait_ms (up to max_batch_size),
+    runs them as one padded batch and fans the outputs back out.
+    Prompts are taken by priority (PRIORITY_INTERACTIVE first), then
+    in arrival order; batch prompts fill the slots interactive ones
+    leave free.
+    """
+
+    def __init__(self, hf_pipeline,
+        max_batch_size: int = GEN_MAX_BATCH,
+        max_wait_ms: float = GEN_MAX_WAIT_MS):
+        self.pipeline = hf_pipeline
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._worker = threading.Thread(
+            target=self._run,
+            name="generation-scheduler",
+            daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, prompt: str, priority: int = PRIORITY_INTERACTIVE) -> Future:
+        future = Future()
+        self._queue.put((priority, next(self._sequence), prompt, future))
+        return future
+
+    def generate(self, prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
+        return self.submit(prompt, priority).result()
+
+    def generate_many(self, prompts, priority: int = PRIORITY_INTERACTIVE) -> list:
+        futures = [self.submit(prompt, priority) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            prompts = [prompt for _, _, prompt, _ in batch]
+
+            try:
+                outputs = self.pipeline(prompts, batch_size=len(prompts))
+            except Exception as e:
+                for _, _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, _, _, future), output in zip(batch, outputs):
+                future.set_result(normalize_generation(output))
+
+
+class _Lazy:
+    """
+    Instance attribute resolved on first access, so constructing a
+    RAGStore loads no model. Assigning replaces the value; assigning
+    None makes the next access resolve it again.
+    """
+
+    _lock = threading.RLock()   # loaders may resolve other attributes
+
+    def __init__(self, loader):
+        self.loader = loader
+
+    def __set_name__(self, owner, name):
+        self.attr = f"_{name}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        value = obj.__dict__.get(self.attr)
+        if value is None:
+            with self._lock:
+                value = obj.__dict__.get(self.attr)
+                if value is None:
+                    value = obj.__dict__[self.attr] = self.loader(obj)
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.attr] = value
+
+    def peek(self, obj):
+        """
+        The value if already resolved, else None (never loads it).
+        """
+        return obj.__dict__.get(self.attr)
+
+
+class RAGStore:
+    # Models come from the process-wide registry (loaded once, on
+    # first use; warm_up() loads them ahead of the first request)
+    reranker = _Lazy(lambda self: get_reranker())
+    rerank_cache = _Lazy(lambda self: get_rerank_cache())
+    embedding = _Lazy(lambda self: get_embedding())
+    llm = _Lazy(lambda self: get_llm())
+    generator = _Lazy(lambda self: GenerationScheduler(self.llm.pipeline))
+
+    def __init__(self, db_path: str = DEFAULT_FAISS_PATH):
+        self.db_path = db_path
+
+        # Set as warm_up() (or load_store_if_exists()) completes each stage
+        self._ready = {stage: threading.Event() for stage in READINESS_STAGES}
+        self.warm_up_error = None
+
+        # Serializes writers (ingest, delete, migrate, clear).
+        # Searches never take it; they read the published version.
+        self._lock = threading.RLock()
+
+        # Published shards: period key -> IndexVersion (FAISS index +
+        # chunk store + BM25). Writers build new versions of the shards
+        # they change and swap in a new mapping; the swap lock only
+        # covers the mapping and reader counts.
+        self._current = {}
+        self._retired = set()      # superseded versions still being read
+        self._swap_lock = threading.Lock()
+
+        # Bumped on every index change; cached answers from an
+        # older version are never served
+        self.index_version = 0
+        self.answer_cache = AnswerCache()
+
+        # Prompt
+        self.prompt = PROMPT_TEMPLATE
+
+    def _encode_for_rerank(self, texts):
+        """
+        Reranker passage vectors, reusing the on-disk cache.
+        """
+        vectors = self.rerank_cache.get(texts)
+        missing = [text for text, vector in zip(texts, vectors) if vector is None]
+
+        if missing:
+            computed = self.reranker.encode(missing, normalize_embeddings=True)
+            self.rerank_cache.put(missing, computed)
+            computed = iter(computed)
+            vectors = [
+                vector if vector is not None else next(computed)
+                for vector in vectors
+            ]
+
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _stored_rerank_vectors(self, docs):
+        """
+        Reranker vectors for retrieved docs, read from the published
+        shards (by Document.id, the chunk id). Chunks stored without
+        one, or replaced since they were retrieved, are encoded on the fly.
+        """
+        chunk_ids = [doc.id for doc in docs if doc.id is not None]
+
+        found = {}
+        with self.snapshot() as shards:
+            for version in shards.values():
+                missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+                if not missing:
+                    break
+                found.update(version.chunks.rerank_vectors(missing))
+
+        missing = [i for i, doc in enumerate(docs) if doc.id not in found]
+        encoded = self._encode_for_rerank([docs[i].page_content for i in missing]) if missing else None
+
+        if not found:
+            return encoded
+
+        vectors = np.empty((len(docs), len(next(iter(found.values())))), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            if doc.id in found:
+                vectors[i] = found[doc.id]
+        if missing:
+            vectors[missing] = encoded
+
+        return vectors
+
+    def rerank(self, query: str, docs):
+        
+        if not docs:
+            return docs
+
+        # One forward pass for the query; passages were encoded at ingest
+        q_emb = self.reranker.encode(query, normalize_embeddings=True)
+        d_emb = self._stored_rerank_vectors(docs)
+
+        scores = d_emb @ np.asarray(q_emb, dtype=np.float32)
+        return self._filter_ranked(scores, docs)
+
+    def _filter_ranked(self, scores, docs):
+        ranked = sorted(
+            zip(scores, docs),
+            key=lambda x: x[0],
+            reverse=True
+        )
+        SIMILARITY_THRESHOLD = 0.35  # empirically good for MiniLM
+
+        filtered = [
+            doc for score, doc in ranked
+            if score >= SIMILARITY_THRESHOLD
+        ]
+
+        return filtered[:5]
+
+    def rerank_many(self, queries, docs_per_query):
+        """
+        rerank() for many queries: one encoder call for all queries and
+        one read of the stored vectors of every distinct chunk. Scores
+        are computed per query exactly as rerank() does, so near-ties
+        order the same way.
+        """
+        unique = {}
+        for docs in docs_per_query:
+            for doc in docs:
+                unique.setdefault(id(doc), doc)
+
+        if not unique:
+            return [[] for _ in docs_per_query]
+
+        rows = {key: row for row, key in enumerate(unique)}
+        q_emb = np.asarray(self.reranker.encode(list(queries), normalize_embeddings=True), dtype=np.float32)
+        d_emb = self._stored_rerank_vectors(list(unique.values()))
+
+        return [
+            self._filter_ranked(d_emb[[rows[id(doc)] for doc in docs]] @ q_emb[i], docs)
+            for i, docs in enumerate(docs_per_query)
+        ]
+
+    
+    def vector_count(self) -> int:
+        """
+        Vectors in the published shards (0 when empty).
+        """
+        with self.snapshot() as shards:
+            return sum(version.live_vectors for version in shards.values())
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Pin the published shards (key -> version) for the duration of
+        the block. A concurrent publish swaps the mapping, but these
+        versions stay open (and on disk) until released. Yields an
+        empty mapping when the store is empty.
+        """
+        with self._swap_lock:
+            shards = self._current
+            for version in shards.values():
+                version.readers += 1
+
+        try:
+            yield shards
+        finally:
+            self._release(shards.values())
+
+    def _release(self, versions):
+        unused = []
+        with self._swap_lock:
+            for version in versions:
+                version.readers -= 1
+                if version.retired and version.readers == 0:
+                    self._retired.discard(version)
+                    unused.append(version)
+
+        for version in unused:
+            self._drop(version)
+
+    def _drop(self, version):
+        """
+        Close a retired version and delete its directory
+        (unless it was re-published, e.g. by a reload).
+        """
+        version.close()
+
+        current = self._current.get(os.path.basename(version.root))
+        if current is None or current.name != version.name:
+            shutil.rmtree(version.path, ignore_errors=True)
+
+    def _swap(self, shards):
+        """
+        RCU publish: new searches get the `shards` mapping, searches
+        already running finish on the versions they pinned. Versions
+        that were replaced or dropped are closed once their last reader
+        releases them. Never waits for readers.
+        """
+        unused = []
+        with self._swap_lock:
+            old = self._current
+            self._current = shards
+
+            for key, version in old.items():
+                if shards.get(key) is version:
+                    continue
+
+                version.retired = True
+                if version.readers:
+                    self._retired.add(version)
+                else:
+                    unused.append(version)
+
+        for version in unused:
+            self._drop(version)
+
+        self.index_version += 1
+        self.answer_cache.invalidate()
+
+    def _new_draft(self, key: str, replace: bool = False, index_type: str = None):
+        """
+        Writable copy of shard `key`'s published version (empty with
+        `replace`, or when the shard is new). It keeps the shard's
+        index type unless `index_type` is given; new shards get
+        FAISS_INDEX_TYPE. Call with self._lock held.
+        """
+        current = self._current.get(key)
+        if index_type is None:
+            index_type = FAISS_INDEX_TYPE if current is None else target_index_type(current)
+
+        return IndexVersion.create(
+            shard_root(self.db_path, key),
+            None if replace else current,
+            index_type
+        )
+
+    def _publish(self, drafts, doc_ids=None, replace: bool = False):
+        """
+        Save the drafts (shard key -> draft; None drops the shard),
+        point each shard's CURRENT at its new version and swap them all
+        in at once. Other shards are kept, unless `replace`. `doc_ids`
+        limits doc-partition invalidation to the documents that changed
+        (None = all). Call with self._lock held.
+        """
+        current = self._current
+        shards = {} if replace else dict(current)
+
+        for key, draft in drafts.items():
+            if draft is None:
+                shards.pop(key, None)
+                continue
+
+            draft.save()
+
+            partitions = None
+            previous = current.get(key)
+            if previous is not None and doc_ids is not None:
+                with previous.partitions_lock:
+                    partitions = [
+                        (doc_id, partition)
+                        for doc_id, partition in previous.doc_partitions.items()
+                        if doc_id not in doc_ids
+                    ]
+
+            shards[key] = IndexVersion.open(draft.path, partitions)
+
+        for key, version in shards.items():
+            if version is not current.get(key):
+                write_current(shard_root(self.db_path, key), version.name)
+
+        self._swap(by_period(shards))
+        self._remove_unpublished_shards()
+
+    def _destroy_drafts(self, drafts):
+        for draft in drafts.values():
+            if draft is not None:
+                draft.destroy()
+
+    def _remove_unpublished_shards(self):
+        """
+        Delete shard directories that are no longer published (dropped,
+        emptied, replaced). Versions still pinned by searches stay until
+        they are released. Call with self._lock held.
+        """
+        with self._swap_lock:
+            pinned = {version.path for version in self._retired}
+
+        for key in shard_keys(self.db_path):
+            if key in self._current:
+                continue
+
+            root = shard_root(self.db_path, key)
+            write_current(root, None)
+
+            keep = {
+                name for name in version_names(root)
+                if os.path.join(versions_dir(root), name) in pinned
+            }
+            remove_versions(root, keep=keep)
+            if not keep:
+                shutil.rmtree(root, ignore_errors=True)
+
+    def load_store_if_exists(self):
+        """
+        Open the published version of every shard, if there are any.
+        Do NOT create an empty index.
+
+        FAISS files are memory-mapped and chunks stay in SQLite,
+        so startup cost does not grow with the corpus.
+        """
+        with self._lock:
+            self._migrate_unversioned_store()
+            self._migrate_unsharded_store()
+
+            legacy_rerank = os.path.join(self.db_path, LEGACY_RERANK_VECTORS_FILE)
+            if os.path.exists(legacy_rerank):
+                os.remove(legacy_rerank)
+
+            with self._swap_lock:
+                pinned = {version.path for version in self._retired}
+
+            shards = {}
+            for key in shard_keys(self.db_path):
+                root = shard_root(self.db_path, key)
+                name = read_current(root)
+
+                # Drafts of a crashed write and versions nobody reads any more
+                remove_versions(root, keep={name} | {
+                    other for other in version_names(root)
+                    if os.path.join(versions_dir(root), other) in pinned
+                })
+
+                if name is not None:
+                    shards[key] = IndexVersion.open(os.path.join(versions_dir(root), name))
+
+            self._swap(by_period(shards))
+            self._remove_unpublished_shards()
+
+            if not shards:
+                print("[INFO] FAISS index not found. RAG disabled until first upload.")
+                self._ready["index"].set()
+                return
+
+            print(f"[INFO] Loaded FAISS index: {len(shards)} {SHARD_PERIOD} shard(s) ({', '.join(shards)}).")
+
+            # An existing flat shard is migrated once to the
+            # configured type when there is enough data to train it
+            due = [key for key, version in shards.items() if self._should_upgrade(version)]
+            if due:
+                self._rebuild_shards(due)
+
+            self._ready["index"].set()
+
+    def warm_up(self):
+        """
+        Load the published index, then the retrieval models, then
+        flan-t5, each with a tiny inference so the first request does
+        not pay for it. Stages are marked ready as they complete; run
+        it in a background thread once the server is listening.
+        """
+        try:
+            with timed("warm_up_index"):
+                self.load_store_if_exists()
+
+            with timed("warm_up_retrieval"):
+                self.embed_query("warm up")
+                self.reranker.encode("warm up", normalize_embeddings=True)
+            self._ready["retrieval"].set()
+
+            with timed("warm_up_generation"):
+                self.generator.generate("warm up")
+            self._ready["generation"].set()
+
+            print("[INFO] Warm-up complete.")
+        except Exception as e:
+            self.warm_up_error = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+
+    def is_ready(self, stage: str) -> bool:
+        return self._ready[stage].is_set()
+
+    def wait_ready(self, stage: str, timeout: float = None) -> bool:
+        return self._ready[stage].wait(timeout)
+
+    def readiness(self) -> dict:
+        """
+        Which warm-up stages are done, plus the warm-up error if any.
+        """
+        return {
+            **{stage: event.is_set() for stage, event in self._ready.items()},
+            "error": self.warm_up_error
+        }
+
+    def clear(self):
+        """
+        Drop every shard from memory and disk.
+        Models stay loaded in the shared registry.
+        """
+        with self._lock:
+            self._swap({})
+
+            # Versions still pinned by searches are removed on release
+            self._remove_unpublished_shards()
+
+            if os.path.exists(self.db_path):
+                for entry in os.listdir(self.db_path):
+                    path = os.path.join(self.db_path, entry)
+                    if entry == SHARDS_DIR:
+                        continue
+                    elif os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+
+    def _has_legacy_store(self):
+        return (
+            os.path.exists(os.path.join(self.db_path, LEGACY_DOCSTORE_FILE))
+            and os.path.exists(os.path.join(self.db_path, INDEX_FILE))
+        )
+
+    def _migrate_legacy_store(self):
+        """
+        One-time conversion of an index saved by LangChain's
+        FAISS.save_local (index.faiss + pickled index.pkl docstore):
+        chunks move to SQLite and index.pkl is removed. This is the
+        only place a pickle is ever read.
+        """
+        from langchain_community.vectorstores import FAISS
+
+        print("[INFO] Converting legacy docstore (index.pkl) to SQLite...")
+        legacy = FAISS.load_local(
+            self.db_path,
+            self.embedding,
+            allow_dangerous_deserialization=True
+        )
+
+        mapping = legacy.index_to_docstore_id
+        chunk_ids = [mapping[pos] for pos in sorted(mapping)]
+        documents = [legacy.docstore.search(chunk_id) for chunk_id in chunk_ids]
+
+        chunks = ChunkStore(self.db_path)
+        bm25 = BM25Index(chunks.conn)
+        chunks.add(chunk_ids, documents, start_position=0)
+        for chunk_id, doc in zip(chunk_ids, documents):
+            bm25.add(chunk_id, passage_text(doc.page_content))
+        chunks.commit()
+        chunks.close()
+
+        for name in (LEGACY_DOCSTORE_FILE, LEGACY_BM25_FILE):
+            path = os.path.join(self.db_path, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _migrate_unversioned_store(self):
+        """
+        Stores written before versioning keep index.faiss + chunks.db
+        directly in db_path: move them into a first version directory
+        and publish it. Call with self._lock held.
+        """
+        if self._has_legacy_store():
+            self._migrate_legacy_store()
+
+        index_path = os.path.join(self.db_path, INDEX_FILE)
+        chunks_path = os.path.join(self.db_path, CHUNKS_DB_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(chunks_path)):
+            return
+
+        print("[INFO] Moving FAISS index into a versioned directory...")
+
+        # Fold a leftover WAL into chunks.db so the file moves alone
+        ChunkStore(self.db_path).seal()
+
+        name = next_version_name(self.db_path)
+        path = os.path.join(versions_dir(self.db_path), name)
+        os.makedirs(path)
+        os.replace(index_path, os.path.join(path, INDEX_FILE))
+        os.replace(chunks_path, os.path.join(path, CHUNKS_DB_FILE))
+
+        write_current(self.db_path, name)
+
+    def _migrate_unsharded_store(self):
+        """
+        Stores written before time sharding keep CURRENT + versions/
+        directly in db_path: the published version becomes the shard
+        of the current period. Its documents still expire one by one
+        (see cleanup_expired_documents). Call with self._lock held.
+        """
+        name = read_current(self.db_path)
+
+        if name is not None:
+            key = shard_key()
+            print(f"[INFO] Moving FAISS index into shard {key}...")
+
+            root = shard_root(self.db_path, key)
+            target = next_version_name(root)
+            os.makedirs(versions_dir(root), exist_ok=True)
+            os.replace(os.path.join(versions_dir(self.db_path), name), os.path.join(versions_dir(root), target))
+            write_current(root, target)
+
+        write_current(self.db_path, None)
+        if os.path.isdir(versions_dir(self.db_path)):
+            shutil.rmtree(versions_dir(self.db_path), ignore_errors=True)
+
+    def _doc_partition(self, version, doc_id: str):
+        """
+        Vectors + chunk ids of one document, reconstructed from the
+        version's FAISS index on first use and kept in a small LRU.
+        """
+        with version.partitions_lock:
+            partition = version.doc_partitions.get(doc_id)
+            if partition is not None:
+                version.doc_partitions.move_to_end(doc_id)
+                return partition
+
+        rows = version.chunks.doc_chunks(doc_id)
+        if not rows:
+            return None
+
+        positions = np.array([position for _, position in rows], dtype=np.int64)
+        partition = (version.index.reconstruct_batch(positions), [chunk_id for chunk_id, _ in rows])
+
+        with version.partitions_lock:
+            version.doc_partitions[doc_id] = partition
+            while len(version.doc_partitions) > DOC_PARTITION_CACHE_SIZE:
+                version.doc_partitions.popitem(last=False)
+
+        return partition
+
+    def _document_vectors(self, shards, doc_id: str):
+        """
+        (vectors, chunk ids) of one document. A document lives in the
+        shard of its upload period, so this is normally one partition.
+        """
+        partitions = [
+            partition
+            for partition in (self._doc_partition(version, doc_id) for version in shards.values())
+            if partition is not None
+        ]
+
+        if len(partitions) <= 1:
+            return partitions[0] if partitions else None
+
+        return (
+            np.vstack([vectors for vectors, _ in partitions]),
+            [chunk_id for _, chunk_ids in partitions for chunk_id in chunk_ids]
+        )
+
+    def _search_document(self, shards, queries, ks, doc_id: str):
+        """
+        Exact search inside one document's partition, for every query.
+        Cost depends on the document's size, not the corpus.
+        """
+        partition = self._document_vectors(shards, doc_id)
+        if partition is None:
+            return [[] for _ in ks]
+
+        vectors, chunk_ids = partition
+
+        # Embeddings are normalized: nearest in L2 == highest inner product
+        scores = queries @ vectors.T
+
+        return [
+            [chunk_ids[j] for j in np.argsort(-row_scores)[:k]]
+            for row_scores, k in zip(scores, ks)
+        ]
+
+    def delete_documents(self, doc_ids) -> int:
+        """
+        Remove the given documents' chunks from copies of the shards
+        that hold them, then publish those. Cost depends on the deleted
+        chunks and their shards, not on re-embedding the rest of the
+        corpus. A shard left empty is dropped without being copied.
+        Returns the number of chunks removed.
+        """
+        doc_ids = list(doc_ids)
+        removed = 0
+
+        with self._lock:
+            drafts = {}
+            try:
+                for key, version in self._current.items():
+                    chunk_ids = [
+                        chunk_id
+                        for doc_id in doc_ids
+                        for chunk_id in version.chunks.doc_chunk_ids(doc_id)
+                    ]
+                    if not chunk_ids:
+                        continue
+
+                    removed += len(chunk_ids)
+                    if len(chunk_ids) == version.live_vectors:
+                        drafts[key] = None
+                        continue
+
+                    draft = drafts[key] = self._new_draft(key)
+                    for chunk_id, doc in draft.chunks.items(chunk_ids):
+                        draft.bm25.remove(chunk_id, passage_text(doc.page_content))
+
+                    self._remove_chunks(draft, chunk_ids)
+
+                if not drafts:
+                    return 0
+
+                self._publish(drafts, doc_ids)
+            except Exception:
+                self._destroy_drafts(drafts)
+                raise
+
+            if not self._current:
+                print("[INFO] Last document removed. Clearing FAISS index.")
+                self.clear()
+
+        print(f"[INFO] Removed {removed} chunks from FAISS index.")
+        return removed
+
+    def delete_document(self, doc_id: str) -> int:
+        return self.delete_documents([doc_id])
+
+    def drop_expired_shards(self, cutoff: float):
+        """
+        Unpublish every shard whose period ended before `cutoff` (epoch
+        seconds) and delete it from disk: no vector, chunk or BM25 work,
+        whatever the shard's size. Returns the dropped shard keys.
+        """
+        with self._lock:
+            expired = [key for key in self._current if shard_bounds(key)[1] <= cutoff]
+            if not expired:
+                return []
+
+            self._publish({key: None for key in expired})
+
+            if not self._current:
+                print("[INFO] Last shard expired. Clearing FAISS index.")
+                self.clear()
+
+        print(f"[INFO] Dropped expired shards: {', '.join(expired)}")
+        return expired
+
+    def _passage_vectors(self, version, chunk_ids):
+        """
+        e5 vectors of indexed chunks: read back from the index when it
+        stores them exactly, otherwise re-embedded through the cache.
+        """
+        if not chunk_ids:
+            return np.zeros((0, version.index.d), dtype=np.float32)
+
+        if stores_exact_vectors(version.index):
+            return version.index.reconstruct_batch(
+                np.array(version.chunks.positions(chunk_ids), dtype=np.int64)
+            )
+
+        texts = [doc.page_content for doc in version.chunks.get(chunk_ids)]
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            vectors.extend(self.embedding.embed_documents(texts[i:i + EMBED_BATCH_SIZE]))
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _set_index(self, draft, index, vectors):
+        """
+        Fill `index` with `vectors` (one per chunk, in position order)
+        and make it the draft's index.
+        """
+        add_vectors(index, vectors, 0)
+        draft.index = index
+
+    def _next_position(self, draft) -> int:
+        """
+        FAISS id of the next vector added to the draft. Flat and HNSW
+        number vectors in insertion order (HNSW counts its tombstones);
+        IVF ids survive remove_ids(), so new ones follow the highest.
+        """
+        return max(draft.index.ntotal, draft.chunks.next_position())
+
+    def _remove_chunks(self, draft, chunk_ids):
+        """
+        Drop chunks from the draft's index and chunk store, in place:
+        flat compacts its ids (positions are renumbered to match), IVF
+        removes from its inverted lists keeping the other ids, HNSW
+        keeps the vectors as tombstones that searches skip until they
+        pass HNSW_COMPACT_RATIO and the graph is rebuilt.
+        """
+        index = draft.index
+        positions = draft.chunks.positions(chunk_ids)
+        mode = delete_mode(index)
+
+        draft.chunks.delete(chunk_ids)
+
+        if mode == "compact":
+            remove_vectors(index, positions)
+            draft.chunks.renumber()
+        elif mode == "remove":
+            remove_vectors(index, positions)
+        else:
+            draft.chunks.add_removed(positions)
+            if needs_compaction(index, len(draft.chunks.removed_positions())):
+                self._rebuild_index(draft, index_type_of(index))
+
+    def _should_upgrade(self, version):
+        """
+        Train-on-first-batch: a shard starts flat while there are too
+        few vectors to train its index type, and is rebuilt as that
+        type once there are enough. Shards built or migrated as flat
+        stay flat.
+        """
+        index_type = target_index_type(version)
+        return (
+            index_type != "flat"
+            and version.index is not None
+            and index_type_of(version.index) == "flat"
+            and can_train(index_type, version.index.ntotal)
+        )
+
+    def _maybe_upgrade_index(self, draft):
+        """
+        Rebuild the draft as its index type when it is due (see
+        _should_upgrade). Returns True when it rebuilt.
+        """
+        if not self._should_upgrade(draft):
+            return False
+
+        self._rebuild_index(draft, draft.index_type)
+        return True
+
+    def _rebuild_index(self, draft, index_type: str):
+        """
+        Re-train and refill the draft's index as `index_type` from
+        its currently indexed vectors. Positions become 0..n-1 again
+        and tombstones are dropped.
+        """
+        chunk_ids = draft.chunks.ordered_ids()
+        vectors = self._passage_vectors(draft, chunk_ids)
+        previous = index_type_of(draft.index)
+
+        self._set_index(draft, build_index(index_type, vectors), vectors)
+        draft.chunks.renumber()
+        draft.chunks.clear_removed()
+
+        print(f"[INFO] Rebuilt FAISS index: {previous} -> {index_type_of(draft.index)} ({len(chunk_ids)} vectors)")
+
+    def _rebuild_shards(self, keys, index_type: str = None):
+        """
+        _rebuild_index() on a copy of each shard in `keys`, published
+        together. With `index_type`, it becomes the shards' type;
+        otherwise each keeps its own. Call with self._lock held.
+        """
+        drafts = {}
+        try:
+            for key in keys:
+                draft = drafts[key] = self._new_draft(key, index_type=index_type)
+                self._rebuild_index(draft, draft.index_type)
+
+            self._publish(drafts)
+        except Exception:
+            self._destroy_drafts(drafts)
+            raise
+
+    def migrate_index(self, index_type: str = FAISS_INDEX_TYPE, progress=None) -> dict:
+        """
+        Rebuild every shard's index as `index_type` (e.g. after changing
+        FAISS_INDEX_TYPE, or to re-train IVF cells on a grown corpus).
+        Chunks, chunk ids and BM25 are unchanged. The type is recorded
+        per shard, so later uploads and restarts keep it; shards created
+        afterwards use FAISS_INDEX_TYPE.
+        """
+        validate_index_type(index_type)
+
+        with self._lock:
+            if not self._current:
+                return self.index_stats()
+
+            if progress:
+                progress(stage="indexing")
+
+            self._rebuild_shards(list(self._current), index_type)
+
+        return self.index_stats()
+
+    def index_stats(self) -> dict:
+        with self.snapshot() as shards:
+            if not shards:
+                return {"index_type": None, "vectors": 0, "shards": []}
+
+            stats = [
+                {
+                    "shard": key,
+                    "index_type": index_type_of(version.index),
+                    "target_index_type": target_index_type(version),
+                    "vectors": version.live_vectors,
+                    "tombstones": len(version.removed),
+                    "version": version.name
+                }
+                for key, version in shards.items()
+            ]
+
+            index_types = {shard["index_type"] for shard in stats}
+            return {
+                "index_type": index_types.pop() if len(index_types) == 1 else "mixed",
+                "configured_index_type": FAISS_INDEX_TYPE,
+                "vectors": sum(shard["vectors"] for shard in stats),
+                "shard_period": SHARD_PERIOD,
+                "shards": stats
+            }
+
+    def clear_caches(self):
+        """
+        Drop the on-disk passage embedding caches (e5 + reranker).
+        Caches of models not loaded yet are deleted from disk only,
+        so clearing never loads a model.
+        """
+        from app.services.embedding_cache import clear_embedding_caches
+
+        # Caches this store or the process-wide registry already opened
+        embeddings = (RAGStore.embedding.peek(self), loaded(EMBEDDING_MODEL))
+        caches = [getattr(embedding, "cache", None) for embedding in embeddings]
+        caches += [RAGStore.rerank_cache.peek(self), loaded(RERANK_CACHE)]
+
+        open_caches = {id(cache): cache for cache in caches if cache is not None}
+        clear_embedding_caches(list(open_caches.values()))
+
+    def _dense_search(self, shards, query_vector, k: int, doc_id: str = None):
+        """
+        Chunk ids of the k nearest vectors across the shards.
+        """
+        return self._dense_search_many(shards, [query_vector], [k], doc_id)[0]
+
+    def _lexical_search(self, shards, question: str, k: int, doc_id: str = None):
+        """
+        Chunk ids of the k best BM25 matches, scored over all shards.
+        """
+        indexes = [version.bm25 for version in shards.values()]
+        return [chunk_id for chunk_id, _ in search_indexes(indexes, question, k, doc_id)]
+
+    def _chunk_items(self, shards, chunk_ids) -> dict:
+        """
+        {chunk_id: Document} for the given ids, from whichever shard
+        holds each of them.
+        """
+        found = {}
+        for version in shards.values():
+            missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in found]
+            if not missing:
+                break
+            found.update(version.chunks.items(missing))
+        return found
+
+    def _search(self, question: str, query_vector, k: int, doc_id: str = None):
+        """
+        Hybrid retrieval: top-k dense + top-k BM25, fused in one pass
+        with reciprocal-rank fusion. Circular numbers and section
+        references hit through BM25 even when e5 misses them.
+        Only the fused hits are read from the chunk stores.
+
+        Runs entirely on the pinned shards, without blocking on
+        (or being blocked by) concurrent index writes.
+        """
+        with self.snapshot() as shards:
+            if not shards:
+                return []
+
+            dense = self._dense_search(shards, query_vector, k, doc_id)
+            lexical = self._lexical_search(shards, question, k, doc_id)
+
+            fused = reciprocal_rank_fusion([dense, lexical], k=RRF_K)
+            by_id = self._chunk_items(shards, fused)
+            return [by_id[chunk_id] for chunk_id in fused if chunk_id in by_id]
+
+    def _search_many(self, questions, query_vectors, ks, doc_id: str = None):
+        """
+        _search() for many questions on the pinned shards: one FAISS
+        search per shard for all of them, BM25 per question, one chunk
+        store read per shard for all fused hits. Returns a Document
+        list per question.
+        """
+        with self.snapshot() as shards:
+            if not shards:
+                return [[] for _ in questions]
+
+            dense = self._dense_search_many(shards, query_vectors, ks, doc_id)
+
+            indexes = [version.bm25 for version in shards.values()]
+            fused = [
+                reciprocal_rank_fusion([
+                    hits,
+                    [chunk_id for chunk_id, _ in search_indexes(indexes, question, k, doc_id)]
+                ], k=RRF_K)
+                for question, k, hits in zip(questions, ks, dense)
+            ]
+
+            by_id = self._chunk_items(shards, list(dict.fromkeys(
+                chunk_id for chunk_ids in fused for chunk_id in chunk_ids
+            )))
+
+            return [
+                [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+                for chunk_ids in fused
+            ]
+
+    def _dense_search_many(self, shards, query_vectors, ks, doc_id: str = None):
+        """
+        Chunk ids of the ks[i] nearest vectors for every query, merged
+        across the shards by distance (every index type ranks by L2 on
+        the same embeddings, so distances compare between shards).
+
+        One multi-query FAISS search per shard and distinct k (adaptive_k
+        has three); _dense_search() goes through here too, so a question
+        ranks the same alone or in a batch.
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+
+        if doc_id:
+            return self._search_document(shards, queries, ks, doc_id)
+
+        hits = [[] for _ in ks]     # (distance, shard key, position)
+        for key, version in shards.items():
+            for k in set(ks):
+                rows = [i for i, row_k in enumerate(ks) if row_k == k]
+                distances, indices = version.search(queries[rows], k)
+                for i, row_distances, row_indices in zip(rows, distances, indices):
+                    hits[i].extend(
+                        (float(distance), key, int(position))
+                        for distance, position in zip(row_distances, row_indices)
+                        if position != -1
+                    )
+
+        # Stable sort: ties keep shard order, then FAISS order
+        hits = [sorted(row, key=lambda hit: hit[0])[:k] for row, k in zip(hits, ks)]
+
+        positions = {}
+        for row in hits:
+            for _, key, position in row:
+                positions.setdefault(key, set()).add(position)
+
+        chunk_ids = {
+            key: shards[key].chunks.ids_by_position(shard_positions)
+            for key, shard_positions in positions.items()
+        }
+        return [
+            [chunk_ids[key][position] for _, key, position in row if position in chunk_ids[key]]
+            for row in hits
+        ]
+
+    def embed_query(self, question: str):
+        return self.embedding.embed_query(f"query: {question}")
+
+    def embed_queries(self, questions):
+        """
+        Query vectors for many questions in one forward pass.
+        Like embed_query(), bypasses the passage cache.
+        """
+        return self.embedding.base.embed_documents([f"query: {question}" for question in questions])
+
+    def retrieve(self, question: str, doc_id: str = None, query_vector=None):
+        """
+        Retrieve + rerank the chunks used as context for `question`.
+        Pass `query_vector` when the question was already embedded.
+        """
+        # 1️⃣ Choose retriever behavior
+        k = adaptive_k(question)
+
+        # 2️⃣ Retrieve ONCE
+        base_query = f"query: {question}"
+        with timed("retrieve"):
+            if query_vector is None:
+                query_vector = self.embed_query(question)
+
+            docs = self._search(question, query_vector, k, doc_id)
+
+        with timed("rerank"):
+            docs = self.rerank(base_query, docs)
+
+        CHUNKS_RETRIEVED.inc(len(docs))
+        return docs
+
+    def retrieve_many(self, questions, query_vectors, doc_id: str = None):
+        """
+        retrieve() for many already-embedded questions, batched.
+        """
+        ks = [adaptive_k(question) for question in questions]
+
+        with timed("retrieve_batch"):
+            docs_per_question = self._search_many(questions, query_vectors, ks, doc_id)
+
+        with timed("rerank_batch"):
+            docs_per_question = self.rerank_many(
+                [f"query: {question}" for question in questions],
+                docs_per_question
+            )
+
+        CHUNKS_RETRIEVED.inc(sum(len(docs) for docs in docs_per_question))
+        return docs_per_question
+
+    def pack_context(self, question: str, docs) -> str:
+        """
+        Context for `question` that fits flan-t5's input: adjacent
+        chunks merged, duplicates dropped, then whole passages in
+        rerank order while they fit in the tokens the template and
+        question leave. Only a best passage that alone exceeds the
+        budget is cut (at a token boundary).
+        """
+        tokenizer = self.llm.pipeline.tokenizer
+
+        def count(text):
+            return len(tokenizer.encode(text, add_special_tokens=False))
+
+        # Template + question + end-of-sequence token
+        limit = min(MAX_INPUT_TOKENS, tokenizer.model_max_length)
+        budget = limit - len(tokenizer.encode(self.prompt.format(context="", question=question)))
+
+        packed = []
+        for text in merge_adjacent_chunks(docs):
+            if not text or text in packed:
+                continue
+
+            if count("\n\n".join(packed + [text])) <= budget:
+                packed.append(text)
+            elif not packed:
+                ids = tokenizer.encode(text, add_special_tokens=False)[:max(budget, 0)]
+                packed.append(tokenizer.decode(ids, skip_special_tokens=True))
+                break
+
+        # Tokens can merge across the context boundary; re-check the
+        # assembled prompt so the pipeline never truncates "Answer:"
+        context = "\n\n".join(packed)
+        while len(packed) > 1 and len(tokenizer.encode(self.prompt.format(context=context, question=question))) > limit:
+            packed.pop()
+            context = "\n\n".join(packed)
+
+        CONTEXT_TOKENS.inc(count(context))
+        return context
+
+    def build_prompt(self, question: str, docs) -> str:
+        return self.prompt.format(
+            context=self.pack_context(question, docs),
+            question=question
+        )
+
+    def build_sources(self, docs):
+        return [
+            {
+                "doc_id": doc.metadata.get("doc_id"),
+                "original_filename": doc.metadata.get("original_filename"),
+                "chunk_id": doc.metadata.get("chunk_id"),
+                "page": doc.metadata.get("page"),
+                "excerpt": extract_full_sentences(passage_text(doc.page_content),max_chars=400)
+            }
+            for doc in docs
+        ]
+
+    def finalize_answer(self, answer: str, docs):
+        if answer == "NOT_FOUND":
+            return {
+                "answer": NOT_FOUND_MESSAGE,
+                "sources": []
+            }
+
+        return {
+            "answer": answer if answer else NOT_FOUND_MESSAGE,
+            "sources": self.build_sources(docs)
+        }
+
+    def _count_answer(self, result, cached: bool):
+        QUESTIONS.inc(cached=str(cached).lower())
+        if result["answer"] == NOT_FOUND_MESSAGE:
+            NOT_FOUND.inc()
+
+    def cached_answer(self, question: str, doc_id: str = None):
+        """
+        Look the question up in the answer cache.
+        Returns (result_or_None, index_version, query_vector).
+        """
+        version = self.index_version
+        result = self.answer_cache.get(question, doc_id, version)
+        if result is not None:
+            return result, version, None
+
+        with timed("embed_query"):
+            query_vector = self.embed_query(question)
+
+        result = self.answer_cache.get_similar(query_vector, doc_id, version)
+        return result, version, query_vector
+
+    def ask(self, question: str, doc_id: str = None):
+        cached, version, query_vector = self.cached_answer(question, doc_id)
+        if cached is not None:
+            self._count_answer(cached, cached=True)
+            return cached
+
+        docs = self.retrieve(question, doc_id, query_vector)
+
+        with timed("context"):
+            prompt = self.build_prompt(question, docs)
+
+        # Call LLM explicitly with the SAME context
+        # (micro-batched with concurrent requests)
+        with timed("generate"):
+            answer = self.generator.generate(prompt)
+
+        # Build sources from the SAME docs
+        result = self.finalize_answer(answer, docs)
+        self.answer_cache.put(question, doc_id, version, result, query_vector)
+        self._count_answer(result, cached=False)
+
+        return result
+
+    def ask_many(self, questions, doc_id: str = None):
+        """
+        Batch variant of ask() for questionnaires: one embedding call
+        for all questions, one FAISS search, one vectorized rerank and
+        padded generation batches. Returns one ask() result per
+        question, in order.
+        """
+        questions = list(questions)
+        version = self.index_version
+
+        # 1️⃣ Exact answer-cache tier
+        results = [self.answer_cache.get(question, doc_id, version) for question in questions]
+        for result in results:
+            if result is not None:
+                self._count_answer(result, cached=True)
+
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+
+        # 2️⃣ All remaining questions embedded at once, then the
+        # near-duplicate tier
+        with timed("embed_query_batch"):
+            vectors = self.embed_queries([questions[i] for i in pending])
+
+        misses = []
+        for i, vector in zip(pending, vectors):
+            cached = self.answer_cache.get_similar(vector, doc_id, version)
+            if cached is not None:
+                results[i] = cached
+                self._count_answer(cached, cached=True)
+            else:
+                misses.append((i, vector))
+
+        if not misses:
+            return results
+
+        # 3️⃣ Retrieve + rerank in batch
+        batch_questions = [questions[i] for i, _ in misses]
+        batch_vectors = [vector for _, vector in misses]
+        docs_per_question = self.retrieve_many(batch_questions, batch_vectors, doc_id)
+
+        with timed("context"):
+            prompts = [
+                self.build_prompt(question, docs)
+                for question, docs in zip(batch_questions, docs_per_question)
+            ]
+
+        # 4️⃣ Generate in the batch lane, behind interactive questions;
+        # similar-length prompts are queued together so each padded
+        # batch wastes little
+        with timed("generate_batch"):
+            order = sorted(range(len(prompts)), key=lambda j: len(prompts[j]))
+            answers = [None] * len(prompts)
+            batch_prompts = [prompts[j] for j in order]
+            for j, answer in zip(order, self.generator.generate_many(batch_prompts, PRIORITY_BATCH)):
+                answers[j] = answer
+
+        for (i, vector), question, docs, answer in zip(misses, batch_questions, docs_per_question, answers):
+            result = self.finalize_answer(answer, docs)
+            self.answer_cache.put(question, doc_id, version, result, vector)
+            self._count_answer(result, cached=False)
+            results[i] = result
+
+        return results
+
+    def stream_tokens(self, prompt: str):
+        """
+        Yield generated text pieces as flan-t5 produces them.
+        Runs outside the micro-batching scheduler (batch size 1).
+        """
+        from transformers import TextIteratorStreamer
+
+        hf_pipeline = self.llm.pipeline
+        tokenizer = hf_pipeline.tokenizer
+
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+        streamer = TextIteratorStreamer(
+            tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True
+        )
+
+        worker = threading.Thread(
+            target=hf_pipeline.model.generate,
+            kwargs={
+                **inputs,
+                "streamer": streamer,
+                "max_new_tokens": MAX_NEW_TOKENS,
+                "do_sample": False
+            },
+            daemon=True
+        )
+        worker.start()
+
+        for text in streamer:
+            if text:
+                yield text
+
+        worker.join()
+
+    def ask_stream(self, question: str, doc_id: str = None):
+        """
+        Streaming variant of ask().
+        Yields (event, data) pairs: "sources" first, then "token"
+        pieces, then "done" with the same payload ask() returns.
+        """
+        cached, version, query_vector = self.cached_answer(question, doc_id)
+        if cached is not None:
+            self._count_answer(cached, cached=True)
+            yield "sources", cached["sources"]
+            yield "token", cached["answer"]
+            yield "done", cached
+            return
+
+        docs = self.retrieve(question, doc_id, query_vector)
+        yield "sources", self.build_sources(docs)
+
+        with timed("context"):
+            prompt = self.build_prompt(question, docs)
+
+        answer = ""
+        pending = ""
+        start = time.perf_counter()
+        for text in self.stream_tokens(prompt):
+            answer += text
+            pending += text
+
+            # Hold back output that could still turn into "NOT_FOUND"
+            if "NOT_FOUND".startswith(answer.strip()):
+                continue
+
+            yield "token", pending
+            pending = ""
+
+        # Generation time only, not the client's pauses between tokens
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="generate_stream")
+
+        result = self.finalize_answer(answer.strip(), docs)
+        self.answer_cache.put(question, doc_id, version, result, query_vector)
+        self._count_answer(result, cached=False)
+
+        yield "done", result
+
+
+    
+    def add_documents(self, documents, progress=None, batch_size: int = EMBED_BATCH_SIZE,
+        replace: bool = False, is_registered=None):
+        """
+        Append chunks to the shard of their upload period (see
+        document_shard), creating the shard if it doesn't exist.
+        With `replace`, the documents become the whole index.
+
+        Embedding runs outside the writer lock. The changed shards are
+        written as new versions and published in one swap; searches
+        keep running on the previous versions meanwhile.
+
+        `is_registered(doc_id)` is checked under the writer lock: chunks
+        of documents deleted while they were being embedded (delete,
+        reset, retention cleanup remove the metadata first) are dropped
+        instead of being published after the delete.
+        """
+        chunk_ids = [str(uuid.uuid4()) for _ in documents]
+        texts = [doc.page_content for doc in documents]
+
+        if progress:
+            progress(stage="embedding", chunks_total=len(documents))
+
+        embeddings = []
+        with timed("embed"):
+            for i in range(0, len(texts), batch_size):
+                embeddings.extend(self.embedding.embed_documents(texts[i:i + batch_size]))
+                if progress:
+                    progress(chunks_embedded=len(embeddings))
+
+        # Reranker vectors are computed once here, never per query
+        with timed("embed_rerank"):
+            rerank_vectors = self._encode_for_rerank(texts)
+
+        if progress:
+            progress(stage="indexing")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+
+        with timed("index"), self._lock:
+            registered = {}
+            if is_registered is not None:
+                for doc in documents:
+                    doc_id = doc.metadata.get("doc_id")
+                    if doc_id not in registered:
+                        registered[doc_id] = is_registered(doc_id)
+
+                deleted = [doc_id for doc_id, present in registered.items() if not present]
+                if deleted:
+                    print(f"[INFO] Skipping {len(deleted)} document(s) deleted during ingestion: {', '.join(map(str, deleted))}")
+
+            groups = {}
+            for row, doc in enumerate(documents):
+                if registered.get(doc.metadata.get("doc_id"), True):
+                    groups.setdefault(document_shard(doc), []).append(row)
+
+            if not groups:
+                if replace:
+                    self.clear()
+                return
+
+            drafts = {}
+            try:
+                for key, rows in groups.items():
+                    draft = drafts[key] = self._new_draft(key, replace)
+                    vectors = embeddings[rows]
+
+                    if draft.index is None:
+                        # The first batch trains the shard's index (IVF / PQ)
+                        print(f"[INFO] Creating {draft.index_type} FAISS index for shard {key}...")
+                        draft.index = build_index(draft.index_type, vectors)
+
+                    start_position = self._next_position(draft)
+                    add_vectors(draft.index, vectors, start_position)
+                    draft.chunks.add(
+                        [chunk_ids[row] for row in rows],
+                        [documents[row] for row in rows],
+                        start_position,
+                        rerank_vectors[rows]
+                    )
+
+                    for row in rows:
+                        draft.bm25.add(chunk_ids[row], passage_text(documents[row].page_content))
+
+                    self._maybe_upgrade_index(draft)
+
+                self._publish(
+                    drafts,
+                    None if replace else {doc.metadata.get("doc_id") for doc in documents},
+                    replace=replace
+                )
+            except Exception:
+                self._destroy_drafts(drafts)
+                raise
+
+        CHUNKS_INGESTED.inc(sum(len(rows) for rows in groups.values()))
@@ -0,0 +1,46 @@
+import threading
+import traceback
+
+
+class PeriodicTask:
+    """
+    Runs `fn()` in a daemon thread: once on start(), then every
+    `interval_seconds` until stop(). A failing run is logged and
+    the next one happens on schedule. An interval <= 0 disables it.
+    """
+
+    def __init__(self, name: str, interval_seconds: float, fn):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.fn = fn
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.interval_seconds <= 0 or self._thread is not None:
+                return
+
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self, stop):
+        while not stop.is_set():
+            try:
+                self.fn()
+            except Exception:
+                traceback.print_exc()
+
+            if stop.wait(self.interval_seconds):
+                return
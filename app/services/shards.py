@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+import os
+import re
+import time
+
+
+# The store is partitioned by upload period: every period ("day" or
+# "week", UTC) is a shard with its own versioned index + chunk store
+# under shards/<key>/, so retention can drop whole periods.
+SHARD_PERIODS = ("day", "week")
+SHARD_PERIOD = os.getenv("INDEX_SHARD_PERIOD", "day").lower()
+
+SHARDS_DIR = "shards"
+
+# Shard keys: "2026-10-17" (day) or "2026-W42" (ISO week)
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_WEEK_RE = re.compile(r"^(\d{4})-W(\d{2})$")
+
+
+def validate_shard_period(period: str) -> str:
+    if period not in SHARD_PERIODS:
+        raise ValueError(
+            f"Unknown shard period {period!r}; expected one of {', '.join(SHARD_PERIODS)}"
+        )
+    return period
+
+
+def shard_key(timestamp=None, period: str = SHARD_PERIOD) -> str:
+    """
+    Key of the period containing `timestamp` (epoch seconds, default now).
+    """
+    validate_shard_period(period)
+    moment = datetime.fromtimestamp(time.time() if timestamp is None else timestamp, tz=timezone.utc)
+
+    if period == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return moment.strftime("%Y-%m-%d")
+
+
+def is_shard_key(name: str) -> bool:
+    return bool(_DAY_RE.match(name) or _WEEK_RE.match(name))
+
+
+def shard_bounds(key: str):
+    """
+    (start, end) of a shard's period in epoch seconds, end exclusive.
+    Keys of either period parse, so changing INDEX_SHARD_PERIOD leaves
+    existing shards to expire as they were cut.
+    """
+    week = _WEEK_RE.match(key)
+    if week:
+        start = datetime.fromisocalendar(int(week.group(1)), int(week.group(2)), 1)
+        length = timedelta(weeks=1)
+    else:
+        start = datetime.strptime(key, "%Y-%m-%d")
+        length = timedelta(days=1)
+
+    start = start.replace(tzinfo=timezone.utc)
+    return start.timestamp(), (start + length).timestamp()
+
+
+def shard_root(root: str, key: str) -> str:
+    return os.path.join(root, SHARDS_DIR, key)
+
+
+def shard_keys(root: str):
+    """
+    Shard directory names on disk, oldest period first.
+    """
+    folder = os.path.join(root, SHARDS_DIR)
+    if not os.path.isdir(folder):
+        return []
+
+    return sorted(
+        (name for name in os.listdir(folder) if is_shard_key(name)),
+        key=lambda name: shard_bounds(name)[0]
+    )
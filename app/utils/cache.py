@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+CACHE_DIR = os.path.join(BASE_DIR, "data", "cache")
+
+
+def file_sha256(path: str) -> str:
+    """
+    Content hash of a file, streamed in 1 MB blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(*parts) -> str:
+    """
+    Stable key for a content hash plus the parameters that produced the value.
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_path(namespace: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, namespace, key[:2], f"{key}.json")
+
+
+def load_cached(namespace: str, key: str):
+    """
+    Return the cached value, or None on a miss / unreadable entry.
+    """
+    path = _cache_path(namespace, key)
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_cached(namespace: str, key: str, value):
+    """
+    Write atomically so a crash never leaves a half-written entry.
+    """
+    path = _cache_path(namespace, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def clear_cache(namespace: str = None):
+    """
+    Remove one namespace, or the whole cache directory.
+    """
+    path = os.path.join(CACHE_DIR, namespace) if namespace else CACHE_DIR
+    if os.path.exists(path):
+        shutil.rmtree(path)
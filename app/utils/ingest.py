@@ -1,237 +1,387 @@
-import pdfplumber
-import pytesseract
-from pdf2image import convert_from_path
-from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from app.services.rag import RAGStore
-import uuid
-import os
-import re 
-import json
-import time
-from dotenv import load_dotenv
-
-load_dotenv()
-# Retention configuration
-DEFAULT_RETENTION_DAYS = 7
-
-RETENTION_DAYS = int(
-    os.getenv("RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
-)
-
-RETENTION_SECONDS = RETENTION_DAYS * 24 * 60 * 60
-
-
-BASE_DIR = os.path.abspath(
-    os.path.join(os.path.dirname(__file__), "..", "..")
-)
-
-DOCS_DIR = os.path.join(BASE_DIR, "data", "docs")
-METADATA_PATH = os.path.join(DOCS_DIR, "metadata.json")
-
-def is_index_like(text: str) -> bool:
-    # High ratio of numbers / codes = index or table
-    digits = sum(c.isdigit() for c in text)
-    ratio = digits / max(len(text), 1)
-
-    # Detect circular-style codes
-    if re.search(r"DNBS|No\s+\d+/\d+", text):
-        return True
-
-    return ratio > 0.25  # 25% numbers = likely index
-
-def extract_text_from_pdf(pdf_path: str):
-    """
-    Returns a list of (page_number, page_text) tuples.
-    """
-    pages_content = []
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text()
-            if text and not is_index_like(text):
-                pages_content.append((page_num, text))
-
-    # OCR fallback ONLY if nothing useful extracted
-    if not pages_content:
-        images = convert_from_path(pdf_path, dpi=200)
-        for page_num, img in enumerate(images, start=1):
-            text = pytesseract.image_to_string(img)
-            if text and not is_index_like(text):
-                pages_content.append((page_num, text))
-
-    return pages_content
-
-
-def create_chunks(text: str,
-    base_metadata: dict,
-    page_num: int,
-    chunk_size=400,
-    chunk_overlap=60):
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
-    )
-
-    chunks = splitter.split_text(text)
-
-    documents = []
-    for i, chunk in enumerate(chunks):
-        
-        if is_index_like(chunk):
-            continue  # 🚫 skip index-like content
-
-        documents.append(
-            Document(
-                page_content=f"passage: {chunk}",
-                metadata={
-                    **base_metadata,
-                    "chunk_id": i,
-                    "page": page_num
-                }
-            )
-        )
-        
-    print("\n[DEBUG] Retrieved chunks:")
-    for i, doc in enumerate(documents):
-        print(f"\n--- Chunk {i} ---")
-        print(doc.page_content[:300])
-    
-
-    return documents
-
-
-def ingest_uploaded_pdf(file_path: str,
-    original_filename: str,
-    doc_id: str):
-
-    base_metadata = {
-        "doc_id": doc_id,
-        "original_filename": original_filename
-    }
-
-    print("[INFO] Extracting text and Creating Chunks...")
-    pages = extract_text_from_pdf(file_path)
-
-    documents = []
-    for page_num, page_text in pages:
-        page_documents = create_chunks(
-            text=page_text,
-            base_metadata=base_metadata,
-            page_num=page_num
-        )
-        documents.extend(page_documents)
-
-
-    print(f"[INFO] Total chunks: {len(documents)}")
-
-    rag = RAGStore()
-    rag.load_store_if_exists()
-    rag.add_documents(documents)
-
-    print("[INFO] PDF ingested successfully.")
-
-    return doc_id
-
-def rebuild_faiss_from_metadata():
-    """
-    Safely rebuild FAISS index from remaining documents
-    after a delete operation.
-    Works with metadata.json as a LIST.
-    """
-
-    if not os.path.exists(METADATA_PATH):
-        print("[INFO] No metadata.json found. Skipping FAISS rebuild.")
-        return
-
-    with open(METADATA_PATH, "r") as f:
-        metadata = json.load(f)
-
-    if not metadata:
-        print("[INFO] Metadata empty. Clearing FAISS index.")
-        rag = RAGStore()
-        rag.vstore = None
-        return
-
-    rag = RAGStore()
-    rag.vstore = None  # force fresh rebuild
-
-    total_chunks = 0
-
-    for entry in metadata:
-        doc_id = entry["doc_id"]
-        original_filename = entry["original_filename"]
-        stored_filename = entry["stored_filename"]
-
-        pdf_path = os.path.join(DOCS_DIR, stored_filename)
-        if not os.path.exists(pdf_path):
-            continue
-
-        print(f"[INFO] Re-ingesting: {original_filename}")
-
-        base_metadata = {
-            "doc_id": doc_id,
-            "original_filename": original_filename
-        }
-
-        pages = extract_text_from_pdf(pdf_path)
-
-        documents = []
-        for page_num, page_text in pages:
-            documents.extend(
-                create_chunks(
-                    text=page_text,
-                    base_metadata=base_metadata,
-                    page_num=page_num
-                )
-            )
-
-        total_chunks += len(documents)
-        rag.add_documents(documents)
-
-        print(f"[INFO] FAISS rebuilt successfully with {total_chunks} chunks.")
-
-def cleanup_expired_documents():
-    """
-    Delete documents older than retention window
-    and rebuild FAISS index.
-    Works with metadata.json as a LIST.
-    """
-    if not os.path.exists(METADATA_PATH):
-        print("[INFO] No metadata.json found. Cleanup skipped.")
-        return
-
-    with open(METADATA_PATH, "r") as f:
-        metadata = json.load(f)
-
-    if not metadata:
-        print("[INFO] Metadata empty. Nothing to clean.")
-        return
-
-    now = int(time.time())
-    retained_entries = []
-    expired_count = 0
-
-    for entry in metadata:
-        uploaded_at = entry.get("uploaded_at")
-
-        if uploaded_at and (now - uploaded_at) > RETENTION_SECONDS:
-            pdf_path = os.path.join(DOCS_DIR, entry["stored_filename"])
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-            expired_count += 1
-        else:
-            retained_entries.append(entry)
-
-    if expired_count == 0:
-        print("[INFO] No expired documents found.")
-        return
-
-    # Save cleaned metadata list
-    with open(METADATA_PATH, "w") as f:
-        json.dump(retained_entries, f, indent=2)
-
-    print(f"[INFO] Removed {expired_count} expired documents.")
-
-    # Rebuild FAISS index from remaining docs
-    rebuild_faiss_from_metadata()
+from app.services.rag import RAGStore
+from app.services.metadata_store import MetadataStore
+from app.utils.cache import file_sha256, cache_key, load_cached, save_cached
+from app.utils.ocr import ocr_pdf, OCR_DPI
+from app.utils.metrics import timed, INGEST_CACHE_HITS
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+import os
+import re 
+import time
+from dotenv import load_dotenv
+
+# pdfplumber and langchain are imported where they are used, so the
+# API process starts without them
+
+load_dotenv()
+# Retention configuration
+DEFAULT_RETENTION_DAYS = 7
+
+RETENTION_DAYS = int(
+    os.getenv("RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+)
+
+RETENTION_SECONDS = RETENTION_DAYS * 24 * 60 * 60
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "..")
+)
+
+DOCS_DIR = os.path.join(BASE_DIR, "data", "docs")
+
+# Extraction / chunking parameters (part of the cache key)
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 60
+
+# Bump when extraction or index-like filtering logic changes,
+# so cached pages / chunks from older code are not reused.
+EXTRACTION_VERSION = 1
+
+EXTRACTION_PARAMS = {
+    "ocr_dpi": OCR_DPI,
+    "version": EXTRACTION_VERSION
+}
+
+# Batch uploads: PDFs extracted concurrently (scanned pages still
+# go through the shared OCR process pool), and chunks per
+# embedding call when the whole batch is embedded in one pass
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+BATCH_EMBED_SIZE = int(os.getenv("BATCH_EMBED_SIZE", 256))
+
+def is_index_like(text: str) -> bool:
+    # High ratio of numbers / codes = index or table
+    digits = sum(c.isdigit() for c in text)
+    ratio = digits / max(len(text), 1)
+
+    # Detect circular-style codes
+    if re.search(r"DNBS|No\s+\d+/\d+", text):
+        return True
+
+    return ratio > 0.25  # 25% numbers = likely index
+
+def extract_text_from_pdf(pdf_path: str):
+    """
+    Returns a list of (page_number, page_text) tuples.
+    """
+    import pdfplumber
+
+    pages_content = []
+
+    with pdfplumber.open(pdf_path) as pdf:
+        page_count = len(pdf.pages)
+        for page_num, page in enumerate(pdf.pages, start=1):
+            text = page.extract_text()
+            if text and not is_index_like(text):
+                pages_content.append((page_num, text))
+
+    # OCR fallback ONLY if nothing useful extracted
+    # (windowed, one page image per worker process at a time)
+    if not pages_content:
+        with timed("ocr"):
+            for page_num, text in ocr_pdf(pdf_path, page_count):
+                if text and not is_index_like(text):
+                    pages_content.append((page_num, text))
+
+    return pages_content
+
+
+def create_chunks(text: str,
+    base_metadata: dict,
+    page_num: int,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP):
+    from langchain_core.documents import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap
+    )
+
+    chunks = splitter.split_text(text)
+
+    documents = []
+    for i, chunk in enumerate(chunks):
+        
+        if is_index_like(chunk):
+            continue  # 🚫 skip index-like content
+
+        documents.append(
+            Document(
+                page_content=f"passage: {chunk}",
+                metadata={
+                    **base_metadata,
+                    "chunk_id": i,
+                    "page": page_num
+                }
+            )
+        )
+
+    return documents
+
+
+def extract_pages_cached(pdf_path: str, content_hash: str = None):
+    """
+    extract_text_from_pdf backed by a content-addressed cache,
+    so unchanged PDFs never go through pdfplumber / OCR again.
+    """
+    content_hash = content_hash or file_sha256(pdf_path)
+    key = cache_key(content_hash, EXTRACTION_PARAMS)
+
+    cached = load_cached("pages", key)
+    if cached is not None:
+        print("[INFO] Page text cache hit.")
+        INGEST_CACHE_HITS.inc(cache="pages")
+        return [(page_num, text) for page_num, text in cached]
+
+    with timed("extract"):
+        pages = extract_text_from_pdf(pdf_path)
+    save_cached("pages", key, pages)
+
+    return pages
+
+
+def load_pdf_documents(pdf_path: str,
+    base_metadata: dict,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
+    progress=None,
+    content_hash: str = None):
+    """
+    Return chunk Documents for a PDF, reusing cached chunks when the
+    content hash and extraction / chunking parameters are unchanged.
+    Pass `content_hash` when it is already known (computed on upload).
+    """
+    if progress:
+        progress(stage="extracting")
+
+    content_hash = content_hash or file_sha256(pdf_path)
+    key = cache_key(
+        content_hash,
+        EXTRACTION_PARAMS,
+        {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    )
+
+    chunks = load_cached("chunks", key)
+    if chunks is None:
+        pages = extract_pages_cached(pdf_path, content_hash)
+        if progress:
+            progress(pages_extracted=len(pages))
+
+        chunks = []
+        with timed("chunk"):
+            for page_num, page_text in pages:
+                page_documents = create_chunks(
+                    text=page_text,
+                    base_metadata={},
+                    page_num=page_num,
+                    chunk_size=chunk_size,
+                    chunk_overlap=chunk_overlap
+                )
+                chunks.extend(
+                    {
+                        "page": page_num,
+                        "chunk_id": doc.metadata["chunk_id"],
+                        "page_content": doc.page_content
+                    }
+                    for doc in page_documents
+                )
+        save_cached("chunks", key, chunks)
+    else:
+        print("[INFO] Chunk cache hit.")
+        INGEST_CACHE_HITS.inc(cache="chunks")
+        if progress:
+            progress(pages_extracted=len({chunk["page"] for chunk in chunks}))
+
+    from langchain_core.documents import Document
+
+    return [
+        Document(
+            page_content=chunk["page_content"],
+            metadata={
+                **base_metadata,
+                "chunk_id": chunk["chunk_id"],
+                "page": chunk["page"]
+            }
+        )
+        for chunk in chunks
+    ]
+
+
+def ingest_uploaded_pdf(file_path: str,
+    original_filename: str,
+    doc_id: str,
+    rag: RAGStore,
+    progress=None,
+    content_hash: str = None,
+    uploaded_at=None,
+    is_registered=None):
+    """
+    Extract, chunk and append one PDF to the given (live) RAGStore.
+    `progress(**fields)` receives stage counters when run as a job.
+    `uploaded_at` picks the index shard (default: now).
+    `is_registered` lets the store skip the PDF if it was deleted
+    meanwhile (see RAGStore.add_documents).
+    """
+
+    base_metadata = {
+        "doc_id": doc_id,
+        "original_filename": original_filename,
+        "uploaded_at": uploaded_at
+    }
+
+    print("[INFO] Extracting text and Creating Chunks...")
+    documents = load_pdf_documents(file_path, base_metadata, progress=progress, content_hash=content_hash)
+
+    print(f"[INFO] Total chunks: {len(documents)}")
+
+    rag.add_documents(documents, progress=progress, is_registered=is_registered)
+
+    print("[INFO] PDF ingested successfully.")
+
+    return doc_id
+
+def ingest_uploaded_pdfs(uploads,
+    rag: RAGStore,
+    progress=None,
+    is_registered=None):
+    """
+    Batch variant of ingest_uploaded_pdf for many PDFs at once.
+    `uploads` is a list of dicts with file_path, original_filename, doc_id
+    (and content_hash / uploaded_at, if known).
+
+    PDFs are extracted and chunked in parallel, then every chunk goes
+    through ONE add_documents call: one embedding pass in large
+    batches, one index + chunk store write.
+
+    Returns (ingested, failed); a PDF that fails extraction is
+    reported in `failed` (with its error) and does not stop the rest.
+    PDFs deleted while the batch runs are skipped (`is_registered`).
+    """
+    if progress:
+        progress(stage="extracting", documents_total=len(uploads), documents_extracted=0)
+
+    def extract(upload):
+        base_metadata = {
+            "doc_id": upload["doc_id"],
+            "original_filename": upload["original_filename"],
+            "uploaded_at": upload.get("uploaded_at")
+        }
+        return load_pdf_documents(upload["file_path"], base_metadata, content_hash=upload.get("content_hash"))
+
+    ingested = []
+    failed = []
+    all_documents = []
+
+    print(f"[INFO] Extracting {len(uploads)} PDFs with {EXTRACT_WORKERS} workers...")
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS, thread_name_prefix="extract") as pool:
+        futures = [pool.submit(extract, upload) for upload in uploads]
+
+        for done, (upload, future) in enumerate(zip(uploads, futures), start=1):
+            try:
+                documents = future.result()
+            except Exception as e:
+                print(f"[INFO] Extraction failed for {upload['original_filename']}: {e}")
+                failed.append({**upload, "error": str(e)})
+            else:
+                all_documents.extend(documents)
+                ingested.append(upload)
+
+            if progress:
+                progress(documents_extracted=done)
+
+    print(f"[INFO] Total chunks: {len(all_documents)}")
+
+    if all_documents:
+        rag.add_documents(all_documents, progress=progress, batch_size=BATCH_EMBED_SIZE,
+                          is_registered=is_registered)
+
+    print(f"[INFO] Batch ingested: {len(ingested)} PDFs, {len(failed)} failed.")
+
+    return ingested, failed
+
+def rebuild_faiss_from_metadata(rag: RAGStore, metadata: MetadataStore = None):
+    """
+    Repair operation: rebuild the FAISS index from scratch
+    by re-ingesting every document in the metadata store.
+    Deletes do NOT need this any more (see RAGStore.delete_documents).
+    """
+    metadata = metadata or MetadataStore()
+    entries = metadata.list()
+
+    if not entries:
+        print("[INFO] Metadata empty. Clearing FAISS index.")
+        rag.clear()
+        return
+
+    all_documents = []
+
+    for entry in entries:
+        doc_id = entry["doc_id"]
+        original_filename = entry["original_filename"]
+        stored_filename = entry["stored_filename"]
+
+        pdf_path = os.path.join(DOCS_DIR, stored_filename)
+        if not os.path.exists(pdf_path):
+            continue
+
+        print(f"[INFO] Re-ingesting: {original_filename}")
+
+        base_metadata = {
+            "doc_id": doc_id,
+            "original_filename": original_filename,
+            "uploaded_at": entry["uploaded_at"]
+        }
+
+        all_documents.extend(load_pdf_documents(pdf_path, base_metadata))
+
+    # Publish the fresh index in one swap; queries keep using
+    # the previous version until then. Documents deleted while the
+    # rebuild ran are left out.
+    if all_documents:
+        rag.add_documents(all_documents, replace=True, is_registered=metadata.contains)
+    else:
+        rag.clear()
+
+    print(f"[INFO] FAISS rebuilt successfully with {len(all_documents)} chunks.")
+
+def cleanup_expired_documents(rag: RAGStore, metadata: MetadataStore = None) -> dict:
+    """
+    Delete documents older than retention window
+    and drop their chunks from the FAISS index.
+
+    The index is sharded by upload period, so every shard whose period
+    ended before the cutoff is dropped whole (no per-chunk work). Only
+    documents in the shard the cutoff falls into (or in a shard from
+    before sharding) are deleted chunk by chunk. Only expired metadata
+    entries are read (range query on uploaded_at).
+    """
+    metadata = metadata or MetadataStore()
+    cutoff = time.time() - RETENTION_SECONDS
+
+    # 1️⃣ Expired documents: PDFs + metadata first, so an ingest job
+    # still running for one of them does not publish it afterwards
+    expired = metadata.uploaded_before(cutoff)
+
+    for entry in expired:
+        pdf_path = os.path.join(DOCS_DIR, entry["stored_filename"])
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+    expired_doc_ids = [entry["doc_id"] for entry in expired]
+    metadata.remove_many(expired_doc_ids)
+
+    # 2️⃣ Whole expired periods
+    dropped_shards = rag.drop_expired_shards(cutoff)
+
+    if not expired:
+        print("[INFO] No expired documents found.")
+        return {"documents": 0, "shards": dropped_shards, "chunks": 0}
+
+    print(f"[INFO] Removed {len(expired_doc_ids)} expired documents.")
+
+    # 3️⃣ Chunks of expired documents still left in a live shard
+    chunks = rag.delete_documents(expired_doc_ids)
+
+    return {"documents": len(expired_doc_ids), "shards": dropped_shards, "chunks": chunks}
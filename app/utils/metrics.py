@@ -0,0 +1,228 @@
+from contextlib import contextmanager
+import bisect
+import contextvars
+import threading
+import time
+
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage latency buckets (seconds): sub-ms lookups up to OCR / ingestion
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._values = {}   # labels -> [per-bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        slot = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][slot] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(dict(key), list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+
+        samples = []
+        for labels, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(float(bound))}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Collector:
+    """
+    Metric read at scrape time from existing state (cache stats,
+    index size) instead of being updated on the hot path.
+    `fn` returns a list of (labels, value).
+    """
+
+    def __init__(self, name: str, kind: str, help: str, fn):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.fn = fn
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.fn()]
+
+
+# =======================
+# Process-wide registry
+# =======================
+
+_metrics = {}
+_lock = threading.Lock()
+
+
+def _register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+
+def counter(name: str, help: str) -> Counter:
+    return _register(Counter(name, help))
+
+
+def histogram(name: str, help: str, buckets=STAGE_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help, buckets))
+
+
+def collector(name: str, kind: str, help: str, fn):
+    """
+    Register (or replace) a scrape-time metric.
+    """
+    metric = Collector(name, kind, help, fn)
+    with _lock:
+        _metrics[name] = metric
+    return metric
+
+
+def render() -> str:
+    """
+    All registered metrics in Prometheus text format.
+    """
+    with _lock:
+        metrics = list(_metrics.values())
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# =======================
+# Pipeline metrics
+# =======================
+
+STAGE_SECONDS = histogram(
+    "rag_stage_seconds",
+    "Time spent per pipeline stage (query and ingestion)."
+)
+QUESTIONS = counter(
+    "rag_questions_total",
+    "Questions answered, by whether the answer came from the answer cache."
+)
+NOT_FOUND = counter(
+    "rag_not_found_total",
+    "Answers that were NOT_FOUND (the documents did not contain the answer)."
+)
+CHUNKS_RETRIEVED = counter(
+    "rag_chunks_retrieved_total",
+    "Chunks passed to the prompt after reranking."
+)
+CONTEXT_TOKENS = counter(
+    "rag_context_tokens_total",
+    "flan-t5 tokens of packed context sent to the generator."
+)
+CHUNKS_INGESTED = counter(
+    "rag_chunks_ingested_total",
+    "Chunks added to the index."
+)
+INGEST_CACHE_HITS = counter(
+    "rag_ingest_cache_hits_total",
+    "Extraction cache hits during ingestion, by cache (pages / chunks)."
+)
+
+# Unlabeled counters start at 0, so rates work from the first scrape
+for _counter in (NOT_FOUND, CHUNKS_RETRIEVED, CONTEXT_TOKENS, CHUNKS_INGESTED):
+    _counter.inc(0)
+
+# Per-request stage durations, for the Server-Timing header
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def timed(stage: str):
+    """
+    Time a block as `stage`: observed in rag_stage_seconds and, inside
+    request_timings(), added to the current request's timings.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def request_timings():
+    """
+    Collect the stage timings of one request into the yielded dict.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings: dict) -> str:
+    """
+    Server-Timing header value, e.g. "retrieve;dur=12.3, generate;dur=410.0".
+    """
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
@@ -0,0 +1,84 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import threading
+
+
+# OCR settings for scanned PDFs
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+
+# Pages in flight at once; bounds memory regardless of page count
+OCR_WINDOW_PAGES = int(os.getenv("OCR_WINDOW_PAGES", OCR_WORKERS * 2))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _init_worker():
+    # One tesseract thread per process; parallelism comes from the pool
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _get_pool(workers: int):
+    """
+    Process pool shared by all OCR calls, created on first use.
+    Uses spawn so workers never inherit the parent's model threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return _pool
+
+
+def ocr_page(pdf_path: str, page_num: int, dpi: int = OCR_DPI):
+    """
+    Rasterize and OCR a single page. Only this page's image
+    is ever held in memory.
+    """
+    import pytesseract
+    from pdf2image import convert_from_path
+
+    images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=page_num,
+        last_page=page_num
+    )
+    text = pytesseract.image_to_string(images[0]) if images else ""
+    return page_num, text
+
+
+def ocr_pdf(pdf_path: str,
+    page_count: int,
+    dpi: int = OCR_DPI,
+    workers: int = OCR_WORKERS,
+    window: int = OCR_WINDOW_PAGES):
+    """
+    Yield (page_number, text) for every page, in order.
+
+    Pages are processed in windows of `window` pages spread over
+    `workers` processes, so peak memory stays constant in page count
+    and throughput scales with cores.
+    """
+    if workers <= 1:
+        for page_num in range(1, page_count + 1):
+            yield ocr_page(pdf_path, page_num, dpi)
+        return
+
+    pool = _get_pool(workers)
+    window = max(window, 1)
+
+    for start in range(1, page_count + 1, window):
+        pages = range(start, min(start + window, page_count + 1))
+        yield from pool.map(
+            ocr_page,
+            [pdf_path] * len(pages),
+            pages,
+            [dpi] * len(pages)
+        )
@@ -0,0 +1,75 @@
+import numpy as np
+import os
+
+
+class VectorFile:
+    """
+    Append-only matrix of float32 rows, stored raw on disk
+    and read back through a memory map.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._row_bytes = dim * 4
+        self._map = None
+        self._rows = 0
+
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            self._rows = size // self._row_bytes
+
+            # Drop a torn trailing row left by an interrupted append
+            if size % self._row_bytes:
+                self.truncate(self._rows)
+
+    def __len__(self):
+        return self._rows
+
+    def append(self, vectors) -> int:
+        """
+        Append rows and return the index of the first one.
+        """
+        arr = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(arr.tobytes())
+
+        start = self._rows
+        self._rows += len(arr)
+        return start
+
+    def matrix(self):
+        """
+        Read-only memory-mapped view of all rows.
+        """
+        if self._rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        if self._map is None or self._map.shape[0] != self._rows:
+            self._map = np.memmap(
+                self.path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._rows, self.dim)
+            )
+        return self._map
+
+    def rows(self, indices) -> np.ndarray:
+        """
+        Copy the requested rows out of the memory map.
+        """
+        return np.asarray(self.matrix()[np.asarray(indices, dtype=np.int64)])
+
+    def truncate(self, rows: int):
+        self._map = None
+        with open(self.path, "r+b") as f:
+            f.truncate(rows * self._row_bytes)
+        self._rows = rows
+
+    def delete(self):
+        self._map = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._rows = 0
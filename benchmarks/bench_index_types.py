@@ -0,0 +1,203 @@
+"""
+Recall-vs-latency benchmark for the FAISS index types in
+app/services/index_factory.py.
+
+Runs every index type over the same vectors and reports, per type:
+recall@k against exact (flat) search, single-query p50 / p99 latency,
+build time and serialized index size.
+
+    python -m benchmarks.bench_index_types                      # vectors of data/faiss_index
+    python -m benchmarks.bench_index_types --synthetic 100000   # synthetic e5-like vectors
+    python -m benchmarks.bench_index_types --nprobe 8 --ef-search 32 --output bench.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from app.services import index_factory
+from app.services.index_factory import INDEX_TYPES, build_index, index_type_of
+from app.services.index_versions import IndexVersion, read_current, versions_dir
+from app.services.shards import SHARDS_DIR, shard_keys, shard_root
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..")
+)
+
+DEFAULT_INDEX_DIR = os.path.join(BASE_DIR, "data", "faiss_index")
+
+
+def load_index_vectors(index_dir: str):
+    """
+    Vectors of every chunk in the store's published shard versions
+    (shards/<key>/CURRENT -> versions/vNNNNNN/index.faiss), in shard
+    then position order. Only exact indexes can give back their vectors.
+    """
+    parts = []
+    for key in shard_keys(index_dir):
+        root = shard_root(index_dir, key)
+        name = read_current(root)
+        if name is None:
+            continue
+
+        version = IndexVersion.open(os.path.join(versions_dir(root), name))
+        try:
+            if index_type_of(version.index) == "ivf_pq":
+                raise SystemExit("ivf_pq indexes do not store exact vectors; benchmark with --synthetic")
+
+            # Live chunks only: IVF ids have gaps after deletes and
+            # HNSW keeps tombstoned vectors
+            positions = version.chunks.positions(version.chunks.ordered_ids())
+            if positions:
+                parts.append(version.index.reconstruct_batch(np.array(positions, dtype=np.int64)))
+        finally:
+            version.close()
+
+    if not parts:
+        raise SystemExit(
+            f"No published shards under {os.path.join(index_dir, SHARDS_DIR)}; "
+            "upload documents first or use --synthetic"
+        )
+
+    return np.vstack(parts)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int):
+    """
+    Clustered unit vectors, closer to real embeddings than uniform noise.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 200), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), n)]
+    vectors += 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return normalize(vectors)
+
+
+def normalize(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors, n_queries: int, seed: int):
+    """
+    Perturbed copies of corpus vectors: queries land near real
+    neighbourhoods without being exact duplicates.
+    """
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.integers(0, len(vectors), n_queries)
+    dim = vectors.shape[1]
+
+    # Noise of norm ~0.5 around unit vectors
+    noise = 0.5 / np.sqrt(dim) * rng.standard_normal((n_queries, dim)).astype(np.float32)
+    return normalize(vectors[picks] + noise)
+
+
+def percentile_ms(samples, q: float) -> float:
+    return round(float(np.percentile(samples, q)) * 1000, 4)
+
+
+def bench_type(index_type: str, vectors, queries, ground_truth, k: int):
+    start = time.perf_counter()
+    index = build_index(index_type, vectors)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - start
+
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+
+    hits = sum(
+        len(set(found[i]) & set(ground_truth[i]))
+        for i in range(len(queries))
+    )
+
+    return {
+        "index_type": index_type_of(index),
+        f"recall@{k}": round(hits / (len(queries) * k), 4),
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "build_seconds": round(build_seconds, 3),
+        "index_bytes": int(faiss.serialize_index(index).size)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of --index-dir")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--types", nargs="+", default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument("--nlist", type=int, default=index_factory.IVF_NLIST)
+    parser.add_argument("--nprobe", type=int, default=index_factory.IVF_NPROBE)
+    parser.add_argument("--pq-m", type=int, default=index_factory.IVF_PQ_M)
+    parser.add_argument("--hnsw-m", type=int, default=index_factory.HNSW_M)
+    parser.add_argument("--ef-search", type=int, default=index_factory.HNSW_EF_SEARCH)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads (1 = per-request latency)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    # Same knobs the service reads from the environment
+    index_factory.IVF_NLIST = args.nlist
+    index_factory.IVF_NPROBE = args.nprobe
+    index_factory.IVF_PQ_M = args.pq_m
+    index_factory.HNSW_M = args.hnsw_m
+    index_factory.HNSW_EF_SEARCH = args.ef_search
+    index_factory.IVF_MIN_TRAIN_POINTS = 1
+    faiss.omp_set_num_threads(args.threads)
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim, args.seed)
+        source = f"synthetic:{args.synthetic}x{args.dim}"
+    else:
+        vectors = load_index_vectors(args.index_dir)
+        source = args.index_dir
+
+    queries = make_queries(vectors, args.queries, args.seed)
+    k = min(args.k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, ground_truth = exact.search(queries, k)
+
+    report = {
+        "source": source,
+        "vectors": int(len(vectors)),
+        "dim": int(vectors.shape[1]),
+        "queries": int(len(queries)),
+        "k": k,
+        "params": {
+            "nlist": args.nlist,
+            "nprobe": args.nprobe,
+            "pq_m": args.pq_m,
+            "hnsw_m": args.hnsw_m,
+            "ef_search": args.ef_search,
+            "threads": args.threads
+        },
+        "results": [
+            bench_type(index_type, vectors, queries, ground_truth, k)
+            for index_type in args.types
+        ]
+    }
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
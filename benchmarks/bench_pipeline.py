@@ -0,0 +1,423 @@
+"""
+Stage-level benchmark of the ingestion and question-answering pipeline
+on a synthetic compliance corpus.
+
+Generates text PDFs and scanned (image-only) PDFs, then times each
+stage separately against a throwaway store and caches:
+
+    extract_text     extract_text_from_pdf on text PDFs      (per PDF)
+    extract_scanned  extract_text_from_pdf on scanned PDFs   (per PDF, OCR)
+    chunk            create_chunks                            (per page)
+    embed            e5 passage embeddings                    (per batch)
+    embed_rerank     MiniLM passage vectors                   (per batch)
+    index            add_documents: FAISS add + version publish (per PDF)
+    retrieve         query embedding + hybrid search          (per question)
+    rerank           rerank                                   (per question)
+    generate         flan-t5 answer                           (per question)
+
+Each stage reports calls, items, throughput (items / s) and
+mean / p50 / p95 / p99 latency as JSON, so runs can be diffed
+between commits.
+
+    python -m benchmarks.bench_pipeline
+    python -m benchmarks.bench_pipeline --text-pdfs 20 --pages 10 --queries 200
+    python -m benchmarks.bench_pipeline --scanned-pdfs 0 --output bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+
+import numpy as np
+
+from benchmarks.bench_index_types import percentile_ms
+
+
+BASE_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..")
+)
+
+
+# =======================
+# Synthetic corpus
+# =======================
+
+_SUBJECTS = [
+    "Regulated entities", "Banks", "Payment system operators", "Non-banking financial companies",
+    "The compliance officer", "The board of directors", "Every branch", "The principal officer"
+]
+_OBLIGATIONS = [
+    "shall verify the identity of each customer", "shall report suspicious transactions",
+    "shall maintain records of all cash transactions", "shall review the risk category of accounts",
+    "shall obtain beneficial ownership information", "shall monitor high value wire transfers",
+    "shall update customer due diligence records", "shall maintain the liquidity coverage ratio",
+    "shall disclose capital adequacy figures", "shall freeze accounts of designated persons"
+]
+_CONDITIONS = [
+    "before opening an account", "within seven working days", "at least once every two years",
+    "when the transaction exceeds the prescribed threshold", "on a continuous basis",
+    "as part of periodic risk assessment", "whenever there is a change in ownership",
+    "in accordance with the master direction on KYC"
+]
+_REFERENCES = [
+    "as laid down in the master circular", "under the prevention of money laundering rules",
+    "as prescribed by the regulator", "subject to the approval of the board",
+    "in line with the risk based approach", "consistent with the FATF recommendations"
+]
+
+
+def compliance_sentence(rng: random.Random) -> str:
+    return (
+        f"{rng.choice(_SUBJECTS)} {rng.choice(_OBLIGATIONS)} {rng.choice(_CONDITIONS)}, "
+        f"{rng.choice(_REFERENCES)} (section {rng.randint(1, 12)}.{rng.randint(1, 9)})."
+    )
+
+
+def compliance_question(rng: random.Random) -> str:
+    obligation = rng.choice(_OBLIGATIONS).replace("shall ", "")
+    return f"When must {rng.choice(_SUBJECTS).lower()} {obligation}?"
+
+
+def page_lines(rng: random.Random, n_lines: int, width: int):
+    """
+    One page of wrapped regulatory text, as lines of at most `width` chars.
+    """
+    lines = []
+    while len(lines) < n_lines:
+        paragraph = " ".join(compliance_sentence(rng) for _ in range(rng.randint(3, 6)))
+        lines.extend(textwrap.wrap(paragraph, width) + [""])
+    return lines[:n_lines]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: str, pages):
+    """
+    Minimal PDF with a real text layer (Helvetica, one line per
+    string), written by hand so no PDF library is needed.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    kids = []
+
+    for lines in pages:
+        text = " ".join(f"({_pdf_escape(line)}) '" for line in lines)
+        content = f"BT /F1 10 Tf 12 TL 50 780 Td {text} ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+
+        objects.append((
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        ).encode())
+        kids.append(len(objects))
+
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    ).encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_scanned_pdf(path: str, pages, dpi: int = 200):
+    """
+    Image-only PDF (one rendered page image per page, no text layer),
+    so extraction has to go through OCR.
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.load_default(size=dpi // 7)
+    except TypeError:
+        # Pillow < 10.1: fixed-size bitmap font
+        font = ImageFont.load_default()
+
+    images = []
+    for lines in pages:
+        image = Image.new("L", (int(8.5 * dpi), int(11 * dpi)), color=255)
+        draw = ImageDraw.Draw(image)
+        for i, line in enumerate(lines):
+            draw.text((dpi // 2, dpi // 2 + i * dpi // 5), line, fill=0, font=font)
+        images.append(image)
+
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=dpi)
+
+
+def make_corpus(folder: str, text_pdfs: int, scanned_pdfs: int, pages: int, seed: int):
+    """
+    Write the synthetic PDFs. Returns (text_paths, scanned_paths).
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    text_paths = []
+    for i in range(text_pdfs):
+        path = os.path.join(folder, f"text_{i:03d}.pdf")
+        write_text_pdf(path, [page_lines(rng, 55, 95) for _ in range(pages)])
+        text_paths.append(path)
+
+    scanned_paths = []
+    for i in range(scanned_pdfs):
+        path = os.path.join(folder, f"scanned_{i:03d}.pdf")
+        write_scanned_pdf(path, [page_lines(rng, 40, 70) for _ in range(pages)])
+        scanned_paths.append(path)
+
+    return text_paths, scanned_paths
+
+
+# =======================
+# Timing
+# =======================
+
+class Stage:
+    """
+    Latency samples of one stage plus the number of items processed.
+    """
+
+    def __init__(self, unit: str):
+        self.unit = unit
+        self.samples = []
+        self.items = 0
+        self.error = None
+
+    def run(self, fn, *args, items: int = 1, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples.append(time.perf_counter() - start)
+        self.items += items
+        return result
+
+    def report(self) -> dict:
+        if self.error:
+            return {"error": self.error}
+        if not self.samples:
+            return {"calls": 0}
+
+        total = sum(self.samples)
+        return {
+            "calls": len(self.samples),
+            "items": self.items,
+            "unit": self.unit,
+            "total_seconds": round(total, 4),
+            "throughput_per_s": round(self.items / total, 3) if total else None,
+            "mean_ms": round(total / len(self.samples) * 1000, 4),
+            "p50_ms": percentile_ms(self.samples, 50),
+            "p95_ms": percentile_ms(self.samples, 95),
+            "p99_ms": percentile_ms(self.samples, 99)
+        }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =======================
+# Stages
+# =======================
+
+def bench_extract(stage: Stage, paths, pages: int):
+    from app.utils.ingest import extract_text_from_pdf
+
+    extracted = []
+    for path in paths:
+        extracted.append(stage.run(extract_text_from_pdf, path, items=pages))
+    return extracted
+
+
+def bench_chunk(stage: Stage, extracted):
+    from app.utils.ingest import create_chunks
+
+    documents_per_pdf = []
+    for pdf_number, pages_content in enumerate(extracted):
+        base_metadata = {
+            "doc_id": f"bench-{pdf_number:03d}",
+            "original_filename": f"bench_{pdf_number:03d}.pdf"
+        }
+
+        documents = []
+        for page_num, text in pages_content:
+            chunks = stage.run(create_chunks, text, base_metadata, page_num, items=0)
+            stage.items += len(chunks)
+            documents.extend(chunks)
+        documents_per_pdf.append(documents)
+
+    return documents_per_pdf
+
+
+def bench_embed(stage: Stage, embed_fn, texts, batch_size: int):
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        stage.run(embed_fn, batch, items=len(batch))
+
+
+def bench_queries(stages, rag, questions, generate: int):
+    for i, question in enumerate(questions):
+        docs = stages["retrieve"].run(
+            lambda q: rag._search(q, rag.embed_query(q), 5), question
+        )
+        docs = stages["rerank"].run(rag.rerank, f"query: {question}", docs)
+
+        if i < generate:
+            stages["generate"].run(rag.generator.generate, rag.build_prompt(question, docs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-pdfs", type=int, default=4)
+    parser.add_argument("--scanned-pdfs", type=int, default=1)
+    parser.add_argument("--pages", type=int, default=5, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--generate", type=int, default=20, help="questions that also run generation")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="keep the corpus, index and caches here (default: temp dir, removed)")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    stages = {
+        "extract_text": Stage("pages"),
+        "extract_scanned": Stage("pages"),
+        "chunk": Stage("chunks"),
+        "embed": Stage("chunks"),
+        "embed_rerank": Stage("chunks"),
+        "index": Stage("chunks"),
+        "retrieve": Stage("questions"),
+        "rerank": Stage("questions"),
+        "generate": Stage("questions")
+    }
+
+    try:
+        # Pipeline logging goes to stderr; stdout is the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            report = run(args, workdir, stages)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+
+def run(args, workdir: str, stages) -> dict:
+    from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from app.services.models import EMBEDDING_MODEL, RERANKER_MODEL, backend_of, cache_name
+    from app.services.rag import RAGStore
+
+    text_paths, scanned_paths = make_corpus(
+        os.path.join(workdir, "pdfs"), args.text_pdfs, args.scanned_pdfs, args.pages, args.seed
+    )
+
+    rag = RAGStore(db_path=os.path.join(workdir, "faiss_index"))
+
+    # The constructor loads nothing (models are lazy); warm_up() loads
+    # e5, MiniLM and flan-t5 with one tiny inference each, as the
+    # server does at startup
+    start = time.perf_counter()
+    rag.warm_up()
+    model_load_seconds = time.perf_counter() - start
+    if rag.warm_up_error:
+        raise SystemExit(f"Model warm-up failed: {rag.warm_up_error}")
+
+    # Fresh embedding caches: every chunk is a miss, like a first upload
+    cache_dir = os.path.join(workdir, "cache")
+    rag.embedding = CachedEmbeddings(
+        rag.embedding.base, EmbeddingCache(cache_name(EMBEDDING_MODEL, rag.embedding.base), cache_dir)
+    )
+    rag.rerank_cache = EmbeddingCache(cache_name(RERANKER_MODEL, rag.reranker), cache_dir)
+
+    # 1️⃣ Extraction
+    extracted = bench_extract(stages["extract_text"], text_paths, args.pages)
+    if scanned_paths:
+        try:
+            extracted += bench_extract(stages["extract_scanned"], scanned_paths, args.pages)
+        except Exception as e:
+            # Tesseract / poppler missing: report it, benchmark the rest
+            stages["extract_scanned"].error = f"{type(e).__name__}: {e}"
+
+    # 2️⃣ Chunking
+    documents_per_pdf = bench_chunk(stages["chunk"], extracted)
+    texts = [doc.page_content for documents in documents_per_pdf for doc in documents]
+
+    # 3️⃣ Embedding (fills the caches, so indexing below times only
+    # the FAISS add + save + publish)
+    bench_embed(stages["embed"], rag.embedding.embed_documents, texts, args.batch_size)
+    bench_embed(stages["embed_rerank"], rag._encode_for_rerank, texts, args.batch_size)
+
+    # 4️⃣ Indexing, one add_documents call per PDF like single uploads
+    for documents in documents_per_pdf:
+        if documents:
+            stages["index"].run(rag.add_documents, documents, items=len(documents))
+
+    # 5️⃣ Retrieval, rerank, generation
+    rng = random.Random(args.seed + 1)
+    questions = [compliance_question(rng) for _ in range(args.queries)]
+    if rag.vector_count():
+        bench_queries(stages, rag, questions, args.generate)
+
+    return {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {
+            "text_pdfs": len(text_paths),
+            "scanned_pdfs": len(scanned_paths),
+            "pages_per_pdf": args.pages,
+            "chunks": len(texts),
+            "chars": int(np.sum([len(text) for text in texts])) if texts else 0,
+            "seed": args.seed
+        },
+        "params": {
+            "queries": len(questions),
+            "generate": min(args.generate, len(questions)),
+            "batch_size": args.batch_size,
+            "inference_backend": {
+                "embedding": backend_of(rag.embedding.base),
+                "reranker": backend_of(rag.reranker),
+                "llm": backend_of(rag.llm.pipeline.model)
+            }
+        },
+        "model_load_seconds": round(model_load_seconds, 3),
+        "index": rag.index_stats(),
+        "stages": {name: stage.report() for name, stage in stages.items()}
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""
+Parity check between the PyTorch and the int8 ONNX Runtime backends
+(INFERENCE_BACKEND=torch / onnx) on a synthetic compliance corpus.
+
+Builds one throwaway store per backend from the same text PDFs and
+asks both the same questions:
+
+    embedding   cosine between torch and ONNX vectors of every chunk
+                (e5 and MiniLM)
+    retrieval   overlap of the retrieve() results (after reranking)
+                per question, and how often the top passage agrees
+    answers     flan-t5 answers from each store (end to end) and from
+                the same prompts (generator only): exact-match rate,
+                mean similarity and NOT_FOUND agreement
+    latency     mean ms per stage for each backend
+
+Prints a JSON report and exits with status 1 when a threshold is
+missed, so it can gate a switch to INFERENCE_BACKEND=onnx. Needs
+optimum[onnxruntime]; there is no fallback here.
+
+    python -m benchmarks.onnx_parity
+    python -m benchmarks.onnx_parity --text-pdfs 8 --queries 100 --output parity.json
+"""
+
+import argparse
+import contextlib
+import difflib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from benchmarks.bench_pipeline import (
+    Stage, bench_chunk, bench_extract, compliance_question, git_commit, make_corpus
+)
+
+
+BACKENDS = ("torch", "onnx")
+
+
+def make_store(workdir: str, backend: str):
+    """
+    RAGStore in its own directory, running `backend`'s models with
+    fresh embedding caches.
+    """
+    from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+    from app.services.models import (
+        EMBEDDING_MODEL, RERANKER_MODEL, cache_name,
+        load_embedding_model, load_llm, load_reranker_model
+    )
+    from app.services.rag import GenerationScheduler, RAGStore
+
+    folder = os.path.join(workdir, backend)
+    cache_dir = os.path.join(folder, "cache")
+
+    rag = RAGStore(db_path=os.path.join(folder, "faiss_index"))
+
+    base = load_embedding_model(backend, fallback=False)
+    rag.embedding = CachedEmbeddings(base, EmbeddingCache(cache_name(EMBEDDING_MODEL, base), cache_dir))
+    rag.reranker = load_reranker_model(backend, fallback=False)
+    rag.rerank_cache = EmbeddingCache(cache_name(RERANKER_MODEL, rag.reranker), cache_dir)
+    rag.llm = load_llm(backend, fallback=False)
+    rag.generator = GenerationScheduler(rag.llm.pipeline)
+
+    return rag
+
+
+def cosines(a, b) -> dict:
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    values = np.sum(a * b, axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    return {"mean": round(float(values.mean()), 6), "min": round(float(values.min()), 6)}
+
+
+def normalize_answer(answer: str) -> str:
+    return " ".join(answer.lower().split())
+
+
+def answer_agreement(answers_a, answers_b) -> dict:
+    from app.services.rag import NOT_FOUND_MESSAGE
+
+    pairs = [(normalize_answer(a), normalize_answer(b)) for a, b in zip(answers_a, answers_b)]
+    not_found = normalize_answer(NOT_FOUND_MESSAGE)
+    return {
+        "answers": len(pairs),
+        "exact_match": round(float(np.mean([a == b for a, b in pairs])), 4) if pairs else None,
+        "mean_similarity": round(float(np.mean([
+            difflib.SequenceMatcher(None, a, b).ratio() for a, b in pairs
+        ])), 4) if pairs else None,
+        "not_found_agreement": round(float(np.mean([
+            ("not_found" in a or a == not_found) == ("not_found" in b or b == not_found)
+            for a, b in pairs
+        ])), 4) if pairs else None
+    }
+
+
+def retrieval_agreement(results_a, results_b) -> dict:
+    overlaps, top1 = [], []
+    for docs_a, docs_b in zip(results_a, results_b):
+        texts_a = [doc.page_content for doc in docs_a]
+        texts_b = [doc.page_content for doc in docs_b]
+        if not texts_a and not texts_b:
+            overlaps.append(1.0)
+            top1.append(True)
+            continue
+
+        overlaps.append(len(set(texts_a) & set(texts_b)) / max(len(set(texts_a) | set(texts_b)), 1))
+        top1.append(texts_a[:1] == texts_b[:1])
+
+    return {
+        "questions": len(overlaps),
+        "mean_overlap": round(float(np.mean(overlaps)), 4) if overlaps else None,
+        "min_overlap": round(float(np.min(overlaps)), 4) if overlaps else None,
+        "top1_agreement": round(float(np.mean(top1)), 4) if top1 else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--text-pdfs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=5, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--generate", type=int, default=20, help="questions that also run generation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="mean embedding cosine, per model")
+    parser.add_argument("--min-overlap", type=float, default=0.9, help="mean retrieval overlap")
+    parser.add_argument("--min-answer-match", type=float, default=0.8, help="end-to-end exact-match rate")
+    parser.add_argument("--workdir", help="keep the corpus, stores and caches here (default: temp dir, removed)")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="onnx_parity_")
+    try:
+        # Pipeline logging goes to stderr; stdout is the JSON report
+        with contextlib.redirect_stdout(sys.stderr):
+            report = run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+    sys.exit(0 if report["passed"] else 1)
+
+
+def run(args, workdir: str) -> dict:
+    text_paths, _ = make_corpus(os.path.join(workdir, "pdfs"), args.text_pdfs, 0, args.pages, args.seed)
+    documents = [
+        doc
+        for docs in bench_chunk(Stage("chunks"), bench_extract(Stage("pages"), text_paths, args.pages))
+        for doc in docs
+    ]
+    texts = [doc.page_content for doc in documents]
+
+    rng = random.Random(args.seed + 1)
+    questions = [compliance_question(rng) for _ in range(args.queries)]
+    generate = questions[:args.generate]
+
+    stores = {backend: make_store(workdir, backend) for backend in BACKENDS}
+    stages = {
+        backend: {
+            "embed": Stage("chunks"),
+            "embed_rerank": Stage("chunks"),
+            "retrieve": Stage("questions"),
+            "generate": Stage("questions")
+        }
+        for backend in BACKENDS
+    }
+
+    vectors, retrieved, answers = {}, {}, {}
+    for backend, rag in stores.items():
+        timing = stages[backend]
+
+        # 1️⃣ Embeddings (fill the caches the store then indexes from)
+        vectors[backend] = (
+            timing["embed"].run(rag.embedding.embed_documents, texts, items=len(texts)),
+            timing["embed_rerank"].run(rag._encode_for_rerank, texts, items=len(texts))
+        )
+        rag.add_documents(documents)
+
+        # 2️⃣ Retrieval + rerank, 3️⃣ end-to-end answers
+        retrieved[backend] = [timing["retrieve"].run(rag.retrieve, question) for question in questions]
+        answers[backend] = [
+            timing["generate"].run(rag.generator.generate, rag.build_prompt(question, docs))
+            for question, docs in zip(generate, retrieved[backend])
+        ]
+
+    # Generator alone: the ONNX model answers the torch store's prompts
+    same_prompt = [
+        stores["onnx"].generator.generate(stores["torch"].build_prompt(question, docs))
+        for question, docs in zip(generate, retrieved["torch"])
+    ]
+
+    report = {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"text_pdfs": len(text_paths), "pages_per_pdf": args.pages, "chunks": len(texts), "seed": args.seed},
+        "embedding": {
+            "e5": cosines(vectors["torch"][0], vectors["onnx"][0]),
+            "reranker": cosines(vectors["torch"][1], vectors["onnx"][1])
+        },
+        "retrieval": retrieval_agreement(retrieved["torch"], retrieved["onnx"]),
+        "answers": {
+            "end_to_end": answer_agreement(answers["torch"], answers["onnx"]),
+            "same_prompt": answer_agreement(answers["torch"], same_prompt)
+        },
+        "latency": {
+            backend: {name: stage.report() for name, stage in stages[backend].items()}
+            for backend in BACKENDS
+        }
+    }
+
+    failures = []
+    for model, stats in report["embedding"].items():
+        if stats["mean"] < args.min_cosine:
+            failures.append(f"{model} mean cosine {stats['mean']} < {args.min_cosine}")
+    overlap = report["retrieval"]["mean_overlap"]
+    if overlap is not None and overlap < args.min_overlap:
+        failures.append(f"retrieval mean overlap {overlap} < {args.min_overlap}")
+    match = report["answers"]["end_to_end"]["exact_match"]
+    if match is not None and match < args.min_answer_match:
+        failures.append(f"answer exact match {match} < {args.min_answer_match}")
+
+    report["thresholds"] = {
+        "min_cosine": args.min_cosine,
+        "min_overlap": args.min_overlap,
+        "min_answer_match": args.min_answer_match
+    }
+    report["failures"] = failures
+    report["passed"] = not failures
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,178 @@
-import requests
-from config import BACKEND_URL
-import requests
-from io import BytesIO
-
-
-BASE_URL = "http://localhost:8000/api"
-
-
-
-def upload_pdf(uploaded_file):
-    file_bytes = uploaded_file.getvalue()  # bytes
-    file_buffer = BytesIO(file_bytes)      # file-like object with seek()
-    response = requests.post(
-        f"{BASE_URL}/upload",
-        files={
-            "up_file": (
-                uploaded_file.name,
-                file_buffer,                # ✅ file-like object
-                "application/pdf"
-            )
-        }
-    )
-    return response.json()
-
-
-
-def ask_question(question, doc_id=None):
-    payload = {"question": question}
-    if doc_id:
-        payload["doc_id"] = doc_id
-
-    response = requests.post(f"{BACKEND_URL}/ask", json=payload)
-    return response.json()
-
-def list_documents():
-    response = requests.get(f"{BACKEND_URL}/documents")
-    return response.json()
-
-def delete_document(doc_id: str):
-    response = requests.delete(
-        f"{BACKEND_URL}/documents/{doc_id}"
-    )
-    return response.json()
-
-def reset_knowledge_base():
-    response = requests.post(f"{BACKEND_URL}/reset")
-    return _safe_json(response)
-
-# ---------- helper ----------
-
-def _safe_json(response):
-    """
-    Never crash frontend on bad / empty responses.
-    """
-    try:
-        return response.json()
-    except ValueError:
-        return {
-            "status_code": response.status_code,
-            "raw_response": response.text
-        }
+import requests
+from config import BACKEND_URL
+import requests
+import hashlib
+import json
+import time
+from io import BytesIO
+
+
+BASE_URL = "http://localhost:8000/api"
+
+
+
+def find_document_by_hash(file_bytes: bytes):
+    """
+    The registered document with the same content, or None.
+    Checked before uploading, so known PDFs are never sent again.
+    """
+    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    response = requests.get(f"{BACKEND_URL}/documents/hash/{content_hash}")
+    return response.json() if response.status_code == 200 else None
+
+
+def upload_pdf(uploaded_file):
+    file_bytes = uploaded_file.getvalue()  # bytes
+
+    existing = find_document_by_hash(file_bytes)
+    if existing:
+        return {"status": "duplicate", "filename": uploaded_file.name, **existing}
+
+    file_buffer = BytesIO(file_bytes)      # file-like object with seek()
+    response = requests.post(
+        f"{BASE_URL}/upload",
+        files={
+            "up_file": (
+                uploaded_file.name,
+                file_buffer,                # ✅ file-like object
+                "application/pdf"
+            )
+        }
+    )
+    return response.json()
+
+
+def upload_pdfs(uploaded_files):
+    """
+    Upload several PDFs as one batch ingestion job.
+    PDFs the backend already has are skipped and listed as duplicates.
+    """
+    new_files = []
+    duplicates = []
+    for uploaded_file in uploaded_files:
+        existing = find_document_by_hash(uploaded_file.getvalue())
+        if existing:
+            duplicates.append({"filename": uploaded_file.name, **existing})
+        else:
+            new_files.append(uploaded_file)
+
+    if not new_files:
+        return {"status": "duplicate", "job_id": None, "documents": [], "duplicates": duplicates}
+
+    response = requests.post(
+        f"{BASE_URL}/upload/batch",
+        files=[
+            (
+                "files",
+                (uploaded_file.name, BytesIO(uploaded_file.getvalue()), "application/pdf")
+            )
+            for uploaded_file in new_files
+        ]
+    )
+    result = _safe_json(response)
+    result["duplicates"] = duplicates + result.get("duplicates", [])
+    return result
+
+
+
+def get_job(job_id: str):
+    response = requests.get(f"{BACKEND_URL}/jobs/{job_id}")
+    return _safe_json(response)
+
+
+def wait_for_job(job_id: str, poll_seconds: float = 1.0, timeout: float = 1800):
+    """
+    Poll an ingestion job until it completes or fails.
+    """
+    deadline = time.time() + timeout
+    while True:
+        job = get_job(job_id)
+        if job.get("status") in ("completed", "failed") or time.time() > deadline:
+            return job
+        time.sleep(poll_seconds)
+
+
+def ask_question(question, doc_id=None):
+    payload = {"question": question}
+    if doc_id:
+        payload["doc_id"] = doc_id
+
+    response = requests.post(f"{BACKEND_URL}/ask", json=payload)
+    return response.json()
+
+def ask_question_stream(question, doc_id=None):
+    """
+    Stream an answer from /ask/stream.
+    Yields (event, data) tuples: "sources", "token"..., "done" (or "error").
+    A non-200 response (e.g. 503 while the models load, 422 for a bad
+    request) yields one "error" event with the backend's detail.
+    """
+    payload = {"question": question}
+    if doc_id:
+        payload["doc_id"] = doc_id
+
+    with requests.post(
+        f"{BACKEND_URL}/ask/stream",
+        json=payload,
+        stream=True
+    ) as response:
+        if response.status_code != 200:
+            yield "error", {
+                "status_code": response.status_code,
+                "error": _error_detail(response)
+            }
+            return
+
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+                continue
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                yield event, json.loads(line[len("data:"):].strip())
+
+def list_documents():
+    response = requests.get(f"{BACKEND_URL}/documents")
+    return response.json()
+
+def delete_document(doc_id: str):
+    response = requests.delete(
+        f"{BACKEND_URL}/documents/{doc_id}"
+    )
+    return response.json()
+
+def reset_knowledge_base():
+    response = requests.post(f"{BACKEND_URL}/reset")
+    return _safe_json(response)
+
+# ---------- helper ----------
+
+def _error_detail(response) -> str:
+    """
+    Readable message from an error response's "detail" (FastAPI),
+    falling back to the raw body.
+    """
+    try:
+        body = response.json()
+    except ValueError:
+        return response.text or f"HTTP {response.status_code}"
+
+    detail = body.get("detail", body) if isinstance(body, dict) else body
+
+    if isinstance(detail, str):
+        return detail
+    return json.dumps(detail)
+
+def _safe_json(response):
+    """
+    Never crash frontend on bad / empty responses.
+    """
+    try:
+        return response.json()
+    except ValueError:
+        return {
+            "status_code": response.status_code,
+            "raw_response": response.text
+        }
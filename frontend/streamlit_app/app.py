@@ -1,168 +1,221 @@
-import streamlit as st
-from api_client import (
-    upload_pdf,
-    ask_question,
-    list_documents,
-    delete_document,
-    reset_knowledge_base
-)
-
-# ======================================================
-# Page Config
-# ======================================================
-
-st.set_page_config(
-    page_title="Compliance RAG Assistant",
-    layout="wide"
-)
-
-st.title("📄 Financial Compliance Assistant")
-st.caption(
-    "Ask questions grounded strictly in your uploaded compliance documents"
-)
-
-# ======================================================
-# Session State
-# ======================================================
-
-if "confirm_delete" not in st.session_state:
-    st.session_state.confirm_delete = False
-
-if "confirm_reset" not in st.session_state:
-    st.session_state.confirm_reset = False
-
-# ======================================================
-# Document Management
-# ======================================================
-
-st.header("📁 Document Management")
-
-col1, col2 = st.columns(2)
-
-# ---------------- Upload ---------------- #
-
-with col1:
-    uploaded_file = st.file_uploader(
-        "Upload PDF",
-        type=["pdf"]
-    )
-
-    if uploaded_file:
-        if st.button("➕ Ingest Document"):
-            with st.spinner("Processing document..."):
-                result = upload_pdf(uploaded_file)
-                st.success("Document ingested successfully")
-                st.json(result)
-                st.rerun()
-
-# ---------------- List + Delete ---------------- #
-
-with col2:
-    documents = []
-    try:
-        documents = list_documents()
-    except Exception as e:
-        st.error("Failed to load documents")
-        st.write(e)
-
-    if documents:
-        doc_map = {
-            doc["original_filename"]: doc["doc_id"]
-            for doc in documents
-        }
-
-        selected_doc_name = st.selectbox(
-            "Select document",
-            options=["All documents"] + list(doc_map.keys())
-        )
-
-        selected_doc_id = (
-            None
-            if selected_doc_name == "All documents"
-            else doc_map[selected_doc_name]
-        )
-
-        if selected_doc_id:
-            if st.button("🗑 Delete selected document"):
-                st.session_state.confirm_delete = True
-
-            if st.session_state.confirm_delete:
-                st.warning("This action is permanent.")
-                if st.checkbox("I understand and want to delete this document"):
-                    with st.spinner(
-                        "Deleting document and rebuilding index..."
-                    ):
-                        result = delete_document(selected_doc_id)
-                        st.success("Document deleted successfully")
-                        st.json(result)
-                        st.session_state.confirm_delete = False
-                        st.rerun()
-    else:
-        selected_doc_id = None
-        st.info("No documents uploaded yet.")
-
-st.divider()
-
-# ======================================================
-# Question Answering
-# ======================================================
-
-st.header("❓ Ask a Question")
-
-question = st.text_input(
-    "Enter your question",
-    placeholder="e.g. What are the KYC requirements?"
-)
-
-if st.button("Ask"):
-    if not question.strip():
-        st.warning("Please enter a question.")
-    else:
-        with st.spinner("Generating answer..."):
-            response = ask_question(
-                question,
-                selected_doc_id
-            )
-
-            if "answer" in response:
-                st.subheader("✅ Answer")
-                st.write(response["answer"])
-
-                st.subheader("📌 Sources")
-                if response.get("sources"):
-                    for src in response["sources"]:
-                        with st.expander(
-                            f"{src.get('original_filename')} "
-                            f"(chunk {src.get('chunk_id')})"
-                        ):
-                            st.write(src.get("excerpt", ""))
-                else:
-                    st.info("No sources returned.")
-            else:
-                st.error("Backend did not return a valid answer.")
-                st.json(response)
-
-st.divider()
-
-# ======================================================
-# Danger Zone — Reset
-# ======================================================
-
-st.header("⚠️ Danger Zone")
-
-st.warning(
-    "This will permanently delete ALL documents, metadata, "
-    "and vector embeddings."
-)
-
-if st.button("🚨 Reset Knowledge Base"):
-    st.session_state.confirm_reset = True
-
-if st.session_state.confirm_reset:
-    if st.checkbox("I understand and want to reset everything"):
-        with st.spinner("Resetting entire knowledge base..."):
-            result = reset_knowledge_base()
-            st.success("Knowledge base reset successfully")
-            st.json(result)
-            st.session_state.confirm_reset = False
-            st.rerun()
+import streamlit as st
+from api_client import (
+    upload_pdf,
+    upload_pdfs,
+    wait_for_job,
+    ask_question_stream,
+    list_documents,
+    delete_document,
+    reset_knowledge_base
+)
+
+# ======================================================
+# Page Config
+# ======================================================
+
+st.set_page_config(
+    page_title="Compliance RAG Assistant",
+    layout="wide"
+)
+
+st.title("📄 Financial Compliance Assistant")
+st.caption(
+    "Ask questions grounded strictly in your uploaded compliance documents"
+)
+
+# ======================================================
+# Session State
+# ======================================================
+
+if "confirm_delete" not in st.session_state:
+    st.session_state.confirm_delete = False
+
+if "confirm_reset" not in st.session_state:
+    st.session_state.confirm_reset = False
+
+# ======================================================
+# Document Management
+# ======================================================
+
+st.header("📁 Document Management")
+
+col1, col2 = st.columns(2)
+
+# ---------------- Upload ---------------- #
+
+with col1:
+    uploaded_files = st.file_uploader(
+        "Upload PDF",
+        type=["pdf"],
+        accept_multiple_files=True
+    )
+
+    if uploaded_files:
+        if st.button("➕ Ingest Documents" if len(uploaded_files) > 1 else "➕ Ingest Document"):
+            with st.spinner("Processing documents..."):
+                # Several files go through one batch job
+                result = (
+                    upload_pdfs(uploaded_files)
+                    if len(uploaded_files) > 1
+                    else upload_pdf(uploaded_files[0])
+                )
+                job = (
+                    wait_for_job(result["job_id"])
+                    if result.get("job_id")
+                    else result
+                )
+
+            # Already-uploaded PDFs are not ingested again
+            duplicates = result.get("duplicates") or (
+                [result] if result.get("status") == "duplicate" else []
+            )
+            if duplicates:
+                st.info(
+                    "Already uploaded: "
+                    + ", ".join(duplicate["filename"] for duplicate in duplicates)
+                )
+
+            failed = (job.get("result") or {}).get("failed")
+            if job.get("status") == "duplicate":
+                st.json(result)
+            elif job.get("status") == "completed" and failed:
+                st.warning(f"{len(failed)} document(s) could not be ingested")
+                st.json(job)
+            elif job.get("status") == "completed":
+                st.success("Document ingested successfully")
+                st.json(job)
+                st.rerun()
+            else:
+                st.error("Document ingestion failed")
+                st.json(job)
+
+# ---------------- List + Delete ---------------- #
+
+with col2:
+    documents = []
+    try:
+        documents = list_documents()
+    except Exception as e:
+        st.error("Failed to load documents")
+        st.write(e)
+
+    if documents:
+        doc_map = {
+            doc["original_filename"]: doc["doc_id"]
+            for doc in documents
+        }
+
+        selected_doc_name = st.selectbox(
+            "Select document",
+            options=["All documents"] + list(doc_map.keys())
+        )
+
+        selected_doc_id = (
+            None
+            if selected_doc_name == "All documents"
+            else doc_map[selected_doc_name]
+        )
+
+        if selected_doc_id:
+            if st.button("🗑 Delete selected document"):
+                st.session_state.confirm_delete = True
+
+            if st.session_state.confirm_delete:
+                st.warning("This action is permanent.")
+                if st.checkbox("I understand and want to delete this document"):
+                    with st.spinner(
+                        "Deleting document and rebuilding index..."
+                    ):
+                        result = delete_document(selected_doc_id)
+                        st.success("Document deleted successfully")
+                        st.json(result)
+                        st.session_state.confirm_delete = False
+                        st.rerun()
+    else:
+        selected_doc_id = None
+        st.info("No documents uploaded yet.")
+
+st.divider()
+
+# ======================================================
+# Question Answering
+# ======================================================
+
+st.header("❓ Ask a Question")
+
+question = st.text_input(
+    "Enter your question",
+    placeholder="e.g. What are the KYC requirements?"
+)
+
+def render_sources(sources):
+    st.subheader("📌 Sources")
+    if sources:
+        for src in sources:
+            with st.expander(
+                f"{src.get('original_filename')} "
+                f"(chunk {src.get('chunk_id')})"
+            ):
+                st.write(src.get("excerpt", ""))
+    else:
+        st.info("No sources returned.")
+
+
+if st.button("Ask"):
+    if not question.strip():
+        st.warning("Please enter a question.")
+    else:
+        st.subheader("✅ Answer")
+        answer_box = st.empty()
+        sources_box = st.empty()
+
+        answer = ""
+        answer_box.info("Retrieving sources...")
+
+        # Sources arrive first, then tokens as they are generated
+        for event, data in ask_question_stream(
+            question,
+            selected_doc_id
+        ):
+            if event == "sources":
+                with sources_box.container():
+                    render_sources(data)
+                answer_box.info("Generating answer...")
+
+            elif event == "token":
+                answer += data
+                answer_box.write(answer)
+
+            elif event == "done":
+                answer_box.write(data["answer"])
+                with sources_box.container():
+                    render_sources(data["sources"])
+
+            elif event == "error":
+                answer_box.error(data.get("error") or "Backend did not return a valid answer.")
+                st.json(data)
+
+st.divider()
+
+# ======================================================
+# Danger Zone — Reset
+# ======================================================
+
+st.header("⚠️ Danger Zone")
+
+st.warning(
+    "This will permanently delete ALL documents, metadata, "
+    "and vector embeddings."
+)
+
+if st.button("🚨 Reset Knowledge Base"):
+    st.session_state.confirm_reset = True
+
+if st.session_state.confirm_reset:
+    if st.checkbox("I understand and want to reset everything"):
+        with st.spinner("Resetting entire knowledge base..."):
+            result = reset_knowledge_base()
+            st.success("Knowledge base reset successfully")
+            st.json(result)
+            st.session_state.confirm_reset = False
+            st.rerun()
@@ -1 +1 @@
-BACKEND_URL = "http://localhost:8000/api"
+BACKEND_URL = "http://localhost:8000/api"
@@ -0,0 +1,81 @@
+import numpy as np
+
+from app.services.answer_cache import AnswerCache
+
+
+RESULT = {"answer": "Banks must verify customer identity.", "sources": []}
+
+
+def test_get_matches_normalized_question():
+    cache = AnswerCache()
+    cache.put("What is KYC?", None, 1, RESULT)
+
+    assert cache.get("  what is   kyc ", None, 1) == RESULT
+    assert cache.get("What is KYC?", "doc", 1) is None
+
+
+def test_entries_from_an_older_index_version_are_not_served():
+    cache = AnswerCache()
+    cache.put("What is KYC?", None, 1, RESULT)
+
+    assert cache.get("What is KYC?", None, 2) is None
+
+    # The stale entry is dropped, not kept for the old version
+    assert cache.get("What is KYC?", None, 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_every_entry():
+    cache = AnswerCache()
+    cache.put("What is KYC?", None, 1, RESULT)
+    cache.put("What is AML?", "doc", 1, RESULT)
+
+    cache.invalidate()
+
+    assert cache.get("What is KYC?", None, 1) is None
+    assert cache.get("What is AML?", "doc", 1) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_expired_entries_are_not_served():
+    cache = AnswerCache(ttl_seconds=0)
+    cache.put("What is KYC?", None, 1, RESULT)
+
+    assert cache.get("What is KYC?", None, 1) is None
+
+
+def test_oldest_entry_is_evicted_first():
+    cache = AnswerCache(max_size=2)
+    cache.put("first", None, 1, RESULT)
+    cache.put("second", None, 1, RESULT)
+    cache.get("first", None, 1)
+    cache.put("third", None, 1, RESULT)
+
+    assert cache.get("second", None, 1) is None
+    assert cache.get("first", None, 1) == RESULT
+    assert cache.get("third", None, 1) == RESULT
+
+
+def test_cached_results_are_copies():
+    cache = AnswerCache()
+    cache.put("What is KYC?", None, 1, RESULT)
+
+    cache.get("What is KYC?", None, 1)["sources"].append("changed")
+
+    assert cache.get("What is KYC?", None, 1) == RESULT
+
+
+def test_similar_question_hits_within_the_same_version_and_scope():
+    cache = AnswerCache(similarity_threshold=0.9)
+    vector = np.array([1.0, 0.0], dtype=np.float32)
+    close = np.array([0.99, 0.141], dtype=np.float32)
+    cache.put("What is KYC?", None, 1, RESULT, query_vector=vector)
+
+    assert cache.get("Explain KYC", None, 1) is None
+    assert cache.get_similar(close, None, 1) == RESULT
+    assert cache.get_similar(close, "doc", 1) is None
+    assert cache.get_similar(close, None, 2) is None
+    assert cache.get_similar(np.array([0.0, 1.0], dtype=np.float32), None, 1) is None
+
+    cache.invalidate()
+    assert cache.get_similar(close, None, 1) is None
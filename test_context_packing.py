@@ -0,0 +1,86 @@
+from langchain_core.documents import Document
+
+from app.services.rag import merge_adjacent_chunks, strip_overlap
+
+
+def chunk(chunk_id, text, doc_id="doc", page=1):
+    return Document(
+        page_content=f"passage: {text}",
+        metadata={"doc_id": doc_id, "page": page, "chunk_id": chunk_id}
+    )
+
+
+def test_strip_overlap_removes_repeated_prefix():
+    previous = "Interest rates are set by the central bank of the country."
+    text = "set by the central bank of the country. Inflation then follows."
+
+    assert strip_overlap(previous, text) == "Inflation then follows."
+
+
+def test_strip_overlap_keeps_text_without_overlap():
+    previous = "The first chapter covers monetary policy in detail."
+    text = "Fiscal policy is discussed in the second chapter."
+
+    assert strip_overlap(previous, text) == text
+
+
+def test_strip_overlap_does_not_cut_inside_a_word():
+    previous = "Deposits are held by the central branch of the bank"
+    text = "banking companies lend the deposits onward to borrowers."
+
+    assert strip_overlap(previous, text) == text
+    assert strip_overlap(previous, text, min_overlap=1) == text
+
+
+def test_strip_overlap_ignores_short_chance_matches():
+    previous = "Loans are repaid over time in the end"
+    text = "in the end the bank profits from interest."
+
+    assert strip_overlap(previous, text) == text
+
+
+def test_strip_overlap_is_capped():
+    shared = "a long sentence repeated across both chunks of the page"
+    previous = f"Intro. {shared}"
+    text = f"{shared} and more."
+
+    assert strip_overlap(previous, text, max_overlap=len(shared)) == "and more."
+    assert strip_overlap(previous, text, max_overlap=len(shared) - 10) == text
+
+
+def test_merge_adjacent_chunks_joins_neighbours_without_overlap_text():
+    docs = [
+        chunk(2, "set by the central bank of the country. Inflation then follows."),
+        chunk(1, "Interest rates are set by the central bank of the country."),
+    ]
+
+    assert merge_adjacent_chunks(docs) == [
+        "Interest rates are set by the central bank of the country. Inflation then follows."
+    ]
+
+
+def test_merge_adjacent_chunks_keeps_separate_passages():
+    docs = [
+        chunk(1, "First passage about rates."),
+        chunk(3, "Unrelated passage further down."),
+        chunk(2, "Other document.", doc_id="other"),
+        chunk(2, "Same chunk id, another page.", page=2),
+    ]
+
+    assert merge_adjacent_chunks(docs) == [
+        "First passage about rates.",
+        "Unrelated passage further down.",
+        "Other document.",
+        "Same chunk id, another page.",
+    ]
+
+
+def test_merge_adjacent_chunks_joins_neighbours_that_share_nothing():
+    docs = [
+        chunk(1, "The first chapter covers monetary policy."),
+        chunk(2, "Fiscal policy is discussed next."),
+    ]
+
+    assert merge_adjacent_chunks(docs) == [
+        "The first chapter covers monetary policy. Fiscal policy is discussed next."
+    ]
@@ -1,3 +1,3 @@
-from app.utils.ingest import process_pdf_and_build_store
-
-process_pdf_and_build_store("data/docs/main_notes.pdf")
+from app.utils.ingest import process_pdf_and_build_store
+
+process_pdf_and_build_store("data/docs/main_notes.pdf")
@@ -0,0 +1,67 @@
+from app.services.metadata_store import MetadataStore
+
+
+def entry(doc_id, content_hash, uploaded_at="2026-10-17T09:00:00"):
+    return {
+        "doc_id": doc_id,
+        "original_filename": f"{doc_id}.pdf",
+        "stored_filename": f"{doc_id}.pdf",
+        "uploaded_at": uploaded_at,
+        "content_hash": content_hash
+    }
+
+
+def store(tmp_path):
+    return MetadataStore(str(tmp_path / "metadata.db"), legacy_path=None)
+
+
+def test_add_new_registers_distinct_content(tmp_path):
+    metadata = store(tmp_path)
+
+    added, duplicates = metadata.add_new([entry("a", "hash-a"), entry("b", "hash-b")])
+
+    assert [e["doc_id"] for e in added] == ["a", "b"]
+    assert duplicates == []
+    assert metadata.count() == 2
+
+
+def test_add_new_rejects_content_already_registered(tmp_path):
+    metadata = store(tmp_path)
+    metadata.add(entry("a", "hash-a"))
+
+    added, duplicates = metadata.add_new([entry("copy", "hash-a"), entry("b", "hash-b")])
+
+    assert [e["doc_id"] for e in added] == ["b"]
+    assert [(new["doc_id"], existing["doc_id"]) for new, existing in duplicates] == [("copy", "a")]
+    assert not metadata.contains("copy")
+    assert metadata.count() == 2
+
+
+def test_add_new_keeps_the_first_copy_within_a_batch(tmp_path):
+    metadata = store(tmp_path)
+
+    added, duplicates = metadata.add_new([
+        entry("a", "hash-a"),
+        entry("a-again", "hash-a"),
+        entry("a-third", "hash-a")
+    ])
+
+    assert [e["doc_id"] for e in added] == ["a"]
+    assert [(new["doc_id"], existing["doc_id"]) for new, existing in duplicates] == [
+        ("a-again", "a"),
+        ("a-third", "a")
+    ]
+    assert metadata.get_by_hash("hash-a")["doc_id"] == "a"
+    assert metadata.count() == 1
+
+
+def test_duplicates_point_at_the_oldest_registered_copy(tmp_path):
+    metadata = store(tmp_path)
+    metadata.add_many([
+        entry("newer", "hash-a", "2026-10-17T09:00:00"),
+        entry("older", "hash-a", "2026-10-01T09:00:00")
+    ])
+
+    _, duplicates = metadata.add_new([entry("copy", "hash-a")])
+
+    assert duplicates[0][1]["doc_id"] == "older"
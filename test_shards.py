@@ -0,0 +1,81 @@
+import hashlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.services.embedding_cache import EmbeddingCache
+from app.services.rag import RAGStore
+from app.services.shards import shard_bounds, shard_keys
+
+
+class HashEmbeddings:
+    """
+    Deterministic unit vectors from the text hash, in place of e5.
+    """
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        vector = np.frombuffer(digest, dtype=np.uint8)[:16].astype(np.float32) + 1
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+class HashReranker:
+    def encode(self, texts, normalize_embeddings=True):
+        return np.asarray(HashEmbeddings().embed_documents(texts), dtype=np.float32)
+
+
+def chunks(doc_id, uploaded_at, n=3):
+    return [
+        Document(
+            page_content=f"passage: {doc_id} chunk {i}",
+            metadata={"doc_id": doc_id, "chunk_id": i, "page": 1, "uploaded_at": uploaded_at}
+        )
+        for i in range(n)
+    ]
+
+
+def store(tmp_path):
+    rag = RAGStore(str(tmp_path / "index"))
+    rag.embedding = HashEmbeddings()
+    rag.reranker = HashReranker()
+    rag.rerank_cache = EmbeddingCache("hash", str(tmp_path / "cache"))
+
+    rag.add_documents(chunks("old", "2026-10-10T12:00:00"))
+    rag.add_documents(chunks("new", "2026-10-16T12:00:00"))
+    return rag
+
+
+def test_drop_expired_shards_drops_whole_periods(tmp_path):
+    rag = store(tmp_path)
+    version = rag.index_version
+
+    dropped = rag.drop_expired_shards(shard_bounds("2026-10-10")[1])
+
+    assert dropped == ["2026-10-10"]
+    assert shard_keys(rag.db_path) == ["2026-10-16"]
+    assert [shard["shard"] for shard in rag.index_stats()["shards"]] == ["2026-10-16"]
+    assert rag.index_stats()["vectors"] == 3
+    assert rag.index_version > version
+
+
+def test_drop_expired_shards_keeps_periods_not_over_yet(tmp_path):
+    rag = store(tmp_path)
+    version = rag.index_version
+
+    # The cutoff falls inside 2026-10-10: that shard may still hold live documents
+    assert rag.drop_expired_shards(shard_bounds("2026-10-10")[1] - 1) == []
+    assert shard_keys(rag.db_path) == ["2026-10-10", "2026-10-16"]
+    assert rag.index_version == version
+
+
+def test_drop_expired_shards_clears_the_store_when_nothing_is_left(tmp_path):
+    rag = store(tmp_path)
+
+    dropped = rag.drop_expired_shards(shard_bounds("2026-10-16")[1])
+
+    assert dropped == ["2026-10-10", "2026-10-16"]
+    assert shard_keys(rag.db_path) == []
+    assert rag.index_stats() == {"index_type": None, "vectors": 0, "shards": []}